@@ -1,6 +1,12 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import vision, engine
+from fastapi.responses import JSONResponse
+from app.routers import vision, engine, sessions, jobs, bulk, stream
+from app.services.model_warmup import start_model_warmup, readiness
+from app.services.inference_batcher import shutdown_cnn_batcher
+from app.services.strategy_registry import get_strategy_registry
+from app.services.bulk_recognition import shutdown_bulk_pool
 import asyncio
 import sys
 
@@ -8,7 +14,20 @@ import sys
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-app = FastAPI(title="Chess Scan API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm heavy models in the background so the first request doesn't pay for them
+    start_model_warmup()
+    yield
+    shutdown_cnn_batcher()
+    shutdown_bulk_pool()
+    registry = get_strategy_registry()
+    if registry is not None:
+        registry.save()
+
+
+app = FastAPI(title="Chess Scan API", version="1.0.0", lifespan=lifespan)
 
 # CORS - Allow React Native app to connect
 app.add_middleware(
@@ -21,6 +40,10 @@ app.add_middleware(
 
 # Include routers
 app.include_router(vision.router, prefix="/api/vision", tags=["vision"])
+app.include_router(sessions.router, prefix="/api/vision", tags=["sessions"])
+app.include_router(jobs.router, prefix="/api/vision", tags=["jobs"])
+app.include_router(bulk.router, prefix="/api/vision", tags=["bulk"])
+app.include_router(stream.router, prefix="/api/vision", tags=["stream"])
 app.include_router(engine.router, prefix="/api/engine", tags=["engine"])
 
 @app.get("/")
@@ -28,5 +51,14 @@ async def root():
     return {"message": "Chess Scan API", "version": "1.0.0"}
 
 @app.get("/health")
+@app.get("/health/live")
 async def health():
+    # Liveness: the process is up and serving
     return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready():
+    # Readiness: models are warm; load balancers should only route here when 200
+    state = readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503,
+                        content={"status": "ready" if state["ready"] else "warming", **state})
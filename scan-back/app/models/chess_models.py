@@ -6,6 +6,24 @@ class VisionResponse(BaseModel):
     confidence: float
     # default to [] so clients don't get `null`
     detectedPieces: List[Dict] = []
+    # strategy that produced the FEN (e.g. "template", "warp", "fallback")
+    strategy: Optional[str] = None
+    # load-dependent pipeline tier: "full" | "reduced" | "minimal"
+    qualityTier: Optional[str] = None
+
+class PageBoard(BaseModel):
+    # One diagram found on a page (/recognize-page)
+    fen: str
+    confidence: float
+    strategy: Optional[str] = None
+    plausibility: float                      # 0..1, python-chess sanity checks
+    corners: List[Tuple[float, float]]       # original-image pixels, TL, TR, BR, BL
+    bbox: Tuple[int, int, int, int]          # x, y, width, height
+
+class PageResponse(BaseModel):
+    boards: List[PageBoard]                  # in reading order
+    count: int
+    qualityTier: Optional[str] = None
 
 class SquareData(BaseModel):
     position: str           # e.g., "a8"
@@ -26,6 +44,31 @@ class ExtractSquaresResponse(BaseModel):
     warpedHeight: Optional[int] = None
     corners: Optional[List[Tuple[float, float]]] = None  # original 4 source points
 
+class TileRect(BaseModel):
+    position: str           # e.g., "a8"
+    index: int              # 0..63
+    x: int                  # tile rectangle in warped-board pixels
+    y: int
+    width: int
+    height: int
+    isEmpty: bool
+    detectedColor: Optional[str] = None
+    url: Optional[str] = None  # lazily encoded tile (response_format=urls)
+
+class ExtractSquaresSpriteResponse(BaseModel):
+    # Compact /extract-squares: the warped board once + tile rectangles
+    # (clients crop the previews themselves)
+    tiles: List[TileRect]
+    boardDetected: bool
+    message: Optional[str] = None
+    boardImageData: Optional[str] = None   # base64 board (omitted in multipart/msgpack bodies)
+    boardImageFormat: Optional[str] = None # "png" | "jpeg" | "webp"
+    boardImageUrl: Optional[str] = None    # response_format=urls: served from the session
+    sessionId: Optional[str] = None
+    warpedWidth: Optional[int] = None
+    warpedHeight: Optional[int] = None
+    corners: Optional[List[Tuple[float, float]]] = None
+
 class ManualFENRequest(BaseModel):
     pieces: List[Dict]  # [{"position": "a8", "piece": "r"}, ...]
 
@@ -40,3 +83,39 @@ class EngineResponse(BaseModel):
     depth: int
     pv: Optional[List[str]] = None
 
+
+class SessionResponse(BaseModel):
+    sessionId: str
+    boardDetected: bool
+    message: Optional[str] = None
+    boardImageData: Optional[str] = None   # base64 PNG of the cached warped board
+    warpedWidth: Optional[int] = None
+    warpedHeight: Optional[int] = None
+    corners: Optional[List[Tuple[float, float]]] = None
+    hSegments: List[int] = []
+    vSegments: List[int] = []
+    expiresIn: int = 0                     # seconds of inactivity until the session is dropped
+
+class SliceRequest(BaseModel):
+    # 9 grid line positions each, in warped-board pixels (current grid if omitted)
+    hSegments: Optional[List[int]] = None
+    vSegments: Optional[List[int]] = None
+
+class SessionFENRequest(SliceRequest):
+    rotation: Optional[int] = None
+    useTemplateMatching: bool = True
+
+class CornersRequest(BaseModel):
+    # 4 outer corners of the 8x8 grid in original-image pixels (any order), same convention
+    # as the `corners` returned by /extract-squares
+    corners: List[Tuple[float, float]]
+
+class JobResponse(BaseModel):
+    jobId: str
+    status: str                              # queued | running | done | failed
+    result: Optional[VisionResponse] = None  # when done
+    error: Optional[str] = None              # when failed
+    createdAt: float
+    updatedAt: float
+    statusUrl: Optional[str] = None
+    resultUrl: Optional[str] = None
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import json
+import time
+import zipfile
+from typing import List, Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.services.bulk_recognition import recognize_many, zip_image_sources
+
+router = APIRouter()
+
+
+@router.post("/bulk")
+async def bulk_recognize(
+    archive: Optional[UploadFile] = File(None),
+    images: Optional[List[UploadFile]] = File(None),
+    rotation: Optional[int] = Form(None),
+    use_template_matching: Optional[bool] = Form(True),
+    is_starting_position: Optional[bool] = Form(False),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Recognize a batch: a zip `archive` or several `images` parts.
+
+    Streams NDJSON: one line per image in completion order
+    ({"index", "name", "fen", "confidence", "strategy", "qualityTier", "ms"}
+    or {"index", "name", "error"}), then a summary line with "done": true.
+    """
+    if archive is None and not images:
+        raise HTTPException(status_code=400, detail="Send a zip `archive` or `images` parts")
+    if mode is not None and mode not in ("cascade", "race"):
+        raise HTTPException(status_code=400, detail="mode must be cascade or race")
+
+    if archive is not None:
+        # The upload is spooled to disk; members are read one at a time
+        try:
+            sources = zip_image_sources(archive.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="archive is not a zip file")
+    else:
+        sources = [(f.filename or f"image_{i}", f.file.read) for i, f in enumerate(images)]
+
+    options = {
+        "rotation": rotation,
+        "use_template_matching": use_template_matching,
+        "is_starting_position": is_starting_position,
+        "mode": mode,
+    }
+
+    async def ndjson():
+        start = time.perf_counter()
+        count = failed = 0
+        async for line in recognize_many(sources, options):
+            count += 1
+            failed += "error" in line
+            yield json.dumps(line) + "\n"
+        yield json.dumps({
+            "done": True,
+            "count": count,
+            "failed": failed,
+            "ms": round((time.perf_counter() - start) * 1000.0, 1),
+        }) + "\n"
+
+    print("📦 Bulk recognition started")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.models.chess_models import JobResponse, VisionResponse
+from app.routers.sessions import parse_corners
+from app.services.image_io import decode_upload
+from app.services.job_store import get_job_store
+from app.services.load_monitor import get_load_monitor
+from app.services.vision_service import lookup_recognition, recognize_upload
+
+router = APIRouter()
+
+
+def _job_response(request: Request, job: dict) -> JobResponse:
+    return JobResponse(
+        jobId=job["id"],
+        status=job["status"],
+        result=job["result"],
+        error=job["error"],
+        createdAt=job["created"],
+        updatedAt=job["updated"],
+        statusUrl=request.app.url_path_for("get_job", job_id=job["id"]),
+        resultUrl=request.app.url_path_for("get_job_result", job_id=job["id"]),
+    )
+
+
+def _get_job_or_404(job_id: str) -> dict:
+    job = get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(
+    request: Request,
+    image: UploadFile = File(...),
+    rotation: Optional[int] = Form(None),
+    use_template_matching: Optional[bool] = Form(True),
+    is_starting_position: Optional[bool] = Form(False),
+    corners: Optional[str] = Form(None),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Queue a recognition (same fields as /recognize) and return its job ID
+    right away. Poll GET /jobs/{id} (`?wait=` seconds to long-poll) and
+    fetch the FEN from /jobs/{id}/result.
+    """
+    warp_corners = parse_corners(corners)
+    if mode is not None and mode not in ("cascade", "race"):
+        raise HTTPException(status_code=400, detail="mode must be cascade or race")
+
+    contents = await image.read()
+    try:
+        decoded = decode_upload(contents)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+    options = {
+        "rotation": rotation,
+        "use_template_matching": use_template_matching,
+        "is_starting_position": is_starting_position,
+        "mode": mode,
+        "corners": warp_corners,
+    }
+    store = get_job_store()
+
+    cached = lookup_recognition(decoded, contents, **options)
+    if cached is not None:
+        return _job_response(request, store.complete(cached.model_dump()))
+
+    def run():
+        # Background jobs count towards the load tier like requests do
+        with get_load_monitor().track():
+            return asyncio.run(recognize_upload(decoded, contents, **options)).model_dump()
+
+    job = store.submit(run)
+    if job is None:
+        raise HTTPException(status_code=503, detail="Too many pending jobs", headers={"Retry-After": "5"})
+    print(f"🧾 Job {job['id']} queued")
+    return _job_response(request, job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(request: Request, job_id: str, wait: float = 0.0):
+    """
+    Job status; with `wait` > 0, holds the request until the job finishes
+    or `wait` seconds (capped at JOB_MAX_WAIT) pass.
+    """
+    _get_job_or_404(job_id)
+    job = await get_job_store().wait(job_id, wait) if wait > 0 else get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _job_response(request, job)
+
+
+@router.get("/jobs/{job_id}/result", response_model=VisionResponse)
+async def get_job_result(request: Request, job_id: str):
+    """
+    The recognition result: 200 when done, 202 (with the job status) while
+    pending, 500 if the job failed.
+    """
+    job = _get_job_or_404(job_id)
+    if job["status"] == "done":
+        return VisionResponse(**job["result"])
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Recognition failed: {job['error']}")
+    return JSONResponse(status_code=202, content=_job_response(request, job).model_dump())
+
+
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    if not get_job_store().delete(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return {"deleted": job_id}
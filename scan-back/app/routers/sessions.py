@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Response
+from typing import Optional
+import json
+
+from app.models.chess_models import (
+    VisionResponse,
+    ExtractSquaresResponse,
+    SessionResponse,
+    SliceRequest,
+    SessionFENRequest,
+    CornersRequest,
+)
+from app.services.image_io import decode_upload
+from app.services.image_sessions import SESSION_TTL_SECONDS, create_session, get_session_store, warp_upload
+from app.services.tile_encoding import (
+    IMAGE_FORMATS, IMAGE_MIME_TYPES, build_square_data, build_tile_rects, encode_image_b64,
+)
+
+router = APIRouter()
+
+
+def parse_corners(text: Optional[str]):
+    """
+    Parse a corners form field: JSON [[x, y] x 4] in original-image pixels.
+    """
+    if not text:
+        return None
+    try:
+        corners = [[float(x), float(y)] for x, y in json.loads(text)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid corners: {e}")
+    if len(corners) != 4:
+        raise HTTPException(status_code=400, detail="Expected 4 corners")
+    return corners
+
+
+def get_session_or_404(session_id: str):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+
+def parse_square(square: str) -> int:
+    """
+    Tile index from "a8".."h1" or "0".."63".
+    """
+    if square.isdigit() and 0 <= int(square) < 64:
+        return int(square)
+    if len(square) == 2 and square[0] in "abcdefgh" and square[1] in "12345678":
+        return (8 - int(square[1])) * 8 + ord(square[0]) - ord("a")
+    raise HTTPException(status_code=404, detail=f"Unknown square: {square}")
+
+
+def session_tile_rects(request: Request, session, fmt: str = "PNG", quality: int | None = None):
+    """
+    Tile rectangles of the session's current grid with lazy image URLs.
+    Call with the session lock held.
+    """
+    params = f"?v={session.version}&format={fmt.lower()}" + (f"&quality={quality}" if quality is not None else "")
+    rects = build_tile_rects(session.tiles())
+    for rect in rects:
+        rect.url = request.app.url_path_for(
+            "get_session_tile", session_id=session.id, square=rect.position) + params
+    board_url = request.app.url_path_for("get_session_board", session_id=session.id) + params
+    return rects, board_url
+
+
+def _image_response(request: Request, session, index: int | None, format: str,
+                    quality: int | None, v: str | None) -> Response:
+    fmt = IMAGE_FORMATS.get(format.lower())
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="format must be png, jpeg or webp")
+
+    with session.lock:
+        if session.board is None:
+            raise HTTPException(status_code=409, detail="No board in this session")
+        try:
+            data, etag = session.encoded_image(index, fmt, quality)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=f"Could not slice the board: {e}")
+        current = v == session.version
+
+    # Versioned URLs never change content; unversioned ones revalidate via the ETag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={SESSION_TTL_SECONDS}, immutable" if current else "private, no-cache",
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=IMAGE_MIME_TYPES[fmt], headers=headers)
+
+
+def _session_response(session, include_image: bool = True) -> SessionResponse:
+    if session.board is None:
+        return SessionResponse(
+            sessionId=session.id,
+            boardDetected=False,
+            message="Could not detect the chessboard",
+            expiresIn=session.expires_in,
+        )
+    h, w = session.board.shape[:2]
+    return SessionResponse(
+        sessionId=session.id,
+        boardDetected=True,
+        message="ok",
+        boardImageData=encode_image_b64(session.board) if include_image else None,
+        warpedWidth=w,
+        warpedHeight=h,
+        corners=session.corners,
+        hSegments=session.h_segments,
+        vSegments=session.v_segments,
+        expiresIn=session.expires_in,
+    )
+
+
+@router.post("/sessions", response_model=SessionResponse)
+async def create_image_session(
+    image: UploadFile = File(...),
+    corners: Optional[str] = Form(None),
+):
+    """
+    Upload an image once: the board is detected (or warped from the given
+    corners) and the warped board stays cached server-side under the
+    returned session ID.
+    """
+    warp_corners = parse_corners(corners)
+    contents = await image.read()
+    try:
+        decoded = decode_upload(contents)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+    session = create_session(decoded, corners=warp_corners)
+    print(f"🗂️ Session {session.id} created (board detected: {session.board is not None})")
+    return _session_response(session)
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_image_session(session_id: str, include_image: bool = False):
+    return _session_response(get_session_or_404(session_id), include_image=include_image)
+
+
+@router.post("/sessions/{session_id}/corners", response_model=SessionResponse)
+async def rewarp_session(session_id: str, request: CornersRequest):
+    """
+    Re-warp the session's upload from corrected corners (no automatic detection).
+    """
+    if len(request.corners) != 4:
+        raise HTTPException(status_code=400, detail="Expected 4 corners")
+
+    session = get_session_or_404(session_id)
+    corners = [list(c) for c in request.corners]
+    board = warp_upload(session.decoded, corners)
+    with session.lock:
+        session.set_board(board, corners)
+    return _session_response(session)
+
+
+@router.post("/sessions/{session_id}/squares", response_model=ExtractSquaresResponse)
+async def slice_session(session_id: str, request: SliceRequest):
+    """
+    Slice (and classify) the cached board with the given grid lines.
+    """
+    session = get_session_or_404(session_id)
+    if session.board is None:
+        return ExtractSquaresResponse(squares=[], boardDetected=False, message="No board in this session")
+
+    try:
+        with session.lock:
+            tiles = session.tiles(request.hSegments, request.vSegments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    h, w = session.board.shape[:2]
+    return ExtractSquaresResponse(
+        squares=build_square_data(tiles),
+        boardDetected=True,
+        message="ok",
+        warpedWidth=w,
+        warpedHeight=h,
+        corners=session.corners,
+    )
+
+
+@router.post("/sessions/{session_id}/fen", response_model=VisionResponse)
+async def session_fen(session_id: str, request: SessionFENRequest):
+    """
+    Classify the cached board (optionally with an adjusted grid) into a FEN.
+    """
+    from app.services.vision_service import recognize_tiles
+
+    session = get_session_or_404(session_id)
+    if session.board is None:
+        raise HTTPException(status_code=409, detail="No board in this session")
+
+    try:
+        with session.lock:
+            tiles = session.tiles(request.hSegments, request.vSegments)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = recognize_tiles(tiles, session.board, rotation=request.rotation,
+                             use_template_matching=request.useTemplateMatching)
+    if result is None:
+        raise HTTPException(status_code=422, detail="Could not classify the squares")
+    return result
+
+
+@router.get("/sessions/{session_id}/tiles/{square}")
+async def get_session_tile(request: Request, session_id: str, square: str, format: str = "png",
+                           quality: Optional[int] = None, v: Optional[str] = None):
+    """
+    One tile image of the session's current grid, encoded on demand
+    (square "a8".."h1" or index). Strong ETag; versioned URLs are immutable.
+    """
+    session = get_session_or_404(session_id)
+    return _image_response(request, session, parse_square(square), format, quality, v)
+
+
+@router.get("/sessions/{session_id}/board")
+async def get_session_board(request: Request, session_id: str, format: str = "png",
+                            quality: Optional[int] = None, v: Optional[str] = None):
+    """
+    The session's warped board image, encoded on demand (same caching as tiles).
+    """
+    session = get_session_or_404(session_id)
+    return _image_response(request, session, None, format, quality, v)
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_image_session(session_id: str):
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
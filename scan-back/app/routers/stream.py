@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+
+from app.routers.sessions import parse_corners
+from app.services.image_io import decode_upload
+from app.services.load_monitor import get_load_monitor
+from app.services.stream_recognizer import StreamRecognizer, acquire_stream_slot, release_stream_slot
+
+router = APIRouter()
+
+
+@router.websocket("/stream")
+async def stream_recognize(websocket: WebSocket, rotation: Optional[int] = None,
+                           use_template_matching: bool = True):
+    """
+    Continuous recognition of camera frames.
+
+    Every message gets one JSON reply:
+      - binary: an encoded frame (JPEG / PNG / WebP) → {"frame", "status",
+        "fen", "changed", "ms"} (+ "corners" in original-image pixels when
+        the board was just locked)
+      - text {"type": "corners", "corners": [[x, y] x 4]}: lock onto these
+        corners from the next frame on → {"status": "corners"}
+      - text {"type": "reset"}: re-detect the board → {"status": "reset"}
+    Clients should send the next frame after the reply (dropping frames in
+    between), which keeps the latency at one frame's processing time.
+    """
+    await websocket.accept()
+    if not acquire_stream_slot():
+        await websocket.close(code=1013, reason="Too many streams")
+        return
+
+    loop = asyncio.get_running_loop()
+    recognizer = StreamRecognizer(rotation=rotation, use_template_matching=use_template_matching)
+    pending_corners = None  # original-image pixels, applied to the next frame
+    print("📹 Stream opened")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("text") is not None:
+                try:
+                    command = json.loads(message["text"])
+                    if command.get("type") == "reset":
+                        recognizer.reset()
+                        pending_corners = None
+                        await websocket.send_json({"status": "reset"})
+                    elif command.get("type") == "corners":
+                        pending_corners = parse_corners(json.dumps(command.get("corners")))
+                        await websocket.send_json({"status": "corners"})
+                    else:
+                        await websocket.send_json({"error": "Unknown command"})
+                except HTTPException as e:
+                    await websocket.send_json({"error": e.detail})
+                except (ValueError, AttributeError):
+                    await websocket.send_json({"error": "Commands are JSON objects with a type"})
+                continue
+
+            def handle(contents=message.get("bytes") or b""):
+                decoded = decode_upload(contents)
+                corners = decoded.to_working_coords(pending_corners) if pending_corners else None
+                with get_load_monitor().track():
+                    result = recognizer.process(decoded.image, corners=corners)
+                if result["status"] == "locked":
+                    result["corners"] = decoded.to_original_coords(recognizer.corners)
+                return result
+
+            try:
+                result = await loop.run_in_executor(None, handle)
+                pending_corners = None
+            except Exception as e:
+                result = {"error": f"Frame failed: {e}"}
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        release_stream_slot()
+        print(f"📹 Stream closed after {recognizer.frames} frames")
@@ -1,107 +1,320 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Request, Response
 from typing import Optional
 from PIL import Image
-import io, base64, traceback
-from typing import List
+import io, base64, os, traceback
+import numpy as np
+from typing import List, Union
 
 from app.models.chess_models import (
     VisionResponse,
     ExtractSquaresResponse,
-    SquareData,
+    ExtractSquaresSpriteResponse,
+    PageResponse,
     ManualFENRequest,
 )
-from app.services.vision_service import recognize_chess_position
+from app.routers.sessions import get_session_or_404, parse_corners, session_tile_rects
+from app.services.vision_service import (
+    PAGE_MAX_BOARDS, recognize_page, recognize_upload, recognize_warped_board,
+)
+from app.services.image_sessions import ImageSession, get_session_store, warp_upload
+from app.services.image_io import decode_upload
+from app.services.load_monitor import get_load_monitor
+from app.services.result_cache import get_result_cache
+from app.services.tile_cache import get_tile_cache
+from app.services.tile_encoding import (
+    IMAGE_FORMATS, MSGPACK_MIME_TYPE, RESPONSE_FORMATS,
+    build_square_data, build_tile_rects, encode_image_b64, encode_msgpack, encode_multipart,
+)
 
 router = APIRouter()
 
+# Required in X-Admin-Token for /admin endpoints when set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 
 @router.post("/recognize", response_model=VisionResponse)
 async def recognize_board(
-    image: UploadFile = File(...),
+    image: Optional[UploadFile] = File(None),
     rotation: Optional[int] = Form(None),
     use_template_matching: Optional[bool] = Form(True),
     is_starting_position: Optional[bool] = Form(False),
+    corners: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    mode: Optional[str] = Form(None),
 ):
-    try:
-        contents = await image.read()
-        img = Image.open(io.BytesIO(contents)).convert("RGB")
+    """
+    Recognize a position. With `corners` (JSON [[x, y] x 4], original-image
+    pixels) or a `session_id`, board detection is skipped: the board is warped
+    from those corners and only sliced + classified.
 
+    `mode`: "cascade" (strategies in order) or "race" (cheap strategies run
+    concurrently, the most plausible FEN wins); VISION_MODE by default.
+    """
+    warp_corners = parse_corners(corners)
+    if image is None and not session_id:
+        raise HTTPException(status_code=400, detail="Either an image or a session_id is required")
+    if mode is not None and mode not in ("cascade", "race"):
+        raise HTTPException(status_code=400, detail="mode must be cascade or race")
+
+    try:
         print(f"📥 rotation={rotation}, template={use_template_matching}, starting={is_starting_position}")
 
-        result = await recognize_chess_position(
-            img,
-            rotation=rotation,
-            use_template_matching=use_template_matching,
-            is_starting_position=is_starting_position,
-        )
-        return result
+        if session_id:
+            session = get_session_or_404(session_id)
+
+            def recognize_session():
+                with session.lock:
+                    if warp_corners is not None:
+                        session.set_board(warp_upload(session.decoded, warp_corners), warp_corners)
+                    if session.board is None:
+                        raise HTTPException(status_code=409, detail="No board in this session")
+                    board, tiles = session.board, session.tiles()
+                return recognize_warped_board(board, tiles, rotation=rotation,
+                                              use_template_matching=use_template_matching,
+                                              is_starting_position=is_starting_position)
+
+            # Warp + classify on a worker thread: the event loop keeps serving
+            with get_load_monitor().track():
+                return await asyncio.get_running_loop().run_in_executor(None, recognize_session)
+
+        contents = await image.read()
+        with get_load_monitor().track():
+            decoded = decode_upload(contents)
+            return await recognize_upload(decoded, contents, rotation=rotation,
+                                          use_template_matching=use_template_matching,
+                                          is_starting_position=is_starting_position,
+                                          mode=mode, corners=warp_corners)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recognition failed: {str(e)}")
 
 
-@router.post("/extract-squares", response_model=ExtractSquaresResponse)
-async def extract_squares(image: UploadFile = File(...)):
+@router.post("/recognize-page", response_model=PageResponse)
+async def recognize_page_boards(
+    image: UploadFile = File(...),
+    max_boards: Optional[int] = Form(PAGE_MAX_BOARDS),
+    rotation: Optional[int] = Form(None),
+    use_template_matching: Optional[bool] = Form(True),
+    is_starting_position: Optional[bool] = Form(False),
+):
     """
-    Extract 64 tiles using warp+slice; also return the warped board image so
-    the UI can overlay the grid correctly.
+    Recognize every diagram on a book or magazine page in one upload.
+    Returns one FEN per board with its corners and bounding box
+    (original-image pixels), in reading order.
     """
-    try:
-        from app.services.board_detector import detect_and_warp_board, extract_board_squares_warped
-        from app.services.simple_chess_detector import classify_square
+    if max_boards is not None and max_boards < 1:
+        raise HTTPException(status_code=400, detail="max_boards must be at least 1")
 
+    try:
         contents = await image.read()
-        img = Image.open(io.BytesIO(contents)).convert("RGB")
+        with get_load_monitor().track():
+            decoded = decode_upload(contents)
+            tier, boards = await recognize_page(decoded, max_boards=max_boards or PAGE_MAX_BOARDS,
+                                                rotation=rotation,
+                                                use_template_matching=use_template_matching,
+                                                is_starting_position=is_starting_position)
+        print(f"📚 Page: {len(boards)} boards recognized")
+        return PageResponse(boards=boards, count=len(boards), qualityTier=tier)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Page recognition failed: {str(e)}")
 
-        print("🔍 Extracting squares for visual editor (warp-based)…")
 
-        warped_pil, corners = detect_and_warp_board(img, out_size=800)
-        if warped_pil is None:
-            return ExtractSquaresResponse(
-                squares=[],
-                boardDetected=False,
-                message="Could not detect the chessboard (warp returned None)",
-            )
+def _negotiate_extract_format(response_format: Optional[str], image_format: str, accept: str):
+    """
+    Resolve the /extract-squares response format (explicit field, else the
+    Accept header, else JSON) and the board image format.
+    """
+    if response_format is None:
+        accept = (accept or "").lower()
+        if MSGPACK_MIME_TYPE in accept or "application/x-msgpack" in accept:
+            response_format = "msgpack"
+        elif "multipart/form-data" in accept:
+            response_format = "multipart"
+        else:
+            response_format = "json"
+    response_format = response_format.lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"response_format must be one of {', '.join(RESPONSE_FORMATS)}")
+    fmt = IMAGE_FORMATS.get((image_format or "png").lower())
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="image_format must be png, jpeg or webp")
+    return response_format, fmt
+
+
+def _render_sprite(payload: dict, response_format: str):
+    """
+    Sprite payload (JSON-able dict, board as base64) in the requested format.
+    """
+    if response_format in ("sprite", "urls"):
+        return ExtractSquaresSpriteResponse(**payload)
+
+    board_b64 = payload.get("boardImageData")
+    image_bytes = base64.b64decode(board_b64) if board_b64 else None
+    metadata = {k: v for k, v in payload.items() if k != "boardImageData"}
+    if response_format == "multipart":
+        fmt = IMAGE_FORMATS[payload.get("boardImageFormat") or "png"]
+        body, content_type = encode_multipart(metadata, image_bytes, fmt)
+        return Response(content=body, media_type=content_type)
+    try:
+        return Response(content=encode_msgpack(metadata, image_bytes), media_type=MSGPACK_MIME_TYPE)
+    except ImportError:
+        raise HTTPException(status_code=406, detail="msgpack responses need the msgpack package on the server")
+
+
+@router.post("/extract-squares", response_model=Union[ExtractSquaresResponse, ExtractSquaresSpriteResponse])
+async def extract_squares(
+    request: Request,
+    image: Optional[UploadFile] = File(None),
+    corners: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    response_format: Optional[str] = Form(None),
+    image_format: str = Form("png"),
+    quality: Optional[int] = Form(None),
+):
+    """
+    Extract 64 tiles using warp+slice; also return the warped board image so
+    the UI can overlay the grid correctly. With `corners` (original-image
+    pixels) or a `session_id`, the board is warped from those corners instead
+    of being detected.
+
+    `response_format`: "json" (default, ExtractSquaresResponse with 64 PNG
+    tiles), or a sprite - the board encoded once as `image_format`
+    (png/jpeg/webp, `quality`) plus tile rectangles - as "sprite" (JSON),
+    "multipart" (form-data: metadata + raw board) or "msgpack". "urls" keeps
+    the board in a session and returns tile URLs that are encoded on demand.
+    """
+    warp_corners = parse_corners(corners)
+    if image is None and not session_id:
+        raise HTTPException(status_code=400, detail="Either an image or a session_id is required")
+    response_format, fmt = _negotiate_extract_format(response_format, image_format, request.headers.get("accept"))
+    session = get_session_or_404(session_id) if session_id else None
+
+    def failed(message: str):
+        if response_format == "json":
+            return ExtractSquaresResponse(squares=[], boardDetected=False, message=message)
+        return _render_sprite({"tiles": [], "boardDetected": False, "message": message}, response_format)
+
+    try:
+        from app.services.board_detector import (
+            detect_and_warp_board, extract_board_squares_warped, warp_board_from_corners,
+        )
+        from app.services.screenshot_detector import SCREENSHOT_FAST_PATH, detect_screenshot_board
+
+        # URL responses point into a session, which the result cache cannot share
+        cache = get_result_cache() if response_format != "urls" else None
+        cache_options = {"corners": warp_corners} if warp_corners is not None else {}
+        if response_format != "json":
+            # multipart / msgpack are re-encodings of the same sprite payload
+            cache_options.update({"format": "sprite", "image": fmt, "quality": quality})
+        contents, decoded = None, None
+
+        if session is not None:
+            with session.lock:
+                if warp_corners is not None:
+                    session.set_board(warp_upload(session.decoded, warp_corners), warp_corners)
+                if session.board is None:
+                    return failed("No board in this session")
+                warped_pil = Image.fromarray(session.board)
+                squares, corners = session.tiles(), session.corners
+            cache = None  # session boards change in place; never cached
+        else:
+            contents = await image.read()
+            decoded = decode_upload(contents)
+
+            if cache is not None:
+                cached = cache.get("extract-squares", cache_options, contents=contents, image=decoded.image)
+                if cached is not None:
+                    if response_format == "json":
+                        return ExtractSquaresResponse(**cached)
+                    return _render_sprite(cached, response_format)
+
+            if warp_corners is not None:
+                print("📐 Warping from supplied corners (detection skipped)")
+                warped_pil = Image.fromarray(warp_upload(decoded, warp_corners))
+                squares, corners = extract_board_squares_warped(warped_pil, padding=2), warp_corners
+            else:
+                print("🔍 Extracting squares for visual editor (warp-based)…")
+
+                shot_tiles, shot_board, corners = None, None, None
+                if SCREENSHOT_FAST_PATH:
+                    shot_tiles, shot_board, corners = detect_screenshot_board(decoded.image)
+
+                if shot_tiles is not None:
+                    # Screenshot: the axis-aligned crop already is the top-down board
+                    warped_pil = Image.fromarray(np.ascontiguousarray(shot_board))
+                    squares = shot_tiles
+                    corners = decoded.to_original_coords(corners)
+                else:
+                    warped_pil, corners = detect_and_warp_board(decoded.image, out_size=800)
+                    if warped_pil is None:
+                        return failed("Could not detect the chessboard (warp returned None)")
+
+                    # Corners are reported in original-image pixels; re-warp from the
+                    # full-resolution upload only if the working image is too small
+                    needs_hires = decoded.needs_full_resolution(corners, 800)
+                    corners = decoded.to_original_coords(corners)
+                    if needs_hires:
+                        print("🔎 Re-warping from full-resolution upload")
+                        warped_pil = warp_board_from_corners(decoded.full_resolution(), corners, out_size=800)
+
+                    squares = extract_board_squares_warped(warped_pil, padding=2)
 
-        squares = extract_board_squares_warped(warped_pil, padding=2)
         if not squares or len(squares) != 64:
-            return ExtractSquaresResponse(
-                squares=[],
-                boardDetected=False,
-                message=f"Could not extract 64 squares (got {len(squares) if squares else 0})",
+            return failed(f"Could not extract 64 squares (got {len(squares) if squares else 0})")
+
+        w, h = warped_pil.size
+        if response_format == "urls":
+            # Nothing is encoded here: tiles and board are served lazily by the session
+            if session is None:
+                session = get_session_store().add(ImageSession(decoded, np.asarray(warped_pil), corners))
+            with session.lock:
+                tile_rects, board_url = session_tile_rects(request, session, fmt, quality)
+            print(f"✅ Extracted 64 tile URLs (session {session.id})")
+            return ExtractSquaresSpriteResponse(
+                tiles=tile_rects,
+                boardDetected=True,
+                message="ok",
+                boardImageFormat=fmt.lower(),
+                boardImageUrl=board_url,
+                sessionId=session.id,
+                warpedWidth=w,
+                warpedHeight=h,
+                corners=corners,
             )
 
+        if response_format != "json":
+            # Sprite: one board encode, tiles as rectangles
+            payload = ExtractSquaresSpriteResponse(
+                tiles=build_tile_rects(squares),
+                boardDetected=True,
+                message="ok",
+                boardImageData=encode_image_b64(warped_pil, fmt, quality),
+                boardImageFormat=fmt.lower(),
+                warpedWidth=w,
+                warpedHeight=h,
+                corners=corners,
+            ).model_dump()
+            print(f"✅ Extracted 64 tile rects ({response_format}, {fmt.lower()})")
+            if cache is not None:
+                cache.put("extract-squares", cache_options, payload, contents=contents, image=decoded.image)
+            return _render_sprite(payload, response_format)
+
         # pack warped image
         buf = io.BytesIO()
         warped_pil.save(buf, format="PNG")
         warped_b64 = base64.b64encode(buf.getvalue()).decode()
-        w, h = warped_pil.size
 
         # squares metadata
-        square_data_list = []
-        for i, square_img in enumerate(squares):
-            rank = 8 - (i // 8)
-            file = chr(ord('a') + (i % 8))
-            position = f"{file}{rank}"
-
-            square_type, color = classify_square(square_img)
-            is_empty = (square_type == 'empty')
-
-            b = io.BytesIO()
-            square_img.save(b, format="PNG")
-            img64 = base64.b64encode(b.getvalue()).decode()
-
-            square_data_list.append(SquareData(
-                position=position,
-                index=i,
-                imageData=img64,
-                isEmpty=is_empty,
-                detectedColor=color if not is_empty else None
-            ))
+        square_data_list = build_square_data(squares)
 
         print(f"✅ Extracted {len(square_data_list)} squares")
-        return ExtractSquaresResponse(
+        response = ExtractSquaresResponse(
             squares=square_data_list,
             boardDetected=True,
             message="ok",
@@ -110,13 +323,14 @@ async def extract_squares(image: UploadFile = File(...)):
             warpedHeight=h,
             corners=corners,
         )
+        if cache is not None:
+            cache.put("extract-squares", cache_options, response.model_dump(), contents=contents, image=decoded.image)
+        return response
+    except HTTPException:
+        raise
     except Exception:
         print("❌ /extract-squares crashed:\n" + traceback.format_exc())
-        return ExtractSquaresResponse(
-            squares=[],
-            boardDetected=False,
-            message="Extraction failed (see server logs for traceback).",
-        )
+        return failed("Extraction failed (see server logs for traceback).")
 
 
 @router.post("/generate-fen-from-pieces", response_model=VisionResponse)
@@ -206,7 +420,13 @@ async def extract_grid(image: UploadFile = File(...)):
         from app.services.board_detector import extract_and_transform_board
 
         contents = await image.read()
-        img = Image.open(io.BytesIO(contents))
+        img = decode_upload(contents).image
+
+        cache = get_result_cache()
+        if cache is not None:
+            cached = cache.get("extract-grid", {}, contents=contents, image=img)
+            if cached is not None:
+                return cached
 
         warped = extract_and_transform_board(img)
         if warped is None:
@@ -231,7 +451,7 @@ async def extract_grid(image: UploadFile = File(...)):
         warped.save(buf, format="PNG")
         warped_b64 = base64.b64encode(buf.getvalue()).decode()
 
-        return {
+        result = {
             "boardDetected": True,
             "message": "Board warped successfully",
             "warpedBoard": warped_b64,
@@ -239,11 +459,56 @@ async def extract_grid(image: UploadFile = File(...)):
             "vSegments": v_segments,
             "size": size
         }
+        if cache is not None:
+            cache.put("extract-grid", {}, result, contents=contents, image=img)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"extract-grid failed: {e}")
 
 
 
+def _require_admin(request: Request):
+    if ADMIN_TOKEN and request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get("/admin/strategies")
+async def strategy_stats(request: Request):
+    """
+    Per-input-class latency / success stats of the recognition strategies
+    and the resulting stage order.
+    """
+    from app.services.strategy_registry import get_strategy_registry
+    from app.services.vision_service import STRATEGIES
+
+    _require_admin(request)
+    registry = get_strategy_registry()
+    if registry is None:
+        return {"enabled": False, "classes": {}}
+    return {"enabled": True, **registry.snapshot(STRATEGIES)}
+
+
+@router.delete("/admin/strategies")
+async def reset_strategy_stats(request: Request):
+    from app.services.strategy_registry import get_strategy_registry
+
+    _require_admin(request)
+    registry = get_strategy_registry()
+    if registry is not None:
+        registry.reset()
+    return {"reset": registry is not None}
+
+
 @router.get("/health")
 async def vision_health():
-    return {"status": "ok", "service": "vision"}
+    from app.services.load_monitor import get_load_monitor
+
+    cache = get_result_cache()
+    tile_cache = get_tile_cache()
+    return {
+        "status": "ok",
+        "service": "vision",
+        "load": get_load_monitor().stats(),
+        "resultCache": cache.stats() if cache is not None else None,
+        "tileCache": tile_cache.stats() if tile_cache is not None else None,
+    }
@@ -1,14 +1,18 @@
 """
 Automatic chessboard detection and extraction using OpenCV.
 Provides robust SB-corner + contour fallback warp, inner-trim,
-and uniform 8x8 slicing.
+and uniform 8x8 slicing, plus multi-board detection for book pages.
 """
 from __future__ import annotations
 
+import os
+
 import cv2
 import numpy as np
 from PIL import Image
 
+from app.services.board_tiles import BoardTiles
+
 
 # --------------------------------------------------------------------------------------
 # Existing helpers (kept for compatibility)
@@ -215,6 +219,75 @@ def _warp(bgr: np.ndarray, corners4: np.ndarray, out_size: int = 800) -> np.ndar
     return cv2.warpPerspective(bgr, M, (out_size, out_size), flags=cv2.INTER_CUBIC)
 
 
+def board_size_for_tiles(tile_size: int, padding: int = 2) -> int:
+    """
+    Warped board side such that slicing with `padding` yields tile_size x tile_size tiles.
+    """
+    return 8 * (tile_size + 2 * padding)
+
+
+def _warp_to_tiles(img: np.ndarray, corners4: np.ndarray, tile_size: int,
+                   padding: int = 2, trim_ratio: float = 0.03) -> np.ndarray:
+    """
+    One warpPerspective straight to classifier resolution.
+
+    The inner trim is folded into the homography (the untrimmed board maps to
+    [-m, size + m]), so the trimmed board lands exactly on
+    board_size_for_tiles(tile_size, padding) pixels in a preallocated buffer
+    and uniform slicing gives tiles that need no further resize.
+    """
+    size = board_size_for_tiles(tile_size, padding)
+    corners4 = corners4.astype(np.float32)
+
+    # Large shrink factors alias with bilinear warping; pre-shrink with area averaging
+    side = max(np.linalg.norm(corners4[0] - corners4[1]), np.linalg.norm(corners4[0] - corners4[3]))
+    shrink = side / float(size)
+    if shrink > 2.0:
+        f = 1.5 / shrink
+        img = cv2.resize(img, (max(1, int(img.shape[1] * f)), max(1, int(img.shape[0] * f))),
+                         interpolation=cv2.INTER_AREA)
+        corners4 = corners4 * f
+
+    m = size * trim_ratio / (1.0 - 2.0 * trim_ratio)
+    dst = np.array([[-m, -m], [size-1+m, -m], [size-1+m, size-1+m], [-m, size-1+m]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(corners4, dst)
+    out = np.empty((size, size) + img.shape[2:], dtype=img.dtype)
+    cv2.warpPerspective(img, M, (size, size), dst=out, flags=cv2.INTER_LINEAR,
+                        borderMode=cv2.BORDER_REPLICATE)
+    return out
+
+
+def _warp_output(bgr: np.ndarray, corners4: np.ndarray, out_size: int, tile_size: int | None,
+                 padding: int, trim_ratio: float, dbg_name: str | None = None) -> Image.Image:
+    """
+    Warp + trim the board and return it as an RGB PIL image.
+    With tile_size, the warp targets classifier resolution directly.
+    """
+    if tile_size:
+        warped = _warp_to_tiles(bgr, corners4, tile_size, padding=padding, trim_ratio=trim_ratio)
+    else:
+        warped = _trim_inner_board(_warp(bgr, corners4, out_size=out_size), trim_ratio)
+    if dbg_name:
+        import tempfile
+        cv2.imwrite(os.path.join(tempfile.gettempdir(), dbg_name), warped)
+    return Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB))
+
+
+def warp_board_from_corners(image: Image.Image, corners, out_size: int = 800, trim_ratio: float = 0.0,
+                            tile_size: int | None = None, padding: int = 2):
+    """
+    Warp the board from its 4 outer corners (any order), as
+    detect_and_warp_board and the screenshot path report them; trim_ratio
+    cuts a frame off inside the corners.
+    With tile_size, the output is board_size_for_tiles(tile_size, padding) wide.
+    Returns: PIL warped image
+    """
+    arr = np.asarray(image)
+    bgr = cv2.cvtColor(arr, cv2.COLOR_GRAY2BGR) if arr.ndim == 2 else cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+    c4 = _order_corners(np.asarray(corners, dtype=np.float32).reshape(4, 2))
+    return _warp_output(bgr, c4, out_size, tile_size, padding, trim_ratio)
+
+
 def _trim_inner_board(warped_bgr: np.ndarray, trim_ratio: float = 0.03) -> np.ndarray:
     """
     Trim a small border (e.g., red/wooden frame) so the tiles align perfectly.
@@ -225,14 +298,342 @@ def _trim_inner_board(warped_bgr: np.ndarray, trim_ratio: float = 0.03) -> np.nd
     return warped_bgr[m:H-m, m:W-m]
 
 
-def detect_and_warp_board(image: Image.Image, out_size: int = 800):
+# Pyramid SB detection: find corners on a downscaled copy, refine at full resolution
+SB_PYRAMID = os.getenv("SB_PYRAMID", "1") != "0"
+SB_PYRAMID_MAX_SIDE = int(os.getenv("SB_PYRAMID_MAX_SIDE", "800"))
+# If one SB stage takes longer than this, the remaining (larger) stages are skipped
+SB_STAGE_BUDGET_MS = float(os.getenv("SB_STAGE_BUDGET_MS", "1500"))
+
+
+def _sb_find_inner_corners(gray: np.ndarray):
+    """
+    Run findChessboardCornersSB for the 7x7 inner corners.
+    Returns (49, 2) float32 corners or None.
+    """
+    pattern = (7,7)
+    flags = (cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+    try:
+        ok, corners = cv2.findChessboardCornersSB(gray, pattern, flags=flags)
+    except Exception:
+        return None
+    if not ok or corners is None or corners.shape[0] != 49:
+        return None
+    return corners.squeeze(1).astype(np.float32)
+
+
+def _outer_corners_from_inner(corners: np.ndarray) -> np.ndarray:
+    """
+    Extrapolate the 4 outer board corners from the 7x7 inner-corner grid.
+    """
+    grid = corners.reshape(7,7,2)
+
+    def fit_line(pts):
+        vx, vy, x0, y0 = cv2.fitLine(pts.astype(np.float32), cv2.DIST_L2, 0, 0.01, 0.01)
+        p1 = np.array([x0 - vx*10000, y0 - vy*10000]).ravel()
+        p2 = np.array([x0 + vx*10000, y0 + vy*10000]).ravel()
+        return p1, p2
+
+    def intersect(p1, p2, p3, p4):
+        A = np.array([p2 - p1, p3 - p4]).T
+        b = (p3 - p1)
+        t = np.linalg.lstsq(A, b, rcond=None)[0][0]
+        return p1 + t*(p2 - p1)
+
+    top, bot = grid[0,:,:], grid[-1,:,:]
+    left, right = grid[:,0,:], grid[:,-1,:]
+    t1,t2 = fit_line(top); b1,b2 = fit_line(bot)
+    l1,l2 = fit_line(left); r1,r2 = fit_line(right)
+
+    TL_in = intersect(t1,t2,l1,l2)
+    TR_in = intersect(t1,t2,r1,r2)
+    BR_in = intersect(b1,b2,r1,r2)
+    BL_in = intersect(b1,b2,l1,l2)
+
+    step_h = (TR_in - TL_in)/7.0
+    step_v = (BL_in - TL_in)/7.0
+    TL = TL_in - step_h - step_v
+    TR = TR_in + step_h - step_v
+    BR = BR_in + step_h + step_v
+    BL = BL_in - step_h + step_v
+    return _order_corners(np.array([TL,TR,BR,BL], dtype=np.float32))
+
+
+def _sb_detect_pyramid(gray: np.ndarray, max_side: int = SB_PYRAMID_MAX_SIDE,
+                       stage_budget_ms: float = SB_STAGE_BUDGET_MS):
+    """
+    Coarse-to-fine SB detection for large images.
+
+    Detects the inner corners on a downscaled copy (max side `max_side`, then
+    1.5x that if the first level fails and time allows), maps them back to
+    full resolution and refines each with cornerSubPix in a small window.
+
+    Returns:
+        (49, 2) float32 inner corners in full-resolution coordinates, or None
+    """
+    import time
+
+    H, W = gray.shape[:2]
+    base = max_side / float(max(H, W))
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+
+    for scale in (base, base * 1.5):
+        if scale >= 1.0:
+            break
+        t0 = time.perf_counter()
+        small = cv2.resize(gray, (int(W*scale), int(H*scale)), interpolation=cv2.INTER_AREA)
+        inner = _sb_find_inner_corners(clahe.apply(small))
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        print(f"  🔺 SB pyramid level {small.shape[1]}x{small.shape[0]}: "
+              f"{'found' if inner is not None else 'no board'} ({elapsed_ms:.0f}ms)")
+
+        if inner is not None:
+            inner_full = (inner / scale).astype(np.float32)
+
+            # Refine in small windows at full resolution (less than a quarter square)
+            square_px = max(np.linalg.norm(inner_full[6] - inner_full[0]) / 6.0, 8.0)
+            win = int(max(2, min(np.ceil(2.0 / scale), square_px / 4)))
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+            refined = cv2.cornerSubPix(gray, inner_full.reshape(-1,1,2), (win, win), (-1,-1), criteria)
+            return refined.reshape(-1,2)
+
+        if elapsed_ms > stage_budget_ms:
+            print(f"  ⏱️ SB stage over budget ({stage_budget_ms:.0f}ms), skipping larger levels")
+            break
+    return None
+
+
+def _contour_mask(g: np.ndarray) -> np.ndarray:
+    """
+    Binary mask of board-like outlines (denoise, sharpen, adaptive threshold,
+    close) for contour detection on a CLAHE-equalized gray image.
+    """
+    den = cv2.bilateralFilter(g, 9, 50, 50)
+    sharp = cv2.filter2D(den, -1, np.array([[-1,-1,-1],[-1,9,-1],[-1,-1,-1]]))
+    thr = cv2.adaptiveThreshold(sharp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                cv2.THRESH_BINARY_INV, 31, 5)
+    return cv2.morphologyEx(thr, cv2.MORPH_CLOSE, np.ones((5,5),np.uint8), iterations=2)
+
+
+def _quad_shape(rect: np.ndarray) -> tuple[float, float, float]:
+    # (area, squareness 0..1, right-angle score 0..1) of ordered corners
+    sides = [
+        np.linalg.norm(rect[0]-rect[1]),
+        np.linalg.norm(rect[1]-rect[2]),
+        np.linalg.norm(rect[2]-rect[3]),
+        np.linalg.norm(rect[3]-rect[0]),
+    ]
+    w = (sides[0] + sides[2]) / 2.0
+    h = (sides[1] + sides[3]) / 2.0
+    ratio = max(w,h)/max(1.0,min(w,h))
+    square_score = max(0.0, 1.0 - abs(ratio - 1.0))
+
+    def angle(a,b,c):
+        v1 = a-b; v2 = c-b
+        cos = np.dot(v1,v2) / (np.linalg.norm(v1)*np.linalg.norm(v2)+1e-6)
+        ang = np.degrees(np.arccos(np.clip(cos,-1,1)))
+        return ang
+    angs = [
+        angle(rect[3],rect[0],rect[1]),
+        angle(rect[0],rect[1],rect[2]),
+        angle(rect[1],rect[2],rect[3]),
+        angle(rect[2],rect[3],rect[0]),
+    ]
+    angle_score = 1.0 - min(np.mean([abs(a-90) for a in angs]) / 30.0, 1.0)
+    return w*h, square_score, angle_score
+
+
+def quad_score(pts4: np.ndarray, area_img: float):
+    """
+    Board-likeness of a 4-point contour approximation: large (relative to
+    area_img), square and right-angled.
+    Returns: (score 0..1, ordered corners)
+    """
+    rect = _order_corners(pts4.reshape(-1,2).astype(np.float32))
+    area, square_score, angle_score = _quad_shape(rect)
+    area_score = min(area / (area_img*0.9), 1.0)
+    return 0.5*area_score + 0.3*square_score + 0.2*angle_score, rect
+
+
+def tighten_quad_to_frame(gray: np.ndarray, rect: np.ndarray, max_inset: float = 0.05) -> np.ndarray:
+    """
+    Shrink a diagram outline to the inside of its printed frame line: the
+    quad is warped top-down, rows / columns that are (almost) entirely dark
+    are peeled off each side (at most max_inset of the side) and the inner
+    rectangle is mapped back to image pixels.
+    """
+    rect = np.asarray(rect, dtype=np.float32)
+    # about native resolution, so the frame is peeled off pixel by pixel
+    size = int(np.clip(max(np.linalg.norm(rect[1]-rect[0]), np.linalg.norm(rect[3]-rect[0])), 64, 1024))
+    dst = np.array([[0,0],[size,0],[size,size],[0,size]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(rect, dst)
+    top_down = cv2.warpPerspective(gray, M, (size, size))
+    _, dark = cv2.threshold(top_down, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    rows, cols = dark.mean(axis=1), dark.mean(axis=0)
+
+    def inset(profile):
+        n = 0
+        while n < int(size*max_inset) and profile[n] > 0.85:
+            n += 1
+        return n
+
+    left, right = inset(cols), inset(cols[::-1])
+    top, bottom = inset(rows), inset(rows[::-1])
+    inner = np.array([[left, top], [size-right, top], [size-right, size-bottom], [left, size-bottom]],
+                     dtype=np.float32)
+    return cv2.perspectiveTransform(inner.reshape(-1,1,2), np.linalg.inv(M)).reshape(4,2)
+
+
+def trim_quad(rect: np.ndarray, trim_ratio: float = 0.03) -> np.ndarray:
+    """
+    Corners of what a warp with `trim_ratio` keeps of the quad: the trimmed
+    square mapped back through the quad's homography. Warping from them
+    without a trim gives the same board.
+    """
+    rect = _order_corners(np.asarray(rect, dtype=np.float32).reshape(4, 2))
+    unit = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(unit, rect)
+    t = trim_ratio
+    inner = np.array([[t, t], [1-t, t], [1-t, 1-t], [t, 1-t]], dtype=np.float32)
+    return cv2.perspectiveTransform(inner.reshape(-1,1,2), M).reshape(4,2)
+
+
+# Multi-board pages: shape thresholds for a quad to count as a diagram
+PAGE_MIN_BOARD_RATIO = float(os.getenv("PAGE_MIN_BOARD_RATIO", "0.01"))  # of the page area
+PAGE_MIN_SQUARENESS = 0.75   # aspect ratio up to ~1.33
+PAGE_MIN_ANGLE_SCORE = 0.6   # corners within ~12 degrees of 90 on average
+# Candidates overlapping a kept board by more than this (of the smaller box) are dropped
+PAGE_NMS_OVERLAP = 0.3
+# Checkerboard test of a candidate: cells (of 64) whose corner colour is
+# nearer its own square colour than the other one, and the gray-level gap
+# between the two colours (boards measure 60+, frames around boards ~40)
+PAGE_GRID_CELL = 24
+PAGE_MIN_GRID_CELLS = 52
+PAGE_MIN_SQUARE_CONTRAST = 12.0
+
+
+def _box_overlap(a, b) -> float:
+    # intersection / smaller area of two (x, y, w, h) boxes
+    ix = max(0.0, min(a[0]+a[2], b[0]+b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1]+a[3], b[1]+b[3]) - max(a[1], b[1]))
+    smaller = min(a[2]*a[3], b[2]*b[3])
+    return ix*iy / smaller if smaller > 0 else 0.0
+
+
+def _reading_order(boxes) -> list[int]:
+    # indices of (x, y, w, h) boxes row by row (top to bottom), left to right
+    order = sorted(range(len(boxes)), key=lambda i: boxes[i][1] + boxes[i][3]/2)
+    rows, row_y = [], None
+    for i in order:
+        cy, h = boxes[i][1] + boxes[i][3]/2, boxes[i][3]
+        if row_y is None or cy - row_y > h/2:
+            rows.append([])
+            row_y = cy
+        rows[-1].append(i)
+    return [i for row in rows for i in sorted(row, key=lambda j: boxes[j][0])]
+
+
+def has_board_grid(gray: np.ndarray, rect: np.ndarray) -> bool:
+    """
+    Whether a quad (ordered corners) holds an 8x8 board: warped to 8 cells a
+    side, the corners of the cells (inset past grid lines and frames, rarely
+    covered by pieces) must alternate between a light and a dark colour.
+    A frame or text box around several diagrams fails, as the cells then
+    straddle boards and margins.
+    """
+    side = 8 * PAGE_GRID_CELL
+    dst = np.float32([[0, 0], [side - 1, 0], [side - 1, side - 1], [0, side - 1]])
+    M = cv2.getPerspectiveTransform(np.float32(rect), dst)
+    board = cv2.warpPerspective(gray, M, (side, side), flags=cv2.INTER_AREA).astype(np.float32)
+    cells = board.reshape(8, PAGE_GRID_CELL, 8, PAGE_GRID_CELL).swapaxes(1, 2)
+
+    i, k = PAGE_GRID_CELL // 5, 3
+    near, far = slice(i, i + k), slice(-i - k, -i)
+    corners = [cells[:, :, ys, xs].mean(axis=(2, 3)) for ys in (near, far) for xs in (near, far)]
+    colours = np.median(corners, axis=0)
+
+    parity = (np.add.outer(np.arange(8), np.arange(8)) % 2).astype(bool)
+    light, dark = np.median(colours[~parity]), np.median(colours[parity])
+    if abs(light - dark) < PAGE_MIN_SQUARE_CONTRAST:
+        return False
+    own = np.where(parity, dark, light)
+    other = np.where(parity, light, dark)
+    return int((np.abs(colours - own) < np.abs(colours - other)).sum()) >= PAGE_MIN_GRID_CELLS
+
+
+def detect_board_quads(image: Image.Image, max_boards: int = 8,
+                       min_area_ratio: float = PAGE_MIN_BOARD_RATIO) -> list[np.ndarray]:
+    """
+    Every board-like quadrilateral of a page (book / magazine scan) in one
+    contour pass: all contours (not just external ones, so diagrams inside
+    frames are found) are approximated to convex quads, filtered on shape
+    and on an 8x8 checkerboard (has_board_grid, so page borders and text
+    boxes around diagrams are not boards), ranked with quad_score and
+    de-duplicated by overlap, so double outlines collapse into the outermost
+    frame, which is then tightened to the grid (tighten_quad_to_frame).
+    Returns: ordered corners (float32 4x2, input-image pixels) of each
+             board's grid, in reading order
+    """
+    arr = np.array(image)
+    gray = arr if arr.ndim == 2 else cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    thr = _contour_mask(clahe.apply(gray))
+    contours,_ = cv2.findContours(thr, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    H, W = gray.shape[:2]
+    area_img = float(H*W)
+    candidates = []
+    for c in contours:
+        area = cv2.contourArea(c)
+        if area < min_area_ratio*area_img or area > 0.95*area_img:
+            continue
+        peri = cv2.arcLength(c, True)
+        best = None
+        for eps in (0.01, 0.015, 0.02, 0.03, 0.05):
+            approx = cv2.approxPolyDP(c, eps*peri, True)
+            if len(approx) == 4 and cv2.isContourConvex(approx):
+                score, rect = quad_score(approx, area_img)
+                if best is None or score > best[0]:
+                    best = (score, rect)
+        if best is None:
+            continue
+        _, square_score, angle_score = _quad_shape(best[1])
+        if square_score >= PAGE_MIN_SQUARENESS and angle_score >= PAGE_MIN_ANGLE_SCORE and \
+                has_board_grid(gray, best[1]):
+            candidates.append(best)
+
+    # Greedy NMS; the area term of quad_score makes a board's outer frame win
+    # over its inner outline
+    kept, boxes = [], []
+    for score, rect in sorted(candidates, key=lambda sr: -sr[0]):
+        x, y, w, h = cv2.boundingRect(rect.astype(np.int32))
+        if any(_box_overlap((x, y, w, h), b) > PAGE_NMS_OVERLAP for b in boxes):
+            continue
+        kept.append(rect)
+        boxes.append((x, y, w, h))
+        if len(kept) >= max_boards:
+            break
+    print(f"📚 Page detection: {len(contours)} contours, {len(candidates)} quads, {len(kept)} boards")
+    return [tighten_quad_to_frame(gray, kept[i]) for i in _reading_order(boxes)]
+
+
+def detect_and_warp_board(image: Image.Image, out_size: int = 800, pyramid: bool | None = None,
+                          tile_size: int | None = None, padding: int = 2,
+                          sb_scales=(1.0, 0.75, 1.25), cancel=None):
     """
     Multi-strategy board detection:
-      (A) SB inner-corner detector at several scales
+      (A) SB inner-corner detector - coarse-to-fine pyramid on large images,
+          otherwise at each of `sb_scales`
       (B) Robust contour fallback with minAreaRect rescue
-    Returns: (PIL warped image WITH inner trim, corners4 list) or (None, None)
+    With tile_size, the board is warped straight to the resolution the
+    classifier consumes (8 x (tile_size + 2*padding)) instead of out_size,
+    so extract_board_squares_warped(padding=padding) yields tiles of exactly
+    tile_size pixels. A set `cancel` Event stops the search between scales
+    and before the contour fallback.
+    Returns: (PIL warped image WITH inner trim, corners4 list) or (None, None);
+             the corners outline the trimmed board, so
+             warp_board_from_corners(image, corners4) reproduces the warp
     """
-    import tempfile, os, traceback
+    import tempfile, time, traceback
 
     arr = np.array(image)
     if arr.ndim == 2:
@@ -243,76 +644,53 @@ def detect_and_warp_board(image: Image.Image, out_size: int = 800):
         gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
 
     dbg_dir = tempfile.gettempdir()
+
+    if pyramid is None:
+        pyramid = SB_PYRAMID and max(gray.shape[:2]) > SB_PYRAMID_MAX_SIDE
+
+    # ---------- (A0) SB pyramid for large images ----------
+    if pyramid:
+        try:
+            inner = _sb_detect_pyramid(gray)
+            if inner is not None:
+                c4 = _outer_corners_from_inner(inner)
+                pil = _warp_output(bgr, c4, out_size, tile_size, padding, 0.03, "dbg_warp_sb.jpg")
+                return pil, trim_quad(c4, 0.03).tolist()
+        except Exception:
+            print("⚠️ SB pyramid failed:\n" + traceback.format_exc())
+
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
     g = clahe.apply(gray)
 
     # ---------- (A) SB inner-corner detector ----------
-    def sb_try(gray_in, bgr_in):
-        pattern = (7,7)
-        flags = (cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+    if not pyramid:
         try:
-            ok, corners = cv2.findChessboardCornersSB(gray_in, pattern, flags=flags)
+            for scale in sb_scales:
+                if cancel is not None and cancel.is_set():
+                    return None, None
+                t0 = time.perf_counter()
+                if abs(scale-1.0) < 1e-6:
+                    g2, bgr2 = g, bgr
+                else:
+                    bgr2 = cv2.resize(bgr, (int(bgr.shape[1]*scale), int(bgr.shape[0]*scale)), interpolation=cv2.INTER_CUBIC)
+                    g2 = cv2.resize(g, (bgr2.shape[1], bgr2.shape[0]), interpolation=cv2.INTER_CUBIC)
+                inner = _sb_find_inner_corners(g2)
+                if inner is not None:
+                    c4 = _outer_corners_from_inner(inner)
+                    pil = _warp_output(bgr2, c4, out_size, tile_size, padding, 0.03, "dbg_warp_sb.jpg")
+                    # report corners in input-image coordinates
+                    return pil, (trim_quad(c4, 0.03) / scale).tolist()
+                if (time.perf_counter() - t0) * 1000 > SB_STAGE_BUDGET_MS:
+                    print(f"  ⏱️ SB stage over budget ({SB_STAGE_BUDGET_MS:.0f}ms), skipping remaining scales")
+                    break
         except Exception:
-            return None
-        if not ok or corners is None or corners.shape[0] != 49:
-            return None
-        corners = corners.squeeze(1).astype(np.float32)
-        grid = corners.reshape(7,7,2)
-
-        def fit_line(pts):
-            vx, vy, x0, y0 = cv2.fitLine(pts.astype(np.float32), cv2.DIST_L2, 0, 0.01, 0.01)
-            p1 = np.array([x0 - vx*10000, y0 - vy*10000]).ravel()
-            p2 = np.array([x0 + vx*10000, y0 + vy*10000]).ravel()
-            return p1, p2
-
-        def intersect(p1, p2, p3, p4):
-            A = np.array([p2 - p1, p3 - p4]).T
-            b = (p3 - p1)
-            t = np.linalg.lstsq(A, b, rcond=None)[0][0]
-            return p1 + t*(p2 - p1)
-
-        top, bot = grid[0,:,:], grid[-1,:,:]
-        left, right = grid[:,0,:], grid[:,-1,:]
-        t1,t2 = fit_line(top); b1,b2 = fit_line(bot)
-        l1,l2 = fit_line(left); r1,r2 = fit_line(right)
-
-        TL_in = intersect(t1,t2,l1,l2)
-        TR_in = intersect(t1,t2,r1,r2)
-        BR_in = intersect(b1,b2,r1,r2)
-        BL_in = intersect(b1,b2,l1,l2)
-
-        step_h = (TR_in - TL_in)/7.0
-        step_v = (BL_in - TL_in)/7.0
-        TL = TL_in - step_h - step_v
-        TR = TR_in + step_h - step_v
-        BR = BR_in + step_h + step_v
-        BL = BL_in - step_h + step_v
-        return _order_corners(np.array([TL,TR,BR,BL], dtype=np.float32))
-
-    try:
-        for scale in (1.0, 0.75, 1.25):
-            if abs(scale-1.0) < 1e-6:
-                g2, bgr2 = g, bgr
-            else:
-                bgr2 = cv2.resize(bgr, (int(bgr.shape[1]*scale), int(bgr.shape[0]*scale)), interpolation=cv2.INTER_CUBIC)
-                g2 = cv2.resize(g, (bgr2.shape[1], bgr2.shape[0]), interpolation=cv2.INTER_CUBIC)
-            c4 = sb_try(g2, bgr2)
-            if c4 is not None:
-                warped = _warp(bgr2, c4, out_size=out_size)
-                warped = _trim_inner_board(warped, 0.03)
-                cv2.imwrite(os.path.join(dbg_dir, "dbg_warp_sb.jpg"), warped)
-                pil = Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB))
-                return pil, c4.tolist()
-    except Exception:
-        print("⚠️ SB detector failed:\n" + traceback.format_exc())
+            print("⚠️ SB detector failed:\n" + traceback.format_exc())
 
     # ---------- (B) Contour fallback ----------
+    if cancel is not None and cancel.is_set():
+        return None, None
     try:
-        den = cv2.bilateralFilter(g, 9, 50, 50)
-        sharp = cv2.filter2D(den, -1, np.array([[-1,-1,-1],[-1,9,-1],[-1,-1,-1]]))
-        thr = cv2.adaptiveThreshold(sharp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                    cv2.THRESH_BINARY_INV, 31, 5)
-        thr = cv2.morphologyEx(thr, cv2.MORPH_CLOSE, np.ones((5,5),np.uint8), iterations=2)
+        thr = _contour_mask(g)
 
         cv2.imwrite(os.path.join(dbg_dir, "dbg_fallback_thr.png"), thr)
         contours,_ = cv2.findContours(thr, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -322,36 +700,6 @@ def detect_and_warp_board(image: Image.Image, out_size: int = 800):
         H, W = g.shape[:2]
         area_img = H*W
 
-        def quad_score(pts4):
-            pts = pts4.reshape(-1,2).astype(np.float32)
-            rect = _order_corners(pts)
-            sides = [
-                np.linalg.norm(rect[0]-rect[1]),
-                np.linalg.norm(rect[1]-rect[2]),
-                np.linalg.norm(rect[2]-rect[3]),
-                np.linalg.norm(rect[3]-rect[0]),
-            ]
-            w = (sides[0] + sides[2]) / 2.0
-            h = (sides[1] + sides[3]) / 2.0
-            area = w*h
-            area_score = min(area / (area_img*0.9), 1.0)
-            ratio = max(w,h)/max(1.0,min(w,h))
-            square_score = max(0.0, 1.0 - abs(ratio - 1.0))
-
-            def angle(a,b,c):
-                v1 = a-b; v2 = c-b
-                cos = np.dot(v1,v2) / (np.linalg.norm(v1)*np.linalg.norm(v2)+1e-6)
-                ang = np.degrees(np.arccos(np.clip(cos,-1,1)))
-                return ang
-            angs = [
-                angle(rect[3],rect[0],rect[1]),
-                angle(rect[0],rect[1],rect[2]),
-                angle(rect[1],rect[2],rect[3]),
-                angle(rect[2],rect[3],rect[0]),
-            ]
-            angle_score = 1.0 - min(np.mean([abs(a-90) for a in angs]) / 30.0, 1.0)
-            return 0.5*area_score + 0.3*square_score + 0.2*angle_score, rect
-
         best = None
         best_score = -1
         for c in contours:
@@ -361,7 +709,7 @@ def detect_and_warp_board(image: Image.Image, out_size: int = 800):
             for eps in (0.01, 0.015, 0.02, 0.03, 0.05):
                 approx = cv2.approxPolyDP(c, eps*peri, True)
                 if len(approx) == 4 and cv2.isContourConvex(approx):
-                    score, rect = quad_score(approx)
+                    score, rect = quad_score(approx, area_img)
                     if score > best_score:
                         best_score, best = score, rect
 
@@ -371,31 +719,19 @@ def detect_and_warp_board(image: Image.Image, out_size: int = 800):
             box = cv2.boxPoints(rect).astype(np.float32)
             best = _order_corners(box)
 
-        warped = _warp(bgr, best, out_size=out_size)
-        warped = _trim_inner_board(warped, 0.03)
-        cv2.imwrite(os.path.join(dbg_dir, "dbg_warp_fallback.jpg"), warped)
-        pil = Image.fromarray(cv2.cvtColor(warped, cv2.COLOR_BGR2RGB))
-        return pil, best.tolist()
+        pil = _warp_output(bgr, best, out_size, tile_size, padding, 0.03, "dbg_warp_fallback.jpg")
+        return pil, trim_quad(best, 0.03).tolist()
     except Exception:
         import traceback
         print("⚠️ Contour fallback failed:\n" + traceback.format_exc())
         return None, None
 
 
-def extract_board_squares_warped(warped_img: Image.Image, padding: int = 2) -> list[Image.Image]:
+def extract_board_squares_warped(warped_img, padding: int = 2) -> BoardTiles:
     """
     Slice the warped (square, top-down) board into 64 tiles.
+
+    Returns:
+        BoardTiles - strided views into the warped board (no per-tile copies)
     """
-    arr = np.array(warped_img)
-    H, W = arr.shape[:2]
-    step = H // 8
-    tiles = []
-    for r in range(8):
-        for c in range(8):
-            y1 = max(0, r*step + padding)
-            y2 = min(H, (r+1)*step - padding)
-            x1 = max(0, c*step + padding)
-            x2 = min(W, (c+1)*step - padding)
-            if y2 > y1 and x2 > x1:
-                tiles.append(Image.fromarray(arr[y1:y2, x1:x2]))
-    return tiles
+    return BoardTiles.from_board(warped_img, padding=padding)
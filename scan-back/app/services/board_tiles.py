@@ -0,0 +1,145 @@
+"""
+Zero-copy tile container for the 64 squares of a board.
+
+Tiles are strided views into one contiguous board array instead of 64
+separate PIL Images, so classifiers read the pixels without copying them
+again. PIL conversion happens only at the API boundary when a PNG is
+actually emitted.
+"""
+from __future__ import annotations
+
+import numpy as np
+from PIL import Image
+
+
+class BoardTiles:
+    """
+    64 tiles (row by row, a8 to h1) backed by one array.
+
+    Behaves like the old list of 64 PIL Images for the detectors: len(),
+    indexing and iteration return (h, w, c) RGB uint8 array views.
+    """
+
+    def __init__(self, grid: np.ndarray, board: np.ndarray | None = None, rects=None):
+        # grid: (8, 8, h, w, c) - usually a strided view into `board`
+        # rects: 64 (x, y, w, h) tile rectangles in `board` pixels, if known
+        self._grid = grid
+        self.board = board
+        self.rects = rects
+        self._tensor = None
+
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_board(cls, board, padding: int = 2) -> "BoardTiles":
+        """
+        Slice a warped, square, top-down board into 64 uniform tiles (views, no copy).
+        """
+        arr = np.asarray(board)
+        if arr.ndim == 2:
+            arr = arr[..., None]
+        arr = np.ascontiguousarray(arr)
+
+        cell = arr.shape[0] // 8
+        if cell <= 2 * padding:
+            raise ValueError(f"Board too small to slice ({arr.shape[0]}px, padding {padding})")
+
+        c = arr.shape[2]
+        grid = arr[:8 * cell, :8 * cell].reshape(8, cell, 8, cell, c).swapaxes(1, 2)
+        grid = grid[:, :, padding:cell - padding, padding:cell - padding]
+        size = cell - 2 * padding
+        rects = [(c * cell + padding, r * cell + padding, size, size) for r in range(8) for c in range(8)]
+        return cls(grid, board=arr, rects=rects)
+
+    @classmethod
+    def from_grid(cls, image, h_segments, v_segments, padding: int = 2) -> "BoardTiles":
+        """
+        Cut 64 tiles along (possibly uneven) grid lines.
+        Tiles are cropped to a common size and packed into one contiguous array.
+
+        Raises:
+            ValueError: unless both grids are 9 strictly increasing positions
+                within the image
+        """
+        arr = np.asarray(image)
+        if arr.ndim == 2:
+            arr = arr[..., None]
+
+        for segments, size in ((h_segments, arr.shape[0]), (v_segments, arr.shape[1])):
+            if len(segments) != 9:
+                raise ValueError("Expected 9 horizontal and 9 vertical segment positions")
+            if any(b <= a for a, b in zip(segments, segments[1:])):
+                raise ValueError("Segment positions must be strictly increasing")
+            if segments[0] < 0 or segments[-1] > size:
+                raise ValueError(f"Segment positions must lie within the board (0-{size})")
+
+        h = min(h_segments[r + 1] - h_segments[r] for r in range(8)) - 2 * padding
+        w = min(v_segments[c + 1] - v_segments[c] for c in range(8)) - 2 * padding
+        if h <= 0 or w <= 0:
+            raise ValueError("Grid cells too small to slice")
+
+        packed = np.empty((8, 8, h, w, arr.shape[2]), dtype=arr.dtype)
+        rects = []
+        for r in range(8):
+            y1 = max(0, int(h_segments[r]) + padding)
+            for c in range(8):
+                x1 = max(0, int(v_segments[c]) + padding)
+                tile = arr[y1:y1 + h, x1:x1 + w]
+                packed[r, c, :tile.shape[0], :tile.shape[1]] = tile
+                rects.append((x1, y1, tile.shape[1], tile.shape[0]))
+        return cls(packed, board=arr, rects=rects)
+
+    @classmethod
+    def from_list(cls, tiles) -> "BoardTiles":
+        """
+        Pack 64 PIL Images / arrays (cropped to their common size) into one array.
+        """
+        if isinstance(tiles, BoardTiles):
+            return tiles
+        arrays = [np.asarray(t) for t in tiles]
+        if len(arrays) != 64:
+            raise ValueError(f"Expected 64 tiles, got {len(arrays)}")
+        arrays = [a[..., None] if a.ndim == 2 else a for a in arrays]
+        h = min(a.shape[0] for a in arrays)
+        w = min(a.shape[1] for a in arrays)
+        packed = np.stack([a[:h, :w] for a in arrays]).reshape(8, 8, h, w, arrays[0].shape[2])
+        return cls(packed)
+
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return 64
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if index < 0:
+            index += 64
+        if not 0 <= index < 64:
+            raise IndexError(index)
+        tile = self._grid[index // 8, index % 8]
+        return tile[..., 0] if tile.shape[-1] == 1 else tile
+
+    def __iter__(self):
+        for i in range(64):
+            yield self[i]
+
+    @property
+    def tile_shape(self):
+        """(h, w) of every tile."""
+        return self._grid.shape[2:4]
+
+    @property
+    def tensor(self) -> np.ndarray:
+        """
+        (64, h, w, c) contiguous tensor (built once on first access).
+        """
+        if self._tensor is None:
+            g = self._grid
+            self._tensor = np.ascontiguousarray(g).reshape((64,) + g.shape[2:])
+        return self._tensor
+
+    def to_pil(self, index: int) -> Image.Image:
+        """
+        PIL Image of one tile (API boundary only - copies the pixels).
+        """
+        return Image.fromarray(np.ascontiguousarray(self[index]))
+
+    def to_pil_list(self) -> list[Image.Image]:
+        return [self.to_pil(i) for i in range(64)]
@@ -0,0 +1,156 @@
+"""
+Bulk recognition of many board images (zip archive or multipart batch).
+
+Images are read one at a time (zip members straight from the spooled upload)
+and recognized by BULK_WORKERS threads of the server process, like jobs:
+they share the loaded models, caches, template store and strategy stats,
+and each running item counts towards the load tier, so a large batch
+degrades quality (and interactive requests) like any other traffic. At most
+BULK_MAX_IN_FLIGHT images are decoded or queued at any moment, so memory
+stays bounded however large the archive is. Results are yielded as soon as
+each image finishes.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Images recognized concurrently (the cap of bulk work on the server)
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Images read but not yet finished (bounds memory)
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", str(2 * BULK_WORKERS)))
+BULK_MAX_IMAGES = int(os.getenv("BULK_MAX_IMAGES", "1000"))
+BULK_MAX_IMAGE_BYTES = int(os.getenv("BULK_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_bulk_pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # Separate from the race executor: race-mode items submit their
+                # strategies there and wait for them
+                _POOL = ThreadPoolExecutor(max_workers=BULK_WORKERS, thread_name_prefix="vision-bulk")
+    return _POOL
+
+
+def shutdown_bulk_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def recognize_image_bytes(contents: bytes, options: dict) -> dict:
+    """
+    Decode + recognize one image (runs on a bulk worker thread).
+
+    Returns:
+        {"fen", "confidence", "strategy", "qualityTier", "ms"} or {"error", "ms"}
+    """
+    from app.services.image_io import decode_upload
+    from app.services.vision_service import recognize_upload
+
+    start = time.perf_counter()
+    try:
+        decoded = decode_upload(contents)
+        result = asyncio.run(recognize_upload(decoded, contents, **options))
+        out = {
+            "fen": result.fen,
+            "confidence": result.confidence,
+            "strategy": result.strategy,
+            "qualityTier": result.qualityTier,
+        }
+    except Exception as e:
+        out = {"error": str(e)}
+    out["ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+    return out
+
+
+def zip_image_sources(fileobj):
+    """
+    (name, reader) pairs for the image members of a zip archive; reader()
+    returns the member's bytes, or raises ValueError if it is too large.
+    Raises zipfile.BadZipFile right away if `fileobj` is not a zip.
+    """
+    archive = zipfile.ZipFile(fileobj)
+
+    def sources():
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if os.path.basename(info.filename).startswith("."):
+                continue  # macOS resource forks etc.
+
+            def reader(info=info):
+                if info.file_size > BULK_MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image larger than {BULK_MAX_IMAGE_BYTES} bytes")
+                return archive.read(info)
+
+            yield info.filename, reader
+
+    return sources()
+
+
+async def recognize_many(sources, options: dict):
+    """
+    Recognize images from `sources` with bounded concurrency.
+
+    Args:
+        sources: iterable of (name, reader) where reader() -> bytes (sync)
+        options: recognize_upload keyword arguments
+
+    Yields:
+        One dict per image ({"index", "name", ...result}) in completion order
+    """
+    from app.services.load_monitor import get_load_monitor
+
+    loop = asyncio.get_running_loop()
+    pool = get_bulk_pool()
+    pending = {}  # future -> (index, name)
+
+    async def recognize(contents):
+        # Every queued item counts towards the load tier while it runs
+        with get_load_monitor().track():
+            return await loop.run_in_executor(pool, recognize_image_bytes, contents, options)
+
+    async def drain():
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        lines = []
+        for future in done:
+            index, name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"Worker failed: {e}"}
+            lines.append({"index": index, "name": name, **result})
+        return lines
+
+    for index, (name, reader) in enumerate(sources):
+        if index >= BULK_MAX_IMAGES:
+            yield {"index": index, "name": name, "error": f"Batch limit of {BULK_MAX_IMAGES} images reached"}
+            break
+        while len(pending) >= BULK_MAX_IN_FLIGHT:
+            for line in await drain():
+                yield line
+        try:
+            # Reading may hit the disk (spooled upload): keep it off the event loop
+            contents = await loop.run_in_executor(None, reader)
+        except Exception as e:
+            yield {"index": index, "name": name, "error": str(e)}
+            continue
+        pending[asyncio.ensure_future(recognize(contents))] = (index, name)
+
+    while pending:
+        for line in await drain():
+            yield line
@@ -7,9 +7,15 @@ from PIL import Image
 import os
 from pathlib import Path
 
+from app.services.board_tiles import BoardTiles
+
 
 # Global model cache
 CNN_MODEL = None
+CNN_BACKEND = None  # 'tflite' | 'keras' once loaded
+CNN_BACKEND_PREFERENCE = os.getenv("CNN_BACKEND", "auto").lower()
+WEIGHTS_PATH = Path(__file__).parent.parent / 'models' / 'chess_cnn_weights.h5'
+CNN_INPUT_SIZE = 64  # model input tile size (pixels)
 CLASS_NAMES = ['bb', 'bk', 'bn', 'bp', 'bq', 'br', 'empty', 'wb', 'wk', 'wn', 'wp', 'wq', 'wr']
 
 # Mapping from class names to FEN symbols
@@ -30,58 +36,86 @@ CLASS_TO_FEN = {
 }
 
 
+def build_keras_model():
+    """
+    Build the MobileNetV2-based Keras classifier and load trained weights.
+
+    Returns:
+        Keras model
+
+    Raises:
+        ImportError if TensorFlow is not installed
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras.applications import MobileNetV2
+    from tensorflow.keras import layers
+
+    # Build a simple model using transfer learning
+    # MobileNetV2 is lightweight and fast
+    base_model = MobileNetV2(
+        input_shape=(CNN_INPUT_SIZE, CNN_INPUT_SIZE, 3),
+        include_top=False,
+        weights='imagenet'
+    )
+    base_model.trainable = False  # Freeze base model
+
+    # Add classification head
+    model = keras.Sequential([
+        base_model,
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.2),
+        layers.Dense(128, activation='relu'),
+        layers.Dropout(0.2),
+        layers.Dense(len(CLASS_NAMES), activation='softmax')
+    ])
+
+    # Try to load pre-trained weights
+    if WEIGHTS_PATH.exists():
+        print(f"  ✅ Loading weights from {WEIGHTS_PATH}")
+        model.load_weights(str(WEIGHTS_PATH))
+    else:
+        print(f"  ⚠️ No pre-trained weights found at {WEIGHTS_PATH}")
+        print(f"  ⚠️ Model will use ImageNet features only (may have lower accuracy)")
+
+    return model
+
+
 def load_cnn_model():
     """
     Load the CNN model for piece classification.
     Uses lazy loading - only loads when first needed.
 
+    Prefers the exported TFLite model (small runtime, memory-mapped weights)
+    and falls back to building the Keras graph only when no export exists.
+    Set CNN_BACKEND=keras or CNN_BACKEND=tflite to force one backend.
+
     Returns:
-        Keras model
+        Model exposing predict_on_batch(), or None if unavailable
     """
-    global CNN_MODEL
+    global CNN_MODEL, CNN_BACKEND
 
     if CNN_MODEL is not None:
         return CNN_MODEL
 
     print("🤖 Loading CNN model for chess piece recognition...")
 
-    try:
-        import tensorflow as tf
-        from tensorflow import keras
-        from tensorflow.keras.applications import MobileNetV2
-        from tensorflow.keras import layers
-
-        # Build a simple model using transfer learning
-        # MobileNetV2 is lightweight and fast
-        base_model = MobileNetV2(
-            input_shape=(64, 64, 3),
-            include_top=False,
-            weights='imagenet'
-        )
-        base_model.trainable = False  # Freeze base model
-
-        # Add classification head
-        model = keras.Sequential([
-            base_model,
-            layers.GlobalAveragePooling2D(),
-            layers.Dropout(0.2),
-            layers.Dense(128, activation='relu'),
-            layers.Dropout(0.2),
-            layers.Dense(len(CLASS_NAMES), activation='softmax')
-        ])
-
-        # Try to load pre-trained weights
-        weights_path = Path(__file__).parent.parent / 'models' / 'chess_cnn_weights.h5'
-
-        if weights_path.exists():
-            print(f"  ✅ Loading weights from {weights_path}")
-            model.load_weights(str(weights_path))
-        else:
-            print(f"  ⚠️ No pre-trained weights found at {weights_path}")
-            print(f"  ⚠️ Model will use ImageNet features only (may have lower accuracy)")
+    if CNN_BACKEND_PREFERENCE in ("auto", "tflite"):
+        from app.services.cnn_runtime import load_exported_cnn_model
 
-        CNN_MODEL = model
-        print("  ✅ CNN model loaded successfully")
+        model = load_exported_cnn_model()
+        if model is not None:
+            CNN_MODEL, CNN_BACKEND = model, "tflite"
+            print("  ✅ CNN model loaded successfully (tflite)")
+            return model
+        if CNN_BACKEND_PREFERENCE == "tflite":
+            print("  ❌ CNN_BACKEND=tflite but no exported model could be loaded")
+            return None
+
+    try:
+        model = build_keras_model()
+        CNN_MODEL, CNN_BACKEND = model, "keras"
+        print("  ✅ CNN model loaded successfully (keras)")
         return model
 
     except ImportError as e:
@@ -94,20 +128,25 @@ def preprocess_square_for_cnn(square_img: Image.Image):
     Preprocess a square image for CNN input.
 
     Args:
-        square_img: PIL Image of chess square
+        square_img: PIL Image (or RGB array) of chess square
 
     Returns:
         Preprocessed numpy array
     """
-    # Resize to 64x64
-    square_resized = square_img.resize((64, 64), Image.Resampling.LANCZOS)
+    square = np.asarray(square_img)
 
     # Convert to RGB if needed
-    if square_resized.mode != 'RGB':
-        square_resized = square_resized.convert('RGB')
+    if square.ndim == 2:
+        square = np.stack([square] * 3, axis=-1)
+    square = square[..., :3]
+
+    # Resize to 64x64 (tiles from a board warped at CNN resolution already are)
+    if square.shape[:2] != (CNN_INPUT_SIZE, CNN_INPUT_SIZE):
+        square = np.asarray(Image.fromarray(square).resize((CNN_INPUT_SIZE, CNN_INPUT_SIZE),
+                                                           Image.Resampling.LANCZOS))
 
-    # Convert to numpy array and normalize
-    img_array = np.array(square_resized, dtype=np.float32)
+    # Convert to float array and normalize
+    img_array = square.astype(np.float32)
 
     # Normalize to [-1, 1] (MobileNetV2 preprocessing)
     img_array = (img_array / 127.5) - 1.0
@@ -118,32 +157,64 @@ def preprocess_square_for_cnn(square_img: Image.Image):
     return img_array
 
 
-def classify_piece_cnn(square_img: Image.Image, model=None, debug=False):
+def preprocess_squares_for_cnn(squares):
     """
-    Classify a chess piece using CNN.
+    Preprocess a list of square images into one CNN input batch.
 
     Args:
-        square_img: PIL Image of chess square
-        model: CNN model (will load if None)
-        debug: Print debug information
+        squares: BoardTiles, or a list of PIL Images / arrays of chess squares
 
     Returns:
-        Tuple of (fen_symbol, confidence)
+        Numpy array of shape (N, 64, 64, 3)
     """
-    if model is None:
-        model = load_cnn_model()
+    if squares is None or len(squares) == 0:
+        return np.zeros((0, 64, 64, 3), dtype=np.float32)
 
-    if model is None:
-        if debug:
-            print("  ❌ CNN model not available")
-        return ('.', 0.0)
+    # Tiles already at CNN resolution (e.g. BoardTiles from a 64px warp):
+    # normalize the whole stack at once instead of tile by tile
+    if isinstance(squares, BoardTiles) and squares.tile_shape == (CNN_INPUT_SIZE, CNN_INPUT_SIZE):
+        batch = squares.tensor
+        if batch.shape[-1] == 3:
+            return batch.astype(np.float32) / 127.5 - 1.0
+
+    return np.concatenate([preprocess_square_for_cnn(sq) for sq in squares], axis=0)
+
+
+def predict_squares_cnn(squares, model=None):
+    """
+    Run the CNN over a list of squares.
+
+    Tiles go through the shared micro-batcher so concurrent requests share
+    one forward pass; tiles seen before (same fingerprint) come from the tile
+    cache. An explicitly passed model is called directly, uncached.
+
+    Returns:
+        (N, len(CLASS_NAMES)) prediction array, or None if no model is available
+    """
+    if model is not None:
+        return np.asarray(model.predict_on_batch(preprocess_squares_for_cnn(squares)))
+
+    from app.services.inference_batcher import get_cnn_batcher
+    from app.services.tile_cache import get_tile_cache
+
+    def predict(batch):
+        batcher = get_cnn_batcher()
+        if batcher is None:
+            return None
+        return batcher.predict(preprocess_squares_for_cnn(batch))
+
+    cache = get_tile_cache()
+    if cache is None or len(squares) == 0:
+        return predict(squares)
 
-    # Preprocess image
-    img_array = preprocess_square_for_cnn(square_img)
+    rows = cache.map_batch("cnn", squares, predict)
+    return None if rows is None else np.stack(rows)
 
-    # Predict
-    predictions = model.predict(img_array, verbose=0)[0]
 
+def _prediction_to_fen(predictions, debug=False):
+    """
+    Convert one row of class probabilities into (fen_symbol, confidence).
+    """
     # Get top prediction
     top_idx = np.argmax(predictions)
     top_class = CLASS_NAMES[top_idx]
@@ -166,12 +237,34 @@ def classify_piece_cnn(square_img: Image.Image, model=None, debug=False):
     return (fen_symbol, float(top_confidence))
 
 
+def classify_piece_cnn(square_img: Image.Image, model=None, debug=False):
+    """
+    Classify a chess piece using CNN.
+
+    Args:
+        square_img: PIL Image of chess square
+        model: CNN model (uses the shared micro-batcher if None)
+        debug: Print debug information
+
+    Returns:
+        Tuple of (fen_symbol, confidence)
+    """
+    predictions = predict_squares_cnn([square_img], model=model)
+
+    if predictions is None:
+        if debug:
+            print("  ❌ CNN model not available")
+        return ('.', 0.0)
+
+    return _prediction_to_fen(predictions[0], debug=debug)
+
+
 def squares_to_fen_cnn(squares, rotation=None):
     """
     Convert 64 squares to FEN using CNN.
 
     Args:
-        squares: List of 64 PIL Images
+        squares: BoardTiles (or a list of 64 PIL Images)
         rotation: Board rotation (0, 90, 180, 270, or None)
 
     Returns:
@@ -183,14 +276,7 @@ def squares_to_fen_cnn(squares, rotation=None):
         print("❌ Invalid number of squares")
         return None
 
-    # Load model once
-    model = load_cnn_model()
-
-    if model is None:
-        print("❌ CNN model not available")
-        return None
-
-    board = []
+    order = []
 
     for i in range(64):
         # Apply rotation to square index
@@ -207,8 +293,20 @@ def squares_to_fen_cnn(squares, rotation=None):
         else:
             idx = i
 
-        square_img = squares[idx]
+        order.append(idx)
 
+    # Classify all 64 squares in one batch, then apply the rotation to the rows
+    predictions = predict_squares_cnn(squares)
+
+    if predictions is None:
+        print("❌ CNN model not available")
+        return None
+
+    predictions = predictions[order]
+
+    board = []
+
+    for i in range(64):
         # Debug first 16 squares
         debug = (i < 16)
 
@@ -219,8 +317,7 @@ def squares_to_fen_cnn(squares, rotation=None):
             square_name = f"{file}{rank}"
             print(f"\n  Square {i} ({square_name}):")
 
-        # Classify using CNN
-        fen_symbol, confidence = classify_piece_cnn(square_img, model=model, debug=debug)
+        fen_symbol, confidence = _prediction_to_fen(predictions[i], debug=debug)
 
         board.append(fen_symbol)
 
@@ -269,10 +366,18 @@ def detect_chess_position_cnn(image: Image.Image, rotation=None):
         FEN string or None if detection failed
     """
     try:
+        from app.services.board_detector import detect_and_warp_board, extract_board_squares_warped
         from app.services.simple_chess_detector import detect_grid_lines, extract_board_squares
 
         print("🤖 Starting CNN-based detection...")
 
+        # Preferred: one warp straight to 8 x (64 + padding) px, tiles need no resize
+        warped, _ = detect_and_warp_board(image, tile_size=CNN_INPUT_SIZE, padding=2)
+        if warped is not None:
+            squares = extract_board_squares_warped(warped, padding=2)
+            if len(squares) == 64:
+                return squares_to_fen_cnn(squares, rotation=rotation)
+
         # Step 1: Detect grid lines
         h_lines, v_lines = detect_grid_lines(image)
 
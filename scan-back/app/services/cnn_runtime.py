@@ -0,0 +1,263 @@
+"""
+Lightweight CPU inference backend for the CNN piece classifier.
+
+`chess_cnn_weights.h5` can be exported once to a TFLite flatbuffer
+(optionally quantized). At runtime the exported file is opened by a small
+TFLite interpreter (ai-edge-litert / tflite-runtime), which memory-maps the
+weights instead of importing full TensorFlow and rebuilding the Keras graph.
+
+Usage:
+    python -m app.services.cnn_runtime export [--quantize dynamic|int8] [--calibration-dir DIR]
+    python -m app.services.cnn_runtime parity --tiles-dir DIR
+"""
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+MODELS_DIR = Path(__file__).parent.parent / 'models'
+TFLITE_MODEL_PATH = Path(os.getenv("CNN_TFLITE_PATH", str(MODELS_DIR / 'chess_cnn.tflite')))
+TFLITE_NUM_THREADS = int(os.getenv("CNN_TFLITE_THREADS", "2"))
+
+
+def _get_interpreter_class():
+    """
+    Find the smallest installed TFLite interpreter.
+    Falls back to the one bundled with full TensorFlow.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+    except ImportError:
+        return None
+
+
+class TFLiteClassifier:
+    """
+    Thin wrapper around a TFLite interpreter with a Keras-like predict API.
+
+    The interpreter is created from a file path, so the flatbuffer (and its
+    weights) are memory-mapped rather than copied into the process heap.
+    """
+
+    def __init__(self, model_path, num_threads: int = TFLITE_NUM_THREADS):
+        interpreter_cls = _get_interpreter_class()
+        if interpreter_cls is None:
+            raise ImportError("No TFLite interpreter installed (ai-edge-litert, tflite-runtime or tensorflow)")
+
+        self.model_path = str(model_path)
+        self.interpreter = interpreter_cls(model_path=self.model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()  # interpreters are not thread-safe
+
+    def _resize(self, batch_size: int):
+        if batch_size == self._batch_size:
+            return
+        shape = [batch_size] + [int(d) for d in self._input['shape'][1:]]
+        self.interpreter.resize_tensor_input(self._input['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            batch: (N, 64, 64, 3) float array in MobileNetV2 [-1, 1] range
+
+        Returns:
+            (N, num_classes) float32 probabilities
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+
+            in_dtype = self._input['dtype']
+            if in_dtype in (np.int8, np.uint8):
+                scale, zero_point = self._input['quantization']
+                info = np.iinfo(in_dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(in_dtype)
+
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output['index'])
+
+            if self._output['dtype'] in (np.int8, np.uint8):
+                scale, zero_point = self._output['quantization']
+                out = (out.astype(np.float32) - zero_point) * scale
+
+        return np.asarray(out, dtype=np.float32)
+
+    def predict(self, batch: np.ndarray, verbose=0, batch_size=None) -> np.ndarray:
+        return self.predict_on_batch(batch)
+
+
+def load_exported_cnn_model(model_path=None):
+    """
+    Load the exported TFLite classifier if present.
+
+    Returns:
+        TFLiteClassifier or None if the export is missing or no runtime is installed
+    """
+    path = Path(model_path) if model_path else TFLITE_MODEL_PATH
+
+    if not path.exists():
+        print(f"  ⚠️ No exported CNN model at {path} (run: python -m app.services.cnn_runtime export)")
+        return None
+
+    try:
+        model = TFLiteClassifier(path)
+        print(f"  ✅ Loaded exported CNN model from {path}")
+        return model
+    except Exception as e:
+        print(f"  ⚠️ Could not load exported CNN model: {e}")
+        return None
+
+
+def load_tiles_from_dir(tiles_dir, limit: int = 500):
+    """
+    Load square images (png/jpg) from a directory, e.g. the debug tiles
+    saved by squares_to_fen or a labelled training set.
+    """
+    paths = sorted(
+        p for p in Path(tiles_dir).rglob('*')
+        if p.suffix.lower() in ('.png', '.jpg', '.jpeg')
+    )[:limit]
+    return [Image.open(p).convert('RGB') for p in paths]
+
+
+def export_cnn_model(output_path=None, quantize: str | None = None, calibration_dir=None):
+    """
+    Convert the Keras classifier (chess_cnn_weights.h5) into a TFLite model.
+
+    Args:
+        output_path: Where to write the .tflite file (default: CNN_TFLITE_PATH)
+        quantize: None (float32), 'dynamic' (int8 weights) or 'int8'
+                  (full integer, needs calibration tiles)
+        calibration_dir: Directory of square images used to calibrate int8 ranges
+
+    Returns:
+        Path of the written model
+    """
+    import tensorflow as tf
+    from app.services.cnn_chess_detector import build_keras_model, preprocess_squares_for_cnn
+
+    output_path = Path(output_path) if output_path else TFLITE_MODEL_PATH
+
+    print("📦 Exporting CNN model to TFLite...")
+    model = build_keras_model()
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize in ('dynamic', 'int8'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantize == 'int8':
+        if not calibration_dir:
+            raise ValueError("int8 quantization needs --calibration-dir with sample square images")
+        tiles = load_tiles_from_dir(calibration_dir)
+        if not tiles:
+            raise ValueError(f"No calibration images found in {calibration_dir}")
+        calibration = preprocess_squares_for_cnn(tiles)
+
+        def representative_dataset():
+            for i in range(len(calibration)):
+                yield [calibration[i:i + 1]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+        print(f"  📊 Calibrating int8 ranges on {len(calibration)} tiles")
+
+    tflite_bytes = converter.convert()
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix('.tmp')
+    tmp_path.write_bytes(tflite_bytes)
+    os.replace(tmp_path, output_path)
+
+    print(f"  ✅ Wrote {output_path} ({len(tflite_bytes) / 1e6:.1f} MB, quantize={quantize or 'none'})")
+    return output_path
+
+
+def check_backend_parity(squares, keras_model=None, tflite_model=None):
+    """
+    Compare Keras and exported TFLite predictions on the same tiles.
+
+    Args:
+        squares: List of PIL Images of chess squares
+        keras_model: Keras model (built from weights if None)
+        tflite_model: TFLiteClassifier (loaded from CNN_TFLITE_PATH if None)
+
+    Returns:
+        Dict with top-1 agreement ratio, max/mean absolute probability difference
+        and the indices of tiles whose top-1 class differs
+    """
+    from app.services.cnn_chess_detector import build_keras_model, preprocess_squares_for_cnn
+
+    if keras_model is None:
+        keras_model = build_keras_model()
+    if tflite_model is None:
+        tflite_model = load_exported_cnn_model()
+    if tflite_model is None:
+        raise RuntimeError("Exported TFLite model not available")
+
+    batch = preprocess_squares_for_cnn(squares)
+    ref = np.asarray(keras_model.predict_on_batch(batch), dtype=np.float32)
+    got = tflite_model.predict_on_batch(batch)
+
+    ref_top = ref.argmax(axis=1)
+    got_top = got.argmax(axis=1)
+    diff = np.abs(ref - got)
+
+    return {
+        "tiles": int(len(batch)),
+        "top1_agreement": float((ref_top == got_top).mean()) if len(batch) else 1.0,
+        "max_abs_diff": float(diff.max()) if diff.size else 0.0,
+        "mean_abs_diff": float(diff.mean()) if diff.size else 0.0,
+        "mismatches": [int(i) for i in np.nonzero(ref_top != got_top)[0]],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Export / verify the TFLite piece classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="convert chess_cnn_weights.h5 to TFLite")
+    p_export.add_argument("--output", default=None)
+    p_export.add_argument("--quantize", choices=["dynamic", "int8"], default=None)
+    p_export.add_argument("--calibration-dir", default=None)
+
+    p_parity = sub.add_parser("parity", help="compare Keras and TFLite predictions")
+    p_parity.add_argument("--tiles-dir", required=True)
+    p_parity.add_argument("--model", default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_cnn_model(args.output, quantize=args.quantize, calibration_dir=args.calibration_dir)
+    else:
+        tiles = load_tiles_from_dir(args.tiles_dir)
+        report = check_backend_parity(tiles, tflite_model=load_exported_cnn_model(args.model))
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,57 @@
+"""
+Plausibility score of a recognized position.
+
+A detector can return a well-formed FEN that is not a chess position (three
+kings, pawns on the back rank, eleven knights). python-chess flags most of
+these; each flag costs a fixed penalty, so candidates from different
+strategies can be ranked and implausible ones rejected.
+"""
+from __future__ import annotations
+
+import chess
+
+
+# (status flag, penalty); castling / en-passant flags are ignored because
+# detectors cannot know them
+_PENALTIES = (
+    (chess.STATUS_NO_WHITE_KING, 0.5),
+    (chess.STATUS_NO_BLACK_KING, 0.5),
+    (chess.STATUS_TOO_MANY_KINGS, 0.5),
+    (chess.STATUS_PAWNS_ON_BACKRANK, 0.3),
+    (chess.STATUS_TOO_MANY_WHITE_PAWNS, 0.3),
+    (chess.STATUS_TOO_MANY_BLACK_PAWNS, 0.3),
+    (chess.STATUS_TOO_MANY_WHITE_PIECES, 0.3),
+    (chess.STATUS_TOO_MANY_BLACK_PIECES, 0.3),
+    (chess.STATUS_TOO_MANY_CHECKERS, 0.1),
+    (chess.STATUS_IMPOSSIBLE_CHECK, 0.1),
+    # The side to move is a guess (always "w"), so this one is cheap
+    (chess.STATUS_OPPOSITE_CHECK, 0.05),
+)
+# Penalty when more pieces exceed their starting count than pawns are missing
+_PROMOTION_PENALTY = 0.2
+_START_COUNTS = {chess.KNIGHT: 2, chess.BISHOP: 2, chess.ROOK: 2, chess.QUEEN: 1}
+
+
+def _promotions_impossible(board: chess.Board, color: chess.Color) -> bool:
+    extra = sum(max(0, len(board.pieces(pt, color)) - n) for pt, n in _START_COUNTS.items())
+    return extra > 8 - len(board.pieces(chess.PAWN, color))
+
+
+def plausibility_score(fen: str) -> float:
+    """
+    Score a FEN from 0.0 (not a position) to 1.0 (no problems found).
+    """
+    try:
+        board = chess.Board(fen)
+    except ValueError:
+        return 0.0
+
+    status = board.status()
+    score = 1.0
+    for flag, penalty in _PENALTIES:
+        if status & flag:
+            score -= penalty
+    for color in chess.COLORS:
+        if _promotions_impossible(board, color):
+            score -= _PROMOTION_PENALTY
+    return round(max(0.0, score), 3)
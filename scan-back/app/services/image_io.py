@@ -0,0 +1,103 @@
+"""
+Resolution-capped image decoding for uploads.
+
+Camera photos are decoded straight to a working resolution (JPEG draft mode
+decodes at 1/2, 1/4 or 1/8 scale inside libjpeg), so every later stage works
+on small arrays. The original bytes are kept only when the image was actually
+downscaled, for a final high-resolution warp when one is needed.
+"""
+from __future__ import annotations
+
+import io
+import os
+
+from PIL import Image
+
+
+# Longest side of the working image
+MAX_DECODE_SIDE = int(os.getenv("MAX_DECODE_SIDE", "1600"))
+
+
+class DecodedImage:
+    """
+    A decoded upload.
+
+    Attributes:
+        image: RGB PIL Image at working resolution (longest side <= max_side)
+        original_size: (width, height) of the upload
+        scale: working / original size (1.0 if not downscaled)
+    """
+
+    def __init__(self, image: Image.Image, original_size, raw: bytes | None = None):
+        self.image = image
+        self.original_size = original_size
+        self.scale = image.size[0] / float(original_size[0]) if original_size[0] else 1.0
+        self._raw = raw
+
+    @property
+    def downscaled(self) -> bool:
+        return self._raw is not None and self.scale < 1.0
+
+    def full_resolution(self) -> Image.Image:
+        """
+        Decode the original bytes at full resolution (or return the working image).
+        """
+        if not self.downscaled:
+            return self.image
+        return Image.open(io.BytesIO(self._raw)).convert("RGB")
+
+    def to_original_coords(self, points):
+        """
+        Map working-image points (e.g. board corners) to original-image pixels.
+        """
+        if points is None or self.scale == 1.0:
+            return points
+        return [[float(x) / self.scale, float(y) / self.scale] for x, y in points]
+
+    def to_working_coords(self, points):
+        """
+        Map original-image points (e.g. client-supplied corners) to working-image pixels.
+        """
+        if points is None or self.scale == 1.0:
+            return points
+        return [[float(x) * self.scale, float(y) * self.scale] for x, y in points]
+
+    def needs_full_resolution(self, corners, out_size: int) -> bool:
+        """
+        True if the board spans fewer working pixels than the warp output,
+        i.e. warping from the working image would upsample.
+        """
+        if not self.downscaled or corners is None:
+            return False
+        xs = [p[0] for p in corners]
+        ys = [p[1] for p in corners]
+        return max(max(xs) - min(xs), max(ys) - min(ys)) < out_size
+
+
+def decode_upload(contents: bytes, max_side: int = MAX_DECODE_SIDE) -> DecodedImage:
+    """
+    Decode uploaded image bytes with the working resolution capped at `max_side`.
+
+    Returns:
+        DecodedImage
+    """
+    img = Image.open(io.BytesIO(contents))
+    original_size = img.size
+    w, h = original_size
+
+    if max(w, h) <= max_side:
+        return DecodedImage(img.convert("RGB"), original_size)
+
+    ratio = max_side / float(max(w, h))
+    target = (max(1, int(w * ratio)), max(1, int(h * ratio)))
+
+    # JPEG: let libjpeg decode at a reduced DCT scale (result is >= target)
+    if img.format == "JPEG":
+        img.draft("RGB", target)
+
+    img = img.convert("RGB")
+    if img.size[0] > target[0] or img.size[1] > target[1]:
+        img = img.resize(target, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    print(f"🖼️ Decoded {w}x{h} → {img.size[0]}x{img.size[1]}")
+    return DecodedImage(img, original_size, raw=contents)
@@ -0,0 +1,241 @@
+"""
+Server-side image sessions for the interactive editor.
+
+An upload is decoded and its board detected + warped once; the session keeps
+the warped board array so grid adjustments, re-slicing, reclassification and
+FEN generation work against it without re-uploading or re-detecting.
+Tile and board images are encoded lazily on request and memoized per
+session. Sessions expire after SESSION_TTL_SECONDS of inactivity.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from app.services.board_tiles import BoardTiles
+
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "900"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "64"))
+# Side of the cached warped board
+SESSION_BOARD_SIZE = 800
+
+
+def uniform_segments(size: int, n: int = 8) -> list[int]:
+    return [int(i * (size / n)) for i in range(n + 1)]
+
+
+class ImageSession:
+    """
+    One uploaded image and its warped board.
+
+    Attributes:
+        id: Session ID
+        decoded: DecodedImage of the upload
+        board: Warped top-down board (RGB uint8 array) or None if not detected
+        corners: Board corners in original-image pixels
+        h_segments / v_segments: Current grid (warped-board pixels)
+    """
+
+    def __init__(self, decoded, board: np.ndarray | None, corners):
+        self.id = uuid.uuid4().hex
+        self.decoded = decoded
+        self.board = board
+        self.corners = corners
+        size = board.shape[0] if board is not None else 0
+        self.h_segments = uniform_segments(size)
+        self.v_segments = uniform_segments(size)
+        self.last_access = time.time()
+        self._tiles = None
+        self._board_version = 0
+        self._encoded = {}  # (tile index or None for the board, fmt, quality) -> (bytes, etag)
+        self.lock = threading.Lock()
+
+    @property
+    def expires_in(self) -> int:
+        return max(0, int(self.last_access + SESSION_TTL_SECONDS - time.time()))
+
+    def set_board(self, board: np.ndarray, corners):
+        """
+        Replace the warped board (e.g. after re-warping from corrected corners).
+        """
+        self.board = board
+        self.corners = corners
+        self.h_segments = uniform_segments(board.shape[0])
+        self.v_segments = uniform_segments(board.shape[1])
+        self._tiles = None
+        self._board_version += 1
+        self._encoded = {}
+
+    @property
+    def version(self) -> str:
+        """
+        Token that changes whenever the board or the grid changes (tile URLs
+        carry it, so cached tile images are never stale).
+        """
+        key = f"{self._board_version}|{self.h_segments}|{self.v_segments}".encode()
+        return hashlib.blake2b(key, digest_size=6).hexdigest()
+
+    def tiles(self, h_segments=None, v_segments=None) -> BoardTiles | None:
+        """
+        Tiles for the given grid (the current one if omitted); the grid is
+        remembered for later calls once it has been sliced successfully.
+
+        Raises:
+            ValueError: for an invalid grid (the current grid is kept)
+        """
+        if self.board is None:
+            return None
+        h, v = self.h_segments, self.v_segments
+        if h_segments is not None or v_segments is not None:
+            h = [int(x) for x in h_segments] if h_segments is not None else h
+            v = [int(x) for x in v_segments] if v_segments is not None else v
+        if self._tiles is not None and (h, v) == (self.h_segments, self.v_segments):
+            return self._tiles
+
+        from app.services.template_chess_detector import template_padding
+
+        # cut like the template tiles (the grid spans the warped board)
+        padding = template_padding(min(self.board.shape[:2]) / 8.0)
+        if h == uniform_segments(self.board.shape[0]) and v == uniform_segments(self.board.shape[1]):
+            tiles = BoardTiles.from_board(self.board, padding=padding)
+        else:
+            tiles = BoardTiles.from_grid(self.board, h, v, padding=padding)
+        if (h, v) != (self.h_segments, self.v_segments):
+            self._encoded = {}
+        self.h_segments, self.v_segments, self._tiles = h, v, tiles
+        return tiles
+
+    def encoded_image(self, index: int | None = None, fmt: str = "PNG", quality: int | None = None):
+        """
+        Encoded image of one tile of the current grid (the whole board if
+        index is None), memoized until the board or grid changes.
+
+        Returns:
+            (bytes, strong ETag), or None if there is no board
+        """
+        key = (index, fmt, quality)
+        cached = self._encoded.get(key)
+        if cached is not None:
+            return cached
+        if index is None:
+            image = self.board
+        else:
+            tiles = self.tiles()
+            if tiles is None:
+                return None
+            image = tiles[index]
+        if image is None:
+            return None
+
+        from app.services.tile_encoding import encode_image
+
+        data = encode_image(image, fmt, quality)
+        etag = '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+        self._encoded[key] = (data, etag)
+        return data, etag
+
+
+class SessionStore:
+    """
+    In-process session registry with TTL expiry and a size cap.
+    """
+
+    def __init__(self, ttl_seconds: int = SESSION_TTL_SECONDS, max_sessions: int = SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _sweep(self):
+        now = time.time()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_access > self.ttl_seconds]:
+            del self._sessions[sid]
+        # Over capacity: drop the least recently used
+        while len(self._sessions) > self.max_sessions:
+            oldest = min(self._sessions.values(), key=lambda s: s.last_access)
+            del self._sessions[oldest.id]
+
+    def add(self, session: ImageSession) -> ImageSession:
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sweep()
+        return session
+
+    def get(self, session_id: str) -> ImageSession | None:
+        with self._lock:
+            self._sweep()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = time.time()
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+_SESSION_STORE = SessionStore()
+
+
+def get_session_store() -> SessionStore:
+    return _SESSION_STORE
+
+
+def warp_upload(decoded, corners, out_size: int = SESSION_BOARD_SIZE) -> np.ndarray:
+    """
+    Warp a decoded upload from known board corners (original-image pixels),
+    skipping automatic detection. Uses the full-resolution upload only when
+    the working image would have to be upsampled.
+    """
+    from app.services.board_detector import warp_board_from_corners
+
+    working = decoded.to_working_coords(corners)
+    if decoded.needs_full_resolution(working, out_size):
+        warped = warp_board_from_corners(decoded.full_resolution(), corners, out_size=out_size)
+    else:
+        warped = warp_board_from_corners(decoded.image, working, out_size=out_size)
+    return np.asarray(warped)
+
+
+def create_session(decoded, corners=None) -> ImageSession:
+    """
+    Warp the board of a decoded upload once and register a session.
+
+    Args:
+        decoded: DecodedImage
+        corners: Board corners in original-image pixels; detected automatically if None
+    """
+    from app.services.board_detector import detect_and_warp_board
+    from app.services.screenshot_detector import SCREENSHOT_FAST_PATH, detect_screenshot_board
+
+    shot_board = None
+    if corners is None and SCREENSHOT_FAST_PATH:
+        # Screenshot: the axis-aligned crop already is the top-down board
+        _, shot_board, detected = detect_screenshot_board(decoded.image)
+    if shot_board is not None:
+        board = np.ascontiguousarray(shot_board)
+        corners = decoded.to_original_coords(detected)
+    elif corners is None:
+        warped, detected = detect_and_warp_board(decoded.image, out_size=SESSION_BOARD_SIZE)
+        if warped is not None:
+            corners = decoded.to_original_coords(detected)
+            if decoded.needs_full_resolution(detected, SESSION_BOARD_SIZE):
+                board = warp_upload(decoded, corners)
+            else:
+                board = np.asarray(warped)
+        else:
+            board = None
+    else:
+        board = warp_upload(decoded, corners)
+
+    return get_session_store().add(ImageSession(decoded, board, corners))
@@ -0,0 +1,169 @@
+"""
+Cross-request micro-batching for CNN tile inference.
+
+Concurrent scans each submit their tiles here instead of running their own
+small forward pass. A single worker thread gathers pending submissions into
+one batch (up to CNN_BATCH_MAX_SIZE tiles, or until CNN_BATCH_MAX_WAIT_MS has
+passed since the first tile arrived), runs the model once and scatters the
+predictions back to the callers.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# Tunables: larger batches / longer waits favour throughput on CPU-only nodes,
+# smaller values favour per-request latency.
+CNN_BATCH_MAX_SIZE = int(os.getenv("CNN_BATCH_MAX_SIZE", "256"))
+CNN_BATCH_MAX_WAIT_MS = float(os.getenv("CNN_BATCH_MAX_WAIT_MS", "5"))
+
+# Global batcher (created on first use)
+_BATCHER = None
+_BATCHER_LOCK = threading.Lock()
+
+
+class MicroBatcher:
+    """
+    Gather tile batches from many callers and run them through `predict_fn`
+    in one call.
+
+    Args:
+        predict_fn: Callable taking an (N, H, W, C) array and returning (N, K) predictions
+        max_batch_size: Maximum number of tiles per forward pass
+        max_wait_ms: How long to wait for more tiles after the first one arrives
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = CNN_BATCH_MAX_SIZE,
+                 max_wait_ms: float = CNN_BATCH_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._carry = None  # submission that did not fit into the previous batch
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="cnn-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch: np.ndarray) -> Future:
+        """
+        Queue an (N, H, W, C) batch of tiles; the returned future resolves to (N, K) predictions.
+        """
+        future: Future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Micro-batcher is closed"))
+            return future
+        if len(batch) == 0:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        self._queue.put((np.asarray(batch, dtype=np.float32), future))
+        return future
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Blocking helper: submit a batch and wait for its predictions.
+        """
+        return self.submit(batch).result()
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=1.0)
+
+    # ------------------------------------------------------------------
+    def _next_item(self, timeout=None):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return self._queue.get(timeout=timeout)
+
+    def _run(self):
+        while True:
+            first = self._next_item()
+            if first is None:
+                return
+
+            pending = [first]
+            size = len(first[0])
+            deadline = time.monotonic() + self.max_wait
+
+            # Gather more submissions until the batch is full or the wait expires
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._next_item(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._closed = True
+                    break
+                if size + len(item[0]) > self.max_batch_size:
+                    self._carry = item
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            self._run_batch(pending)
+
+            if self._closed and self._carry is None and self._queue.empty():
+                return
+
+    def _run_batch(self, pending):
+        try:
+            batch = np.concatenate([arr for arr, _ in pending], axis=0)
+            predictions = np.asarray(self.predict_fn(batch))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        start = 0
+        for arr, future in pending:
+            end = start + len(arr)
+            future.set_result(predictions[start:end])
+            start = end
+
+
+def get_cnn_batcher():
+    """
+    Return the shared micro-batcher for the CNN piece classifier.
+
+    Returns:
+        MicroBatcher or None if the CNN model is not available
+    """
+    global _BATCHER
+
+    if _BATCHER is not None:
+        return _BATCHER
+
+    with _BATCHER_LOCK:
+        if _BATCHER is None:
+            from app.services.cnn_chess_detector import load_cnn_model
+
+            model = load_cnn_model()
+            if model is None:
+                return None
+
+            _BATCHER = MicroBatcher(model.predict_on_batch)
+            print(f"  ✅ CNN micro-batcher ready (max_batch={_BATCHER.max_batch_size}, "
+                  f"max_wait={_BATCHER.max_wait * 1000:.1f}ms)")
+    return _BATCHER
+
+
+def shutdown_cnn_batcher():
+    """
+    Stop the shared batcher's worker thread (used on app shutdown).
+    """
+    global _BATCHER
+    with _BATCHER_LOCK:
+        if _BATCHER is not None:
+            _BATCHER.close()
+            _BATCHER = None
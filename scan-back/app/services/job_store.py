@@ -0,0 +1,197 @@
+"""
+Asynchronous recognition jobs.
+
+A job is accepted immediately and runs on a small worker pool; clients poll
+(or long-poll) its status and fetch the result later, so heavy recognitions
+do not have to fit into one mobile HTTP timeout. Job records are bounded and
+expire after JOB_TTL_SECONDS. With JOB_STORE_PATH set they live in a SQLite
+file, so any worker on the host can answer polls for jobs run by another.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "900"))
+JOB_MAX = int(os.getenv("JOB_MAX", "1000"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs queued or running in this process before submissions get a 503
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+# SQLite file shared between workers; empty keeps jobs in-process
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "")
+# Longest long-poll and the status check interval while waiting (seconds)
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+JOB_POLL_INTERVAL = 0.2
+
+FINISHED = ("done", "failed")
+
+
+class _MemoryBackend:
+    def __init__(self, max_jobs: int, ttl: int):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sweep(self):
+        now = time.time()
+        for job_id in [k for k, j in self._jobs.items() if now - j["updated"] > self.ttl]:
+            del self._jobs[job_id]
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def put(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            self._sweep()
+
+    def get(self, job_id: str):
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            return self._jobs.pop(job_id, None) is not None
+
+
+class _SQLiteBackend:
+    def __init__(self, path: str, max_jobs: int, ttl: int):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs(updated)")
+
+    def put(self, job: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, value, updated) VALUES (?, ?, ?)",
+                (job["id"], json.dumps(job), job["updated"]),
+            )
+            self._conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.max_jobs,),
+            )
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM jobs WHERE id = ? AND updated >= ?", (job_id, time.time() - self.ttl)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount > 0
+
+
+class JobStore:
+    """
+    Job records plus the worker pool that runs them.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, max_jobs: int = JOB_MAX, ttl: int = JOB_TTL_SECONDS,
+                 workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.backend = _SQLiteBackend(path, max_jobs, ttl) if path else _MemoryBackend(max_jobs, ttl)
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-job")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _update(self, job: dict, **fields) -> dict:
+        job.update(fields, updated=time.time())
+        self.backend.put(job)
+        return job
+
+    def submit(self, fn, *args, **kwargs) -> dict | None:
+        """
+        Create a job running fn(*args, **kwargs) -> JSON-able result.
+
+        Returns:
+            The job record, or None if too many jobs are pending
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "status": "queued", "created": now, "updated": now,
+               "result": None, "error": None}
+        self.backend.put(job)
+
+        def run():
+            try:
+                self._update(job, status="running")
+                self._update(job, status="done", result=fn(*args, **kwargs))
+            except Exception as e:
+                print(f"❌ Job {job['id']} failed: {e}")
+                self._update(job, status="failed", error=str(e))
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+        self._executor.submit(run)
+        return dict(job)
+
+    def complete(self, result) -> dict:
+        """
+        Record an already finished job (e.g. a result cache hit).
+        """
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "status": "done", "created": now, "updated": now,
+               "result": result, "error": None}
+        self.backend.put(job)
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        return self.backend.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """
+        Long-poll: the job once it is finished, or as it is after `timeout`.
+        Works across workers with the SQLite backend.
+        """
+        deadline = time.monotonic() + min(timeout, JOB_MAX_WAIT)
+        job = self.get(job_id)
+        while job is not None and job["status"] not in FINISHED and time.monotonic() < deadline:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            job = self.get(job_id)
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        return self.backend.delete(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "maxPending": self.max_pending}
+
+
+_JOB_STORE = None
+_JOB_STORE_LOCK = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _JOB_STORE
+    if _JOB_STORE is None:
+        with _JOB_STORE_LOCK:
+            if _JOB_STORE is None:
+                _JOB_STORE = JobStore()
+    return _JOB_STORE
@@ -0,0 +1,110 @@
+"""
+Load-adaptive quality tiers for the vision pipeline.
+
+The number of recognitions in flight (/recognize, /recognize-page, job runs,
+bulk items and stream frames enter track(); polls and tile fetches do not)
+and the 1-minute load average per core pick a tier; each tier is a policy of
+cheaper settings, so latency stays bounded during load spikes instead of
+every request falling through to the heaviest stages:
+
+  full     - everything
+  reduced  - no 1.25x SB scale, no board-to-fen, 640px warp, no racing
+  minimal  - SB at 1.0x only, no Hough / board-to-fen, 512px warp, no racing
+
+The tier used is reported as `qualityTier` in recognition responses.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+LOAD_ADAPTIVE = os.getenv("LOAD_ADAPTIVE", "1") == "1"
+# Recognitions in flight at which a tier starts
+LOAD_REDUCED_INFLIGHT = int(os.getenv("LOAD_REDUCED_INFLIGHT", "4"))
+LOAD_MINIMAL_INFLIGHT = int(os.getenv("LOAD_MINIMAL_INFLIGHT", "8"))
+# 1-minute load average per core at which a tier starts
+LOAD_REDUCED_CPU = float(os.getenv("LOAD_REDUCED_CPU", "0.85"))
+LOAD_MINIMAL_CPU = float(os.getenv("LOAD_MINIMAL_CPU", "1.5"))
+# The load average is sampled at most this often (seconds)
+LOAD_SAMPLE_INTERVAL = 1.0
+
+QUALITY_TIERS = ("full", "reduced", "minimal")
+QUALITY_POLICIES = {
+    "full": {"sb_scales": (1.0, 0.75, 1.25), "warp_size": 800, "skip": (), "race": True},
+    "reduced": {"sb_scales": (1.0, 0.75), "warp_size": 640, "skip": ("board_to_fen",), "race": False},
+    "minimal": {"sb_scales": (1.0,), "warp_size": 512, "skip": ("board_to_fen", "hough"), "race": False},
+}
+
+
+def _cpu_load() -> float | None:
+    """1-minute load average per core (None where unavailable, e.g. Windows)."""
+    try:
+        return os.getloadavg()[0] / float(os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class LoadMonitor:
+    """
+    In-flight recognition counter plus sampled CPU load → quality tier.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self._cpu = None
+        self._cpu_sampled = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def cpu_load(self) -> float | None:
+        now = time.monotonic()
+        if now - self._cpu_sampled > LOAD_SAMPLE_INTERVAL:
+            self._cpu, self._cpu_sampled = _cpu_load(), now
+        return self._cpu
+
+    def tier(self) -> str:
+        if not LOAD_ADAPTIVE:
+            return "full"
+        # The request asking counts itself; the others are the queue
+        queued = max(0, self.in_flight - 1)
+        cpu = self.cpu_load() or 0.0
+        if queued >= LOAD_MINIMAL_INFLIGHT or cpu >= LOAD_MINIMAL_CPU:
+            return "minimal"
+        if queued >= LOAD_REDUCED_INFLIGHT or cpu >= LOAD_REDUCED_CPU:
+            return "reduced"
+        return "full"
+
+    def stats(self) -> dict:
+        cpu = self.cpu_load()
+        return {
+            "inFlight": self.in_flight,
+            "cpuLoad": round(cpu, 2) if cpu is not None else None,
+            "tier": self.tier(),
+        }
+
+
+_LOAD_MONITOR = LoadMonitor()
+
+
+def get_load_monitor() -> LoadMonitor:
+    return _LOAD_MONITOR
+
+
+def current_policy() -> tuple[str, dict]:
+    """
+    (tier, policy) for the current load.
+    """
+    tier = _LOAD_MONITOR.tier()
+    return tier, QUALITY_POLICIES[tier]
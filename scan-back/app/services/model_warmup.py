@@ -0,0 +1,120 @@
+"""
+Background model preloading with readiness reporting.
+
+On startup the heavy models (board-to-fen and the CNN piece classifier) are
+loaded in a background thread and each one runs a dummy inference, so the
+first real request does not pay for imports and graph construction.
+/health/ready reports 503 until warmup has finished.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+
+# Comma-separated list of backends to warm up ("none" disables preloading)
+PRELOAD_MODELS = [
+    m.strip() for m in os.getenv("PRELOAD_MODELS", "board_to_fen,cnn").split(",")
+    if m.strip() and m.strip().lower() != "none"
+]
+
+# Per-backend status: pending | loading | ready | unavailable | error
+MODEL_STATUS = {name: "pending" for name in PRELOAD_MODELS}
+_WARMUP_DONE = threading.Event()
+_WARMUP_THREAD = None
+_STARTED_AT = None
+_FINISHED_AT = None
+
+
+def _warm_board_to_fen():
+    from app.services.vision_service import load_board_to_fen
+
+    if not load_board_to_fen():
+        return "unavailable"
+
+    from board_to_fen.predict import get_fen_from_image
+    get_fen_from_image(Image.new("RGB", (400, 400), color="white"))
+    return "ready"
+
+
+def _warm_cnn():
+    from app.services.inference_batcher import get_cnn_batcher
+
+    batcher = get_cnn_batcher()
+    if batcher is None:
+        return "unavailable"
+
+    batcher.predict(np.zeros((1, 64, 64, 3), dtype=np.float32))
+    return "ready"
+
+
+WARMERS = {
+    "board_to_fen": _warm_board_to_fen,
+    "cnn": _warm_cnn,
+}
+
+
+def _run_warmup():
+    for name in PRELOAD_MODELS:
+        warmer = WARMERS.get(name)
+        if warmer is None:
+            print(f"⚠️ Unknown model in PRELOAD_MODELS: {name}")
+            MODEL_STATUS[name] = "unavailable"
+            continue
+
+        MODEL_STATUS[name] = "loading"
+        t0 = time.perf_counter()
+        try:
+            MODEL_STATUS[name] = warmer()
+            print(f"🔥 Warmed {name}: {MODEL_STATUS[name]} ({time.perf_counter() - t0:.1f}s)")
+        except Exception as e:
+            MODEL_STATUS[name] = "error"
+            print(f"⚠️ Warmup of {name} failed: {e}")
+
+    _mark_done()
+
+
+def _mark_done():
+    global _FINISHED_AT
+    _FINISHED_AT = time.time()
+    _WARMUP_DONE.set()
+
+
+def start_model_warmup():
+    """
+    Start warming models in a daemon thread (idempotent).
+    """
+    global _WARMUP_THREAD, _STARTED_AT
+
+    if _WARMUP_THREAD is not None:
+        return
+
+    _STARTED_AT = time.time()
+    if not PRELOAD_MODELS:
+        _mark_done()
+        return
+
+    print(f"🔥 Preloading models in background: {', '.join(PRELOAD_MODELS)}")
+    _WARMUP_THREAD = threading.Thread(target=_run_warmup, name="model-warmup", daemon=True)
+    _WARMUP_THREAD.start()
+
+
+def is_ready() -> bool:
+    return _WARMUP_DONE.is_set()
+
+
+def readiness() -> dict:
+    """
+    Readiness snapshot for /health/ready.
+    A backend that is 'unavailable' (not installed) does not block readiness;
+    the worker simply serves requests without it.
+    """
+    return {
+        "ready": is_ready(),
+        "backends": dict(MODEL_STATUS),
+        "warmupSeconds": round(_FINISHED_AT - _STARTED_AT, 2) if _FINISHED_AT and _STARTED_AT else None,
+    }
@@ -0,0 +1,223 @@
+"""
+Bounded cache of recognition results keyed by image content.
+
+Every entry is stored under the SHA-256 of the uploaded bytes (exact
+re-uploads), combined with the endpoint and its request options. The
+/extract-* endpoints, whose output the user edits anyway, also store it
+under a difference hash of the decoded image (the same screenshot
+re-encoded or re-saved); such a hit is only returned after a 32x32
+thumbnail check. Recognition is exact-only: when the board is a part of
+the frame a moved pawn changes no hash bit and barely one thumbnail pixel.
+Values are JSON documents; eviction is LRU by total payload size. With RESULT_CACHE_PATH set, entries live in a SQLite
+file so every worker on the host shares them.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") == "1"
+# Total payload budget (bytes)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# SQLite file shared between workers; empty keeps the cache in-process
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+# Side of the difference hash and the gray level step a bit needs to be set
+# (flat squares then hash to stable zeros instead of JPEG noise)
+PHASH_SIZE = 16
+PHASH_MARGIN = 8
+# Perceptual hits are verified against a thumbnail: any pixel differing by
+# more than this (re-encoding stays < 5, a moved piece is > 30) rejects it
+THUMB_SIZE = 32
+THUMB_MAX_DIFF = int(os.getenv("RESULT_CACHE_THUMB_MAX_DIFF", "12"))
+# Endpoints that may be answered from a perceptual hit
+PERCEPTUAL_NAMESPACES = ("extract-squares", "extract-grid")
+
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def _gray(image) -> np.ndarray:
+    arr = np.asarray(image)
+    return cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY) if arr.ndim == 3 else arr
+
+
+def perceptual_hash(image) -> str:
+    """
+    Difference hash of the image: for each of PHASH_SIZE^2 neighbour pairs,
+    one bit for "brighter by > margin" and one for "darker by > margin".
+    """
+    small = cv2.resize(_gray(image), (PHASH_SIZE + 1, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+    d = small[:, 1:].astype(np.int16) - small[:, :-1].astype(np.int16)
+    bits = np.concatenate([(d > PHASH_MARGIN).ravel(), (d < -PHASH_MARGIN).ravel()])
+    return np.packbits(bits).tobytes().hex()
+
+
+def thumbnail(image) -> np.ndarray:
+    return cv2.resize(_gray(image), (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+
+
+class _MemoryBackend:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> bytes
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size}
+
+
+class _SQLiteBackend:
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results(used)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+            return bytes(row[0])
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, used) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop least recently used rows until the budget fits again
+                rows = self._conn.execute("SELECT key, size FROM results ORDER BY used").fetchall()
+                stale = []
+                for k, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((k,))
+                    total -= size
+                self._conn.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            return {"entries": n, "bytes": size}
+
+
+class ResultCache:
+    """
+    Content + perceptual hash cache of JSON-serializable endpoint results.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, path: str = RESULT_CACHE_PATH):
+        self.backend = _SQLiteBackend(path, max_bytes) if path else _MemoryBackend(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(namespace: str, options: dict, digest: str) -> str:
+        opts = json.dumps(options, sort_keys=True, default=str)
+        return f"{namespace}|{opts}|{digest}"
+
+    def get(self, namespace: str, options: dict, contents: bytes | None = None, image=None):
+        """
+        Look up a result by upload bytes and/or decoded image (the latter
+        only for PERCEPTUAL_NAMESPACES).
+
+        Returns:
+            The stored value (dict), or None on a miss
+        """
+        if contents is not None:
+            raw = self.backend.get(self._key(namespace, options, "sha:" + content_hash(contents)))
+            if raw is not None:
+                self.hits += 1
+                print(f"⚡ Result cache hit ({namespace}, exact)")
+                return json.loads(raw)
+
+        if image is not None and namespace in PERCEPTUAL_NAMESPACES:
+            raw = self.backend.get(self._key(namespace, options, "dhash:" + perceptual_hash(image)))
+            if raw is not None:
+                entry = json.loads(raw)
+                stored = np.frombuffer(bytes.fromhex(entry["thumb"]), dtype=np.uint8)
+                diff = np.abs(stored.astype(np.int16) - thumbnail(image).ravel().astype(np.int16)).max()
+                if diff <= THUMB_MAX_DIFF:
+                    self.hits += 1
+                    print(f"⚡ Result cache hit ({namespace}, perceptual, max diff {diff})")
+                    return entry["value"]
+
+        self.misses += 1
+        return None
+
+    def put(self, namespace: str, options: dict, value: dict, contents: bytes | None = None, image=None):
+        if contents is not None:
+            raw = json.dumps(value, separators=(",", ":")).encode()
+            self.backend.put(self._key(namespace, options, "sha:" + content_hash(contents)), raw)
+        if image is not None and namespace in PERCEPTUAL_NAMESPACES:
+            entry = {"thumb": thumbnail(image).tobytes().hex(), "value": value}
+            raw = json.dumps(entry, separators=(",", ":")).encode()
+            self.backend.put(self._key(namespace, options, "dhash:" + perceptual_hash(image)), raw)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            **self.backend.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / total, 3) if total else None,
+        }
+
+
+_RESULT_CACHE = None
+_RESULT_CACHE_LOCK = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """
+    Process-wide result cache (None if disabled via RESULT_CACHE=0).
+    """
+    global _RESULT_CACHE
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _RESULT_CACHE is None:
+        with _RESULT_CACHE_LOCK:
+            if _RESULT_CACHE is None:
+                _RESULT_CACHE = ResultCache()
+    return _RESULT_CACHE
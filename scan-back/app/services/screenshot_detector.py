@@ -0,0 +1,205 @@
+"""
+Fast path for digital screenshots.
+
+Screenshots of online boards are axis-aligned with crisp, one-pixel colour
+steps and a handful of flat colours, so they need neither corner detection
+nor a perspective warp: the board is found from the projection-profile grid,
+its edges are snapped to exact pixels, and the 64 tiles are integer slices of
+the original array.
+"""
+from __future__ import annotations
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from app.services.board_tiles import BoardTiles
+
+
+SCREENSHOT_FAST_PATH = os.getenv("SCREENSHOT_FAST_PATH", "1") == "1"
+# Share of strong edges that happen within a single pixel (photos are blurred)
+SCREENSHOT_MIN_SHARPNESS = float(os.getenv("SCREENSHOT_MIN_SHARPNESS", "0.75"))
+# Share of pixels covered by the 16 most common (4-bit quantized) colours
+SCREENSHOT_MIN_PALETTE = float(os.getenv("SCREENSHOT_MIN_PALETTE", "0.5"))
+# Grid periodicity required before trusting an axis-aligned board (pieces
+# dilute it: clean 40-110px screenshots measure 0.31-0.9 at native size, so the
+# checkerboard test below does the rejecting)
+SCREENSHOT_MIN_GRID_CONFIDENCE = float(os.getenv("SCREENSHOT_MIN_GRID_CONFIDENCE", "0.25"))
+# Longest side the grid profile is computed at (crisp steps blur when downscaled)
+SCREENSHOT_PROFILE_MAX_SIDE = int(os.getenv("SCREENSHOT_PROFILE_MAX_SIDE", "2048"))
+# Gray-level gap between the light and dark square colours
+SCREENSHOT_MIN_SQUARE_CONTRAST = float(os.getenv("SCREENSHOT_MIN_SQUARE_CONTRAST", "12"))
+
+# Side the input classifier looks at (nearest-neighbour, so steps stay crisp)
+_FEATURE_MAX_SIDE = 512
+# Images whose results are memoized (see _per_image)
+_RECENT_IMAGES = 4
+
+
+def _per_image(fn):
+    """
+    Memoize fn(image, ...) for the last few image objects: the strategy
+    planner and the screenshot stage look at the same upload. Holding the
+    image keeps its id from being reused while cached.
+    """
+    recent = OrderedDict()  # (id(image), args) -> (image, result)
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(image, *args, **kwargs):
+        key = (id(image), args, tuple(sorted(kwargs.items())))
+        with lock:
+            hit = recent.get(key)
+            if hit is not None and hit[0] is image:
+                return hit[1]
+        result = fn(image, *args, **kwargs)
+        with lock:
+            recent[key] = (image, result)
+            while len(recent) > _RECENT_IMAGES:
+                recent.popitem(last=False)
+        return result
+
+    return wrapper
+
+
+@_per_image
+def screenshot_features(image) -> dict:
+    """
+    Cheap screenshot-vs-photo features.
+
+    Returns:
+        {'sharpness': 0-1, 'palette': 0-1}
+    """
+    arr = np.asarray(image)
+    if arr.ndim == 2:
+        arr = np.stack([arr] * 3, axis=-1)
+    arr = arr[..., :3]
+
+    H, W = arr.shape[:2]
+    scale = min(1.0, _FEATURE_MAX_SIDE / float(max(H, W)))
+    if scale < 1.0:
+        arr = cv2.resize(arr, (max(1, int(W * scale)), max(1, int(H * scale))),
+                         interpolation=cv2.INTER_NEAREST)
+
+    # Colour count: flat UI colours dominate a screenshot
+    q = (arr >> 4).astype(np.int32)
+    codes = (q[..., 0] << 8) | (q[..., 1] << 4) | q[..., 2]
+    counts = np.bincount(codes.ravel(), minlength=4096)
+    palette = float(np.sort(counts)[-16:].sum()) / codes.size
+
+    # Edge sharpness: of every strong 3px transition, how much is a 1px step
+    gray = cv2.cvtColor(np.ascontiguousarray(arr), cv2.COLOR_RGB2GRAY).astype(np.int16)
+    step = np.abs(np.diff(gray, axis=1))
+    span = np.abs(gray[:, 3:] - gray[:, :-3])
+    single = np.maximum(np.maximum(step[:, :-2], step[:, 1:-1]), step[:, 2:])
+    strong = span > 48
+    sharpness = min(1.0, float((single[strong] / span[strong]).mean())) if strong.any() else 0.0
+
+    return {"sharpness": sharpness, "palette": palette}
+
+
+def is_screenshot(image) -> bool:
+    f = screenshot_features(image)
+    return f["sharpness"] >= SCREENSHOT_MIN_SHARPNESS and f["palette"] >= SCREENSHOT_MIN_PALETTE
+
+
+def _snap_edge(profile: np.ndarray, pos: int, radius: int, border: float = 0.0) -> int:
+    # The image borders (positions -1 and len(profile)) count as edges of
+    # strength `border`, for boards cropped without a margin
+    padded = np.r_[border, profile, border]
+    lo, hi = max(0, pos + 1 - radius), min(len(padded), pos + 2 + radius)
+    if hi <= lo:
+        return pos
+    return lo + int(np.argmax(padded[lo:hi])) - 1
+
+
+def is_checkerboard(gray: np.ndarray, side: int) -> bool:
+    """
+    Whether a gray board crop alternates between two square colours.
+
+    Each square's colour is the median of its four corners (pieces rarely
+    reach them, coordinates labels take at most one); at least 56 squares
+    must be nearer their own parity's colour than the other one.
+    """
+    edges = np.rint(np.linspace(0, side, 9)).astype(int)
+    inset = max(1, side // 100)
+    colours = np.empty((8, 8), dtype=np.float32)
+    for r in range(8):
+        ys = (edges[r] + inset, edges[r + 1] - 1 - inset)
+        for c in range(8):
+            xs = (edges[c] + inset, edges[c + 1] - 1 - inset)
+            colours[r, c] = np.median([gray[y, x] for y in ys for x in xs])
+
+    parity = (np.add.outer(np.arange(8), np.arange(8)) % 2).astype(bool)
+    light, dark = np.median(colours[~parity]), np.median(colours[parity])
+    if abs(light - dark) < SCREENSHOT_MIN_SQUARE_CONTRAST:
+        return False
+    own = np.where(parity, dark, light)
+    other = np.where(parity, light, dark)
+    return int((np.abs(colours - own) < np.abs(colours - other)).sum()) >= 56
+
+
+@_per_image
+def detect_screenshot_board(image, padding: int | None = None):
+    """
+    Axis-aligned board detection and integer slicing for screenshots.
+
+    Args:
+        image: PIL Image or RGB array
+        padding: Pixels trimmed from each side of a tile; defaults to the
+                 share of the cell the template tiles are trimmed by
+
+    Returns:
+        (tiles, board, corners) - BoardTiles sliced straight from the image,
+        the board crop (array view) and its corners [tl, tr, br, bl];
+        (None, None, None) if the image is not a screenshot of a board
+    """
+    from app.services.simple_chess_detector import detect_grid_lines_projection
+
+    if not is_screenshot(image):
+        return None, None, None
+
+    arr = np.asarray(image)
+    h_lines, v_lines, confidence = detect_grid_lines_projection(arr, max_side=SCREENSHOT_PROFILE_MAX_SIDE)
+    if h_lines is None or confidence < SCREENSHOT_MIN_GRID_CONFIDENCE:
+        return None, None, None
+
+    # Snap the outer edges to exact pixels (the profile may have been downscaled)
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY) if arr.ndim == 3 else arr
+    g = gray.astype(np.int16)
+    radius = max(2, int(np.ceil(max(arr.shape[:2]) / float(SCREENSHOT_PROFILE_MAX_SIDE))) + 1)
+    y0, y1 = h_lines[0], h_lines[-1]
+    x0, x1 = v_lines[0], v_lines[-1]
+    rows = np.abs(np.diff(g[:, x0:x1], axis=0)).sum(axis=1)
+    cols = np.abs(np.diff(g[y0:y1, :], axis=1)).sum(axis=0)
+    # diff index i is the edge between pixels i and i+1; an image border
+    # beats edges weaker than half an inner grid line
+    h_border = 0.5 * np.median([rows[max(0, v - 2):v + 1].max() for v in h_lines[1:-1]])
+    v_border = 0.5 * np.median([cols[max(0, v - 2):v + 1].max() for v in v_lines[1:-1]])
+    y0, y1 = _snap_edge(rows, y0 - 1, radius, h_border) + 1, _snap_edge(rows, y1 - 1, radius, h_border) + 1
+    x0, x1 = _snap_edge(cols, x0 - 1, radius, v_border) + 1, _snap_edge(cols, x1 - 1, radius, v_border) + 1
+
+    # Screenshot boards are square
+    side_h, side_w = y1 - y0, x1 - x0
+    if min(side_h, side_w) < 64 or abs(side_h - side_w) > 0.02 * max(side_h, side_w):
+        return None, None, None
+
+    if not is_checkerboard(gray[y0:y1, x0:x1], side_h):
+        return None, None, None
+
+    # Grid relative to the crop, so tile rects are in board pixels
+    board = arr[y0:y1, x0:x1]
+    if padding is None:
+        from app.services.template_chess_detector import template_padding
+        padding = template_padding(side_h / 8.0)
+    h_segments = np.rint(np.linspace(0, side_h, 9)).astype(int)
+    v_segments = np.rint(np.linspace(0, side_w, 9)).astype(int)
+    tiles = BoardTiles.from_grid(board, h_segments, v_segments, padding=padding)
+
+    corners = [[float(x0), float(y0)], [float(x1), float(y0)], [float(x1), float(y1)], [float(x0), float(y1)]]
+    print(f"🖥️ Screenshot board at ({x0},{y0})-({x1},{y1}), grid confidence {confidence:.2f}")
+    return tiles, board, corners
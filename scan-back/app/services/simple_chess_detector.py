@@ -2,16 +2,161 @@
 Simple grid-based chess position detector for digital boards.
 Works by detecting the 8x8 grid and analyzing each square.
 """
+import os
+
 import cv2
 import numpy as np
 from PIL import Image
 import io
 
+from app.services.board_tiles import BoardTiles
+from app.services.tile_cache import cached_tile_classifier
+
+
+# Grid periodicity (0-1) below which the grid-based paths give up early
+GRID_MIN_CONFIDENCE = float(os.getenv("GRID_MIN_CONFIDENCE", "0.3"))
+# Longest side the projection profiles are computed at
+GRID_PROFILE_MAX_SIDE = int(os.getenv("GRID_PROFILE_MAX_SIDE", "512"))
+
+
+def _profile_period(profile: np.ndarray, min_period: float, max_period: float):
+    """
+    Dominant period of a 1-D gradient profile via FFT autocorrelation.
+
+    Returns:
+        (period, periodicity) - sub-pixel period and its normalized
+        autocorrelation (0-1), or (None, 0.0) if there is no peak in range
+    """
+    x = profile - profile.mean()
+    n = len(x)
+    f = np.fft.rfft(x, n=2 * n)
+    ac = np.fft.irfft(f * np.conj(f))[:n]
+    if ac[0] <= 0:
+        return None, 0.0
+    ac = ac / ac[0]
+
+    lo, hi = max(1, int(min_period)), min(int(max_period) + 1, n - 1)
+    if hi - lo < 3:
+        return None, 0.0
+
+    seg = ac[lo:hi]
+    peaks = np.where((seg[1:-1] >= seg[:-2]) & (seg[1:-1] >= seg[2:]))[0] + 1
+    if len(peaks) == 0:
+        return None, 0.0
+
+    # Smallest lag that is nearly as periodic as the best one (not 2x the period)
+    best = seg[peaks].max()
+    lag = lo + peaks[np.argmax(seg[peaks] >= 0.8 * best)]
+
+    # Parabolic sub-pixel refinement
+    y0, y1, y2 = ac[lag - 1], ac[lag], ac[lag + 1]
+    d = y0 - 2 * y1 + y2
+    frac = 0.5 * (y0 - y2) / d if d != 0 else 0.0
+    return lag + float(np.clip(frac, -0.5, 0.5)), float(ac[lag])
+
+
+def _fit_grid_lines(profile: np.ndarray, period: float):
+    """
+    Place 9 equally spaced lines (8 squares) on the profile where they collect
+    the most gradient energy. Period is refined in +-1px steps of 0.25.
+    The image borders (positions -1 and len(profile)) may hold the outer
+    lines, for boards cropped without a margin.
+
+    Returns:
+        9 line positions, or None if no refined period fits the profile
+    """
+    n = len(profile)
+    # +-1px tolerance for rounding of the line positions
+    smoothed = np.maximum(profile, np.maximum(np.r_[profile[1:], 0], np.r_[0, profile[:-1]]))
+    padded = np.r_[0.0, smoothed, 0.0]  # padded[i + 1] is position i
+
+    best_score, best_lines = None, None
+    for p in np.arange(period - 1.0, period + 1.01, 0.25):
+        if 8 * p > n + 1:
+            continue
+        starts = np.arange(0, int(n + 1 - 8 * p) + 1)
+        idx = np.rint(starts[:, None] + np.arange(9)[None, :] * p).astype(int)
+        scores = padded[np.clip(idx, 0, n + 1)].sum(axis=1)
+        i = int(np.argmax(scores))
+        if best_score is None or scores[i] > best_score:
+            best_score, best_lines = scores[i], idx[i] - 1
+    return best_lines
+
+
+def detect_grid_lines_projection(image, max_side: int = GRID_PROFILE_MAX_SIDE):
+    """
+    Find the 8x8 grid from row/column gradient projections.
 
-def detect_grid_lines(image: Image.Image):
+    Absolute gradients are summed along each row and column (vectorized), the
+    square size is the dominant autocorrelation period of each profile, and
+    the 9 lines are the most energetic equally spaced positions. Frames and
+    borders around the board are ignored because they are not periodic.
+
+    Returns:
+        (horizontal_lines, vertical_lines, confidence) - 9 positions each in
+        image pixels and the weaker axis' periodicity (0-1);
+        (None, None, 0.0) if no grid period was found
+    """
+    arr = np.asarray(image)
+    gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY) if arr.ndim == 3 else arr
+
+    H, W = gray.shape
+    scale = min(1.0, max_side / float(max(H, W)))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(W * scale)), max(1, int(H * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    g = gray.astype(np.float32)
+    row_profile = np.abs(np.diff(g, axis=0)).sum(axis=1)   # horizontal lines
+    col_profile = np.abs(np.diff(g, axis=1)).sum(axis=0)   # vertical lines
+
+    result = []
+    for profile in (row_profile, col_profile):
+        n = len(profile)
+        # Board spans at least a quarter of the image side; a board cropped
+        # without a margin has a period of (n + 1) / 8
+        period, periodicity = _profile_period(profile, n * 0.25 / 8, (n + 1) / 8 + 1)
+        if period is None:
+            return None, None, 0.0
+        lines = _fit_grid_lines(profile, period)
+        if lines is None:
+            return None, None, 0.0
+        # diff index i is the edge between pixels i and i+1
+        result.append(([int(round((v + 1) / scale)) for v in lines], periodicity))
+
+    (h_lines, h_conf), (v_lines, v_conf) = result
+    return h_lines, v_lines, min(h_conf, v_conf)
+
+
+def detect_grid_lines(image: Image.Image, min_confidence: float = GRID_MIN_CONFIDENCE):
     """
     Detect horizontal and vertical grid lines in a chess board.
 
+    Uses the projection-profile finder; if the image is not periodic enough to
+    be a board the grid is reported as missing so callers can skip early.
+
+    Returns:
+        (horizontal_lines, vertical_lines) - Lists of line positions,
+        or (None, None) if no confident grid was found
+    """
+    print("🔍 Detecting grid lines...")
+
+    h_lines, v_lines, confidence = detect_grid_lines_projection(image)
+
+    if h_lines is None or confidence < min_confidence:
+        print(f"❌ No periodic grid (confidence {confidence:.2f} < {min_confidence:.2f})")
+        return None, None
+
+    print(f"  📏 Grid {h_lines[0]}-{h_lines[-1]} x {v_lines[0]}-{v_lines[-1]} "
+          f"(confidence {confidence:.2f})")
+
+    return h_lines, v_lines
+
+
+def detect_grid_lines_hough(image: Image.Image):
+    """
+    Detect horizontal and vertical grid lines with Canny + HoughLinesP.
+
     Returns:
         (horizontal_lines, vertical_lines) - Lists of line positions
     """
@@ -22,7 +167,7 @@ def detect_grid_lines(image: Image.Image):
     else:
         gray = img_array
 
-    print("🔍 Detecting grid lines...")
+    print("🔍 Detecting grid lines (Hough)...")
 
     # Enhance contrast
     clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
@@ -88,7 +233,7 @@ def extract_board_squares(image: Image.Image, h_lines, v_lines):
     Extract 64 individual square images from the board.
 
     Returns:
-        List of 64 PIL Images (row by row, a8 to h1)
+        BoardTiles with 64 tiles (row by row, a8 to h1)
     """
     if h_lines is None or v_lines is None:
         return None
@@ -100,8 +245,7 @@ def extract_board_squares(image: Image.Image, h_lines, v_lines):
 
     print("✂️  Extracting 64 squares...")
 
-    # Convert to numpy array
-    img_array = np.array(image)
+    img_array = np.asarray(image)
 
     # Sort lines
     h_lines = sorted(h_lines)
@@ -121,33 +265,19 @@ def extract_board_squares(image: Image.Image, h_lines, v_lines):
     h_segments = get_segments(h_lines)
     v_segments = get_segments(v_lines)
 
-    squares = []
-
-    # Extract each square (from top-left to bottom-right)
-    for row in range(8):
-        for col in range(8):
-            y1 = h_segments[row]
-            y2 = h_segments[row + 1]
-            x1 = v_segments[col]
-            x2 = v_segments[col + 1]
-
-            # Add small padding to avoid grid lines
-            padding = 2
-            y1 += padding
-            y2 -= padding
-            x1 += padding
-            x2 -= padding
-
-            square = img_array[y1:y2, x1:x2]
-
-            if square.size > 0:
-                square_img = Image.fromarray(square)
-                squares.append(square_img)
+    # Extract all squares (top-left to bottom-right) into one array,
+    # with small padding to avoid grid lines
+    try:
+        squares = BoardTiles.from_grid(img_array, h_segments, v_segments, padding=2)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return None
 
     print(f"✅ Extracted {len(squares)} squares")
     return squares
 
 
+@cached_tile_classifier("square")
 def classify_square(square_img: Image.Image):
     """
     Classify what's in a square: empty, white piece, or black piece.
@@ -159,7 +289,7 @@ def classify_square(square_img: Image.Image):
     from scipy.stats import entropy
 
     # Convert to numpy array
-    square = np.array(square_img)
+    square = np.asarray(square_img)
 
     # Convert to grayscale if needed
     if len(square.shape) == 3:
@@ -267,6 +397,7 @@ def classify_square(square_img: Image.Image):
         return ('piece', 'w')
 
 
+@cached_tile_classifier("piece_type")
 def classify_piece_type(square_img: Image.Image, color: str, debug=False):
     """
     Classify the type of piece (P, N, B, R, Q, K) using shape analysis.
@@ -274,7 +405,7 @@ def classify_piece_type(square_img: Image.Image, color: str, debug=False):
     Uses contour analysis, aspect ratios, and pixel distribution patterns.
     """
     # Convert to numpy array
-    square = np.array(square_img)
+    square = np.asarray(square_img)
 
     # Convert to grayscale if needed
     if len(square.shape) == 3:
@@ -541,7 +672,7 @@ def squares_to_fen(squares, rotation=None):
             # Save first 16 squares for inspection
             if i < 16:
                 debug_path = os.path.join(debug_dir, f"square_{i:02d}_{color}.png")
-                square_img.save(debug_path)
+                Image.fromarray(np.ascontiguousarray(square_img)).save(debug_path)
                 print(f"  💾 Saved square {i} to: {debug_path}")
 
             # Detect piece type with debug enabled for first few pieces
@@ -592,13 +723,14 @@ def squares_to_fen(squares, rotation=None):
     return fen
 
 
-def detect_chess_position_simple(image: Image.Image, rotation=None):
+def detect_chess_position_simple(image: Image.Image, rotation=None, cancel=None):
     """
     Main function: Detect chess position from digital board image.
 
     Args:
         image: PIL Image of a chess board
         rotation: 0 (white bottom), 90, 180 (black bottom), 270, or None (auto-detect)
+        cancel: threading.Event; detection stops between its steps once set
 
     Returns:
         FEN string or None if detection failed
@@ -612,6 +744,8 @@ def detect_chess_position_simple(image: Image.Image, rotation=None):
         if h_lines is None or v_lines is None:
             print("⚠️  Grid detection failed")
             return None
+        if cancel is not None and cancel.is_set():
+            return None
 
         # Step 2: Extract 64 squares
         squares = extract_board_squares(image, h_lines, v_lines)
@@ -619,6 +753,8 @@ def detect_chess_position_simple(image: Image.Image, rotation=None):
         if squares is None:
             print("⚠️  Square extraction failed")
             return None
+        if cancel is not None and cancel.is_set():
+            return None
 
         # Step 3: Classify squares and generate FEN
         fen = squares_to_fen(squares, rotation=rotation)
@@ -0,0 +1,259 @@
+"""
+Per-input-class statistics of the recognition strategies.
+
+Every stage run is recorded under the input's class ("photo", "screenshot"
+or "screenshot:<theme key>") with its latency and whether it produced a
+plausible FEN. The cascade then orders the cheap stages by expected time to
+a valid FEN (mean latency / success rate, the optimal order for independent
+attempts) and skips stages that practically never succeed for that class,
+with an occasional exploration run so the numbers stay current.
+
+Counts decay exponentially, so the order follows changes in traffic. Stats
+are saved as JSON (STRATEGY_STATS_PATH) and survive restarts. Workers
+sharing the file merge their new runs into it under a file lock instead of
+overwriting each other's counts.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialized between processes
+    fcntl = None
+
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+STRATEGY_STATS_ENABLED = os.getenv("STRATEGY_STATS", "1") == "1"
+STRATEGY_STATS_PATH = os.getenv("STRATEGY_STATS_PATH", str(DATA_DIR / "strategy_stats.json"))
+# Write the JSON file every N recorded runs (and at shutdown)
+STRATEGY_STATS_SAVE_EVERY = int(os.getenv("STRATEGY_STATS_SAVE_EVERY", "25"))
+# A stage counts as successful if its FEN is at least this plausible
+STRATEGY_MIN_PLAUSIBILITY = float(os.getenv("STRATEGY_MIN_PLAUSIBILITY", "0.9"))
+# Skip a stage after this many runs below this success rate...
+STRATEGY_SKIP_MIN_RUNS = float(os.getenv("STRATEGY_SKIP_MIN_RUNS", "30"))
+STRATEGY_SKIP_MAX_RATE = float(os.getenv("STRATEGY_SKIP_MAX_RATE", "0.02"))
+# ...but still run it on every Nth request of the class
+STRATEGY_EXPLORE_EVERY = int(os.getenv("STRATEGY_EXPLORE_EVERY", "20"))
+# Per-run decay of the counts (effective window of ~1 / (1 - decay) runs)
+STRATEGY_DECAY = 0.99
+# Latency prior of a stage without runs (ms)
+PRIOR_MS = 100.0
+
+
+def classify_input(image) -> str:
+    """
+    Input class of an image: "photo", "screenshot" or "screenshot:<theme>".
+
+    Uses the screenshot fast path's detection (memoized per image, so the
+    screenshot stage does not repeat it); the theme is identified from the
+    board crop, like the stored theme histograms.
+    """
+    from app.services.screenshot_detector import detect_screenshot_board, is_screenshot
+
+    if not is_screenshot(image):
+        return "photo"
+    theme = None
+    try:
+        _, board, _ = detect_screenshot_board(image)
+        if board is not None:
+            from app.services.template_store import compute_board_histogram, get_template_store
+            theme, _ = get_template_store().identify(compute_board_histogram(board))
+    except Exception as e:
+        print(f"⚠️ Theme identification error: {e}")
+    return f"screenshot:{theme}" if theme else "screenshot"
+
+
+def _decay_merge(base: dict, pending: dict) -> dict:
+    # Apply runs recorded on top of `base`: every entry of `pending` holds
+    # its decayed sums and the number of runs n they were decayed over
+    merged = {c: {name: dict(s) for name, s in stats.items()} for c, stats in base.items()}
+    for input_class, stats in pending.items():
+        target = merged.setdefault(input_class, {})
+        for name, p in stats.items():
+            b = target.get(name, {"runs": 0.0, "successes": 0.0, "ms": 0.0})
+            f = STRATEGY_DECAY ** p["n"]
+            target[name] = {k: b[k] * f + p[k] for k in ("runs", "successes", "ms")}
+            if "n" in b:  # merging two pending sets
+                target[name]["n"] = b["n"] + p["n"]
+    return merged
+
+
+class StrategyRegistry:
+    """
+    Latency / success statistics per (input class, strategy) and the stage
+    plan derived from them.
+    """
+
+    def __init__(self, path: str | None = STRATEGY_STATS_PATH):
+        self.path = path
+        self._classes = {}   # class -> strategy -> {"runs", "successes", "ms"} (decayed sums)
+        self._pending = {}   # runs since the last save, as above + "n" (run count)
+        self._plans = {}     # class -> plans handed out (exploration counter)
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+    # ------------------------------------------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._classes = json.load(f).get("classes", {})
+            print(f"📈 Loaded strategy stats for {len(self._classes)} input classes")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load strategy stats from {self.path}: {e}")
+
+    def save(self, replace: bool = False):
+        """
+        Merge the runs recorded since the last save into the stats file
+        (other workers' runs included) and adopt the merged stats.
+
+        Args:
+            replace: Overwrite the file with this process' stats instead
+        """
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._unsaved = 0
+            classes = self._classes
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._save_lock, open(f"{self.path}.lock", "w") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not replace:
+                    stored = {}
+                    if os.path.exists(self.path):
+                        try:
+                            with open(self.path) as f:
+                                stored = json.load(f).get("classes", {})
+                        except ValueError as e:
+                            print(f"⚠️ Ignoring unreadable strategy stats in {self.path}: {e}")
+                    classes = _decay_merge(stored, pending)
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(json.dumps({"version": 1, "classes": classes}, indent=1))
+                os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save strategy stats to {self.path}: {e}")
+            with self._lock:
+                self._pending = _decay_merge(pending, self._pending)
+            return
+        with self._lock:
+            # Runs recorded while saving stay pending and on top of the local view
+            self._classes = _decay_merge(classes, self._pending)
+
+    def reset(self):
+        with self._lock:
+            self._classes = {}
+            self._pending = {}
+            self._plans = {}
+        self.save(replace=True)
+
+    # ------------------------------------------------------------------
+    def record(self, input_class: str, name: str, ms: float, success: bool):
+        with self._lock:
+            stats = self._classes.setdefault(input_class, {})
+            s = stats.setdefault(name, {"runs": 0.0, "successes": 0.0, "ms": 0.0})
+            s["runs"] = s["runs"] * STRATEGY_DECAY + 1.0
+            s["successes"] = s["successes"] * STRATEGY_DECAY + (1.0 if success else 0.0)
+            s["ms"] = s["ms"] * STRATEGY_DECAY + float(ms)
+            p = self._pending.setdefault(input_class, {}).setdefault(
+                name, {"runs": 0.0, "successes": 0.0, "ms": 0.0, "n": 0})
+            p["runs"] = p["runs"] * STRATEGY_DECAY + 1.0
+            p["successes"] = p["successes"] * STRATEGY_DECAY + (1.0 if success else 0.0)
+            p["ms"] = p["ms"] * STRATEGY_DECAY + float(ms)
+            p["n"] += 1
+            self._unsaved += 1
+            due = self._unsaved >= STRATEGY_STATS_SAVE_EVERY
+        if due:
+            self.save()
+
+    @staticmethod
+    def _estimate(s) -> tuple[float, float]:
+        # (mean latency, success probability) with priors for few runs
+        if s is None:
+            return PRIOR_MS, 0.5
+        return (s["ms"] + PRIOR_MS) / (s["runs"] + 1.0), (s["successes"] + 1.0) / (s["runs"] + 2.0)
+
+    @staticmethod
+    def _skippable(s) -> bool:
+        return s is not None and s["runs"] >= STRATEGY_SKIP_MIN_RUNS and \
+            s["successes"] / s["runs"] < STRATEGY_SKIP_MAX_RATE
+
+    def _order(self, stats: dict, strategies) -> list:
+        # Cheap stages by expected cost / success (default order on ties),
+        # heavy ones last in default order
+        def cost(item):
+            ms, p = self._estimate(stats.get(item[1][0]))
+            return ms / p, item[0]
+
+        cheap = sorted([(i, s) for i, s in enumerate(strategies) if s[2]], key=cost)
+        return [s for _, s in cheap] + [s for s in strategies if not s[2]]
+
+    def plan(self, input_class: str, strategies) -> list:
+        """
+        Order (and filter) strategies for an input class.
+
+        Args:
+            strategies: [(name, stage, cheap), ...] in default order
+
+        Returns:
+            The strategies in run order; rarely successful ones are left out
+            except on exploration runs
+        """
+        with self._lock:
+            stats = self._classes.get(input_class, {})
+            n = self._plans[input_class] = self._plans.get(input_class, 0) + 1
+            ordered = self._order(stats, strategies)
+            if n % STRATEGY_EXPLORE_EVERY == 0:
+                return ordered
+            kept = [s for s in ordered if not self._skippable(stats.get(s[0]))]
+        return kept or ordered
+
+    def snapshot(self, strategies=None) -> dict:
+        """
+        Stats (and the current order, if `strategies` is given) per input class.
+        """
+        with self._lock:
+            classes = {}
+            for input_class, stats in self._classes.items():
+                entries = {}
+                for name, s in stats.items():
+                    ms, p = self._estimate(s)
+                    entries[name] = {
+                        "runs": round(s["runs"], 1),
+                        "successRate": round(s["successes"] / s["runs"], 3) if s["runs"] else None,
+                        "meanMs": round(s["ms"] / s["runs"], 1) if s["runs"] else None,
+                        "expectedCostMs": round(ms / p, 1),
+                        "skipped": self._skippable(s),
+                    }
+                classes[input_class] = {"strategies": entries}
+                if strategies is not None:
+                    classes[input_class]["order"] = [s[0] for s in self._order(stats, strategies)]
+        return {"path": self.path, "classes": classes}
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_strategy_registry() -> StrategyRegistry | None:
+    """
+    Process-wide registry (None if disabled via STRATEGY_STATS=0).
+    """
+    global _REGISTRY
+    if not STRATEGY_STATS_ENABLED:
+        return None
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = StrategyRegistry()
+    return _REGISTRY
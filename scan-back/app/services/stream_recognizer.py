@@ -0,0 +1,385 @@
+"""
+Continuous recognition of camera frames (over-the-board broadcasts).
+
+Full board detection runs only until a board is found; its homography is then
+locked and every later frame is just warped with it. Each warped frame is
+compared square by square (16x16 gray cells, global brightness shift removed;
+a square changed when enough of its pixels did, so a low-contrast piece
+counts as much as a dark one) with the board as last classified, and only
+squares that changed and have stopped moving for STREAM_SETTLE_FRAMES frames
+(the hand has left) are reclassified. A frame without changes costs a
+decode, one warp and a diff. Tiles are cut like the template tiles (the same
+share of the square trimmed off). If the position classified at lock time is
+implausible (a hand over the board, glare), all 64 squares are classified
+again on the next STREAM_RECHECK_FRAMES still frames until it is plausible.
+
+The lock is re-validated on every frame for the price of a few gradient sums:
+on a correctly warped board the intensity edges pile up on the 7 inner grid
+lines. When that alignment stays well below its value at lock time for
+STREAM_LOST_FRAMES frames (camera bumped, board moved), the lock is dropped
+and detection runs again.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app.services.fen_plausibility import plausibility_score
+from app.services.strategy_registry import STRATEGY_MIN_PLAUSIBILITY
+from app.services.template_chess_detector import TEMPLATE_SIZE
+
+
+# Tile side the locked board is warped to (board = 8 x (tile + 2 * padding))
+STREAM_TILE_SIZE = int(os.getenv("STREAM_TILE_SIZE", "48"))
+# Gray difference (0-255) at which a pixel of the diff grid counts as changed,
+# and the share of a square's pixels that must change for the square to count
+STREAM_DIFF_THRESHOLD = float(os.getenv("STREAM_DIFF_THRESHOLD", "12"))
+STREAM_DIFF_SHARE = float(os.getenv("STREAM_DIFF_SHARE", "0.05"))
+# Frames a changed square must be still before it is reclassified
+STREAM_SETTLE_FRAMES = int(os.getenv("STREAM_SETTLE_FRAMES", "2"))
+# Frames a less plausible reclassification is held back before it is accepted
+STREAM_MAX_HOLD_FRAMES = int(os.getenv("STREAM_MAX_HOLD_FRAMES", "5"))
+# Still frames on which an implausible lock-time position is classified again
+STREAM_RECHECK_FRAMES = int(os.getenv("STREAM_RECHECK_FRAMES", "3"))
+# Grid alignment needed to lock, and the share of the lock-time value below
+# which a frame counts as misaligned
+STREAM_MIN_GRID_SCORE = float(os.getenv("STREAM_MIN_GRID_SCORE", "1.5"))
+STREAM_LOST_RATIO = float(os.getenv("STREAM_LOST_RATIO", "0.6"))
+# Consecutive misaligned frames before the board is re-detected
+STREAM_LOST_FRAMES = int(os.getenv("STREAM_LOST_FRAMES", "3"))
+STREAM_MAX_CONNECTIONS = int(os.getenv("STREAM_MAX_CONNECTIONS", "8"))
+
+# Template tiles are TEMPLATE_SIZE px cut from TEMPLATE_SIZE + 4 px cells
+PADDING = max(1, int(round(STREAM_TILE_SIZE * 2 / TEMPLATE_SIZE[0])))
+# Side of one square in the differencing grid
+DIFF_CELL = 16
+
+_STREAM_SLOTS = threading.BoundedSemaphore(STREAM_MAX_CONNECTIONS)
+
+
+def acquire_stream_slot() -> bool:
+    """Reserve one of STREAM_MAX_CONNECTIONS stream slots (non-blocking)."""
+    return _STREAM_SLOTS.acquire(blocking=False)
+
+
+def release_stream_slot():
+    _STREAM_SLOTS.release()
+
+
+def _rotated_index(i: int, rotation: int) -> int:
+    # Tile index (image order) shown at FEN square i, as in squares_to_fen
+    row, col = i // 8, i % 8
+    if rotation == 90:
+        return col * 8 + (7 - row)
+    if rotation == 180:
+        return 63 - i
+    if rotation == 270:
+        return (7 - col) * 8 + row
+    return i
+
+
+def diff_grid(board: np.ndarray) -> np.ndarray:
+    """
+    (8, 8, DIFF_CELL, DIFF_CELL) float32 gray cells of a warped RGB board.
+    """
+    gray = cv2.cvtColor(board, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (8 * DIFF_CELL, 8 * DIFF_CELL), interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(small.astype(np.float32).reshape(8, DIFF_CELL, 8, DIFF_CELL).swapaxes(1, 2))
+
+
+def square_diff(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Per-square share of changed pixels (64,) of two diff grids: pixels that
+    differ by more than STREAM_DIFF_THRESHOLD after removing a global
+    brightness shift (camera auto-exposure). A white pawn on a light square
+    changes only a few gray levels on average but its outline pixels a lot.
+    """
+    d = (a - b).reshape(64, -1)
+    shift = np.median(d.mean(axis=1))
+    return (np.abs(d - shift) > STREAM_DIFF_THRESHOLD).mean(axis=1)
+
+
+def grid_alignment(cells: np.ndarray) -> float:
+    """
+    Mean gradient on the 7 inner grid lines relative to the mean gradient
+    elsewhere (about 1 when the warp is off, well above 1 when aligned).
+    """
+    gray = cells.swapaxes(1, 2).reshape(8 * DIFF_CELL, 8 * DIFF_CELL)
+    dx = np.abs(np.diff(gray, axis=1))
+    dy = np.abs(np.diff(gray, axis=0))
+    lines = np.arange(1, 8) * DIFF_CELL - 1  # diff index i: between pixels i and i+1
+    on = dx[:, lines].mean() + dy[lines, :].mean()
+    off = (dx.sum() - dx[:, lines].sum()) / (dx.size - dx[:, lines].size) + \
+          (dy.sum() - dy[lines, :].sum()) / (dy.size - dy[lines, :].size)
+    return float(on / max(off, 1e-3))
+
+
+class StreamRecognizer:
+    """
+    Per-connection state: locked corners, the reference cells the current
+    position was classified from, and the 64 tile symbols (image order).
+    """
+
+    def __init__(self, rotation: int | None = None, use_template_matching: bool = True):
+        self.requested_rotation = rotation
+        self.use_template_matching = use_template_matching
+        self.frames = 0
+        self.emitted = None        # FEN-order board of the last reply (kept across locks)
+        self.reset()
+
+    def reset(self):
+        """Drop the lock; the next frame runs full detection."""
+        self.corners = None        # working-image pixels
+        self.rotation = self.requested_rotation
+        self.templates = None
+        self.symbols = None        # 64 symbols ('.' empty), image order
+        self.reference = None      # diff cells the symbols were classified from
+        self.previous = None       # diff cells of the last frame
+        self.still = np.zeros(64, dtype=np.int32)
+        self.held = 0              # consecutive frames a reclassification was held back
+        self.rechecks = 0          # still frames left to reclassify an implausible lock
+        self.lock_score = 0.0
+        self.misaligned = 0
+
+    @property
+    def locked(self) -> bool:
+        return self.corners is not None
+
+    # ------------------------------------------------------------------
+    def _warp(self, image, corners) -> np.ndarray:
+        from app.services.board_detector import warp_board_from_corners
+        return np.asarray(warp_board_from_corners(image, corners, tile_size=STREAM_TILE_SIZE, padding=PADDING))
+
+    def _classify(self, tiles, indices) -> dict:
+        """
+        {tile index: symbol} for some tiles: template matching when the
+        board's theme is known, the shape classifier otherwise.
+        """
+        if self.templates:
+            from app.services.template_chess_detector import classify_pieces_by_template, detect_empty_square
+            pieces = [i for i in indices if not detect_empty_square(tiles[i])]
+            out = {i: '.' for i in indices}
+            for i, (piece, _) in zip(pieces, classify_pieces_by_template([tiles[i] for i in pieces],
+                                                                         self.templates)):
+                out[i] = piece
+            return out
+
+        from app.services.simple_chess_detector import classify_piece_type, classify_square
+        out = {}
+        for i in indices:
+            square_type, color = classify_square(tiles[i])
+            if square_type == 'empty':
+                out[i] = '.'
+            else:
+                piece_type = classify_piece_type(tiles[i], color)
+                out[i] = piece_type.upper() if color == 'w' else piece_type.lower()
+        return out
+
+    def _board(self, symbols) -> list:
+        # 64 symbols in FEN order (a8..h1)
+        return [symbols[_rotated_index(i, self.rotation or 0)] for i in range(64)]
+
+    def _fen(self, symbols) -> str:
+        from app.services.simple_chess_detector import _infer_castling_rights_from_board
+
+        board = self._board(symbols)
+        rows = []
+        for r in range(8):
+            row, empty = "", 0
+            for piece in board[r * 8:r * 8 + 8]:
+                if piece == '.':
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += piece
+            rows.append(row + (str(empty) if empty else ""))
+        return f"{'/'.join(rows)} w {_infer_castling_rights_from_board(board)} - 0 1"
+
+    @property
+    def fen(self) -> str | None:
+        return self._fen(self.symbols) if self.symbols is not None else None
+
+    def _detect(self, image):
+        # Screen captures: exact axis-aligned board; camera frames: SB at one
+        # scale (the next frame is the retry) / contours
+        from app.services.board_detector import detect_and_warp_board
+        from app.services.screenshot_detector import detect_screenshot_board
+
+        _, _, shot = detect_screenshot_board(image)
+        if shot is not None:
+            return shot
+        _, corners = detect_and_warp_board(image, pyramid=False, sb_scales=(1.0,))
+        return corners
+
+    def lock(self, image, corners=None) -> bool:
+        """
+        Detect the board (or take `corners`, working-image pixels), check the
+        warp is grid-aligned and classify all 64 squares.
+        """
+        from app.services.board_tiles import BoardTiles
+
+        if corners is None:
+            corners = self._detect(image)
+            if corners is None:
+                return False
+
+        board = self._warp(image, corners)
+        cells = diff_grid(board)
+        score = grid_alignment(cells)
+        if score < STREAM_MIN_GRID_SCORE:
+            print(f"📹 Stream: board candidate rejected (grid alignment {score:.2f})")
+            return False
+
+        tiles = BoardTiles.from_board(board, padding=PADDING)
+        if self.use_template_matching:
+            from app.services.template_chess_detector import identify_board_theme
+            _, self.templates = identify_board_theme(tiles, board)
+        if self.rotation is None:
+            from app.services.simple_chess_detector import detect_board_orientation
+            self.rotation = detect_board_orientation(tiles) or 0
+
+        classified = self._classify(tiles, range(64))
+        self.symbols = [classified[i] for i in range(64)]
+        self.corners = [list(map(float, p)) for p in corners]
+        self.reference = self.previous = cells
+        self.still[:] = 0
+        self.held = 0
+        self.lock_score = score
+        self.misaligned = 0
+        plausible = plausibility_score(self.fen) >= STRATEGY_MIN_PLAUSIBILITY
+        self.rechecks = 0 if plausible else STREAM_RECHECK_FRAMES
+        print(f"📹 Stream: board locked (grid alignment {score:.2f}, "
+              f"{'templates' if self.templates else 'shape classifier'}"
+              f"{'' if plausible else ', implausible position'})")
+        return True
+
+    # ------------------------------------------------------------------
+    def process(self, image, corners=None) -> dict:
+        """
+        Handle one frame.
+
+        Args:
+            image: Frame (PIL Image, working resolution)
+            corners: Lock onto these corners (working-image pixels) instead
+                     of detecting the board
+
+        Returns:
+            {"frame", "status", "fen", "changed", "ms"}; status is
+            "searching", "locked" (new lock), "tracking" or "lost", and
+            `changed` lists the squares (e.g. "e4") whose piece changed
+            since the last reply with a position (across re-locks too)
+        """
+        start = time.perf_counter()
+        self.frames += 1
+        status, changed = "tracking", []
+
+        if corners is not None:
+            self.reset()
+        if not self.locked:
+            status = "locked" if self.lock(image, corners) else "searching"
+            if status == "locked" and self.emitted is not None:
+                changed = [_fen_square_name(i) for i, (a, b) in
+                           enumerate(zip(self.emitted, self._board(self.symbols))) if a != b]
+        else:
+            board = self._warp(image, self.corners)
+            cells = diff_grid(board)
+            if grid_alignment(cells) < STREAM_LOST_RATIO * self.lock_score:
+                self.misaligned += 1
+                if self.misaligned >= STREAM_LOST_FRAMES:
+                    print("📹 Stream: board lost, re-detecting")
+                    self.reset()
+                    status = "lost"
+            else:
+                self.misaligned = 0
+                changed = self._update(board, cells)
+                if self.rechecks and (self.still >= STREAM_SETTLE_FRAMES).all():
+                    changed = sorted(set(changed) | set(self._recheck(board, cells)))
+
+        if self.symbols is not None:
+            self.emitted = self._board(self.symbols)
+        return {
+            "frame": self.frames,
+            "status": status,
+            "fen": self.fen,
+            "changed": changed,
+            "ms": round((time.perf_counter() - start) * 1000.0, 1),
+        }
+
+    def _update(self, board: np.ndarray, cells: np.ndarray) -> list[str]:
+        # Reclassify settled, changed squares; returns the squares whose piece changed
+        from app.services.board_tiles import BoardTiles
+
+        moving = square_diff(cells, self.previous) > STREAM_DIFF_SHARE
+        self.previous = cells
+        self.still = np.where(moving, 0, self.still + 1)
+        dirty = (square_diff(cells, self.reference) > STREAM_DIFF_SHARE) & \
+                (self.still >= STREAM_SETTLE_FRAMES)
+        indices = np.flatnonzero(dirty).tolist()
+        if not indices:
+            self.held = 0
+            return []
+
+        classified = self._classify(BoardTiles.from_board(board, padding=PADDING), indices)
+        symbols = list(self.symbols)
+        for i, piece in classified.items():
+            symbols[i] = piece
+        if symbols != self.symbols and \
+                plausibility_score(self._fen(symbols)) < plausibility_score(self._fen(self.symbols)):
+            # Most likely a hand resting on the board: keep the position and
+            # look at these squares again on the next frame - unless it stays
+            # (a legitimately less plausible position, e.g. a piece removed)
+            self.held += 1
+            if self.held < STREAM_MAX_HOLD_FRAMES:
+                return []
+            print(f"📹 Stream: accepting a less plausible position after {self.held} frames")
+        self.held = 0
+
+        # The new appearance of these squares is the reference from now on
+        reference = self.reference.copy()
+        reference.reshape(64, DIFF_CELL, DIFF_CELL)[indices] = cells.reshape(64, DIFF_CELL, DIFF_CELL)[indices]
+        self.reference = reference
+        moved = [i for i in indices if symbols[i] != self.symbols[i]]
+        self.symbols = symbols
+        return sorted(self._square_name(i) for i in moved)
+
+    def _recheck(self, board: np.ndarray, cells: np.ndarray) -> list[str]:
+        # Classify all 64 squares of a still frame again (theme included) and
+        # keep the result if it is more plausible than the lock-time position
+        from app.services.board_tiles import BoardTiles
+
+        self.rechecks -= 1
+        tiles = BoardTiles.from_board(board, padding=PADDING)
+        templates = self.templates
+        if self.use_template_matching:
+            from app.services.template_chess_detector import identify_board_theme
+            _, self.templates = identify_board_theme(tiles, board)
+        classified = self._classify(tiles, range(64))
+        symbols = [classified[i] for i in range(64)]
+        score = plausibility_score(self._fen(symbols))
+        if score <= plausibility_score(self.fen):
+            self.templates = templates
+            return []
+
+        moved = [i for i in range(64) if symbols[i] != self.symbols[i]]
+        self.symbols = symbols
+        self.reference = cells
+        self.held = 0
+        if score >= STRATEGY_MIN_PLAUSIBILITY:
+            self.rechecks = 0
+        print(f"📹 Stream: implausible lock-time position replaced ({len(moved)} squares)")
+        return [self._square_name(i) for i in moved]
+
+    def _square_name(self, tile_index: int) -> str:
+        # Board square shown at a tile (inverse of the FEN rotation mapping)
+        fen_index = next(i for i in range(64) if _rotated_index(i, self.rotation or 0) == tile_index)
+        return _fen_square_name(fen_index)
+
+
+def _fen_square_name(fen_index: int) -> str:
+    return f"{'abcdefgh'[fen_index % 8]}{8 - fen_index // 8}"
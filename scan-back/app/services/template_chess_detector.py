@@ -5,77 +5,299 @@ Works by matching piece images against templates using normalized cross-correlat
 import cv2
 import numpy as np
 from PIL import Image
+import hashlib
 import os
 from pathlib import Path
 
+from app.services.tile_cache import cached_tile_classifier, get_tile_cache
+
 
-# Template cache
-TEMPLATES = {}
 TEMPLATE_SIZE = (32, 32)  # Standard size for templates
+# Bare-square pixels (within this many gray levels of the tile border,
+# connected to it) are set to one gray level before matching
+SQUARE_BACKGROUND_TOLERANCE = 16
+SQUARE_BACKGROUND_LEVEL = 128
 
 
-def load_templates_from_starting_position(squares):
+def template_padding(cell: float) -> int:
+    """
+    Pixels to trim off each side of a `cell` px square so the tile is cut
+    like the template tiles (TEMPLATE_SIZE px from TEMPLATE_SIZE + 4 px cells).
     """
-    Extract templates from a starting position.
+    return max(1, int(round(cell * 2 / (TEMPLATE_SIZE[0] + 4))))
 
-    Args:
-        squares: List of 64 PIL Images from starting position
 
-    Returns:
-        Dictionary mapping piece symbols to template images
+# Starting position layout (from white's perspective, row 0 = rank 8)
+STARTING_LAYOUT = [
+    'r', 'n', 'b', 'q', 'k', 'b', 'n', 'r',  # Black back rank
+    'p', 'p', 'p', 'p', 'p', 'p', 'p', 'p',  # Black pawns
+    '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
+    '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
+    '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
+    '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
+    'P', 'P', 'P', 'P', 'P', 'P', 'P', 'P',  # White pawns
+    'R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R',  # White back rank
+]
+
+
+def fen_to_layout(fen: str):
+    """
+    Expand the placement field of a FEN into a 64-entry layout ('.' = empty).
     """
-    global TEMPLATES
+    layout = []
+    for ch in fen.split()[0]:
+        if ch == '/':
+            continue
+        if ch.isdigit():
+            layout.extend(['.'] * int(ch))
+        else:
+            layout.append(ch)
+    if len(layout) != 64:
+        raise ValueError(f"Invalid FEN placement: {fen}")
+    return layout
 
-    # Starting position layout (from white's perspective, row 0 = rank 8)
-    starting_layout = [
-        'r', 'n', 'b', 'q', 'k', 'b', 'n', 'r',  # Black back rank
-        'p', 'p', 'p', 'p', 'p', 'p', 'p', 'p',  # Black pawns
-        '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
-        '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
-        '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
-        '.', '.', '.', '.', '.', '.', '.', '.',  # Empty
-        'P', 'P', 'P', 'P', 'P', 'P', 'P', 'P',  # White pawns
-        'R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R',  # White back rank
-    ]
 
-    print("🎨 Extracting piece templates from starting position...")
+def extract_templates_from_layout(squares, layout):
+    """
+    Extract one template per piece symbol from a board with a known layout.
 
+    Args:
+        squares: List of 64 PIL Images
+        layout: 64 piece symbols ('.' for empty), row 0 = rank 8
+
+    Returns:
+        Dictionary mapping piece symbols to template images
+    """
     templates = {}
     piece_counts = {}
 
-    for i, piece in enumerate(starting_layout):
+    for i, piece in enumerate(layout):
         if piece == '.':
             continue
 
         # Get the square image
         square_img = squares[i]
 
-        # Resize to standard template size
-        square_resized = square_img.resize(TEMPLATE_SIZE, Image.Resampling.LANCZOS)
-
-        # Convert to grayscale numpy array
-        template_gray = np.array(square_resized.convert('L'))
-
         # Store template (use first occurrence of each piece type)
         if piece not in templates:
-            templates[piece] = template_gray
+            # Resize to standard template size (grayscale)
+            templates[piece] = tile_to_template_gray(square_img)
             piece_counts[piece] = 1
             print(f"  ✅ Extracted template for {piece}")
         else:
             piece_counts[piece] += 1
 
-    TEMPLATES = templates
     print(f"  📦 Loaded {len(templates)} unique piece templates")
     return templates
 
 
+def load_templates_from_starting_position(squares, fingerprint=None, board_image=None):
+    """
+    Extract templates from a starting position and save them in the
+    template store under the board's theme fingerprint.
+
+    Args:
+        squares: List of 64 PIL Images from starting position
+        fingerprint: Theme fingerprint (computed from squares if None)
+        board_image: Board crop, used to store a color histogram for theme identification
+
+    Returns:
+        Dictionary mapping piece symbols to template images
+    """
+    from app.services.template_store import (
+        get_template_store, compute_theme_fingerprint, compute_board_histogram,
+    )
+
+    print("🎨 Extracting piece templates from starting position...")
+    templates = extract_templates_from_layout(squares, STARTING_LAYOUT)
+
+    if fingerprint is None:
+        fingerprint = compute_theme_fingerprint(squares)
+    histogram = compute_board_histogram(board_image) if board_image is not None else None
+    get_template_store().save(fingerprint, templates, histogram=histogram)
+    return templates
+
+
+def tile_to_template_gray(square_img):
+    """
+    Convert a square (PIL Image or array) to a TEMPLATE_SIZE grayscale uint8 array.
+    """
+    square = np.asarray(square_img)
+    if square.ndim == 3:
+        square = cv2.cvtColor(square, cv2.COLOR_RGB2GRAY)
+    if square.shape[:2] != (TEMPLATE_SIZE[1], TEMPLATE_SIZE[0]):
+        square = cv2.resize(square, TEMPLATE_SIZE, interpolation=cv2.INTER_AREA)
+    return square
+
+
+def mask_square_background(gray: np.ndarray) -> np.ndarray:
+    """
+    Replace the bare square around a piece with SQUARE_BACKGROUND_LEVEL, so a
+    piece matches its template whatever the square colour: on light squares
+    of low-contrast themes the background otherwise decides the match.
+    The background is what is connected to the tile border and close to the
+    border's median; a piece's outline keeps its own fill from being masked.
+    """
+    gray = np.asarray(gray)
+    ring = np.concatenate([gray[0], gray[-1], gray[1:-1, 0], gray[1:-1, -1]])
+    near = (np.abs(gray.astype(np.int16) - int(np.median(ring))) <= SQUARE_BACKGROUND_TOLERANCE)
+    count, labels = cv2.connectedComponents(near.astype(np.uint8), connectivity=4)
+    touches = np.zeros(count, dtype=bool)
+    touches[np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]])] = True
+    touches[0] = False  # label 0: pixels far from the border colour
+    return np.where(touches[labels], np.uint8(SQUARE_BACKGROUND_LEVEL), gray)
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    """
+    Zero-mean, unit-norm rows. The dot product of two such rows equals
+    cv2.TM_CCOEFF_NORMED on same-size images.
+    """
+    mat = mat.astype(np.float32)
+    mat -= mat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.maximum(norms, 1e-6)
+
+
+def build_template_matrix(templates):
+    """
+    Stack templates into pre-normalized (K, 1024) matrices, as they are and
+    with the square background masked (mask_square_background).
+
+    Returns:
+        (symbols, matrix) - symbols[k] is the piece for row k of both
+        layers of the (2, K, 1024) matrix
+    """
+    symbols = list(templates.keys())
+    if not symbols:
+        return [], np.zeros((2, 0, TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1]), dtype=np.float32)
+    return symbols, _stack_layers([np.asarray(templates[p]) for p in symbols])
+
+
+def _stack_layers(grays) -> np.ndarray:
+    # (2, N, 1024): normalized tiles as they are, and with the background masked
+    raw = np.stack([g.reshape(-1) for g in grays])
+    masked = np.stack([mask_square_background(g).reshape(-1) for g in grays])
+    return np.stack([_normalize_rows(raw), _normalize_rows(masked)])
+
+
+# id(templates) -> (templates, symbols, matrix, token) for recently used template sets.
+# Holding the dict keeps its id from being reused while cached.
+_TEMPLATE_MATRIX_CACHE = {}
+_TEMPLATE_MATRIX_CACHE_SIZE = 16
+
+
+def _get_template_entry(templates):
+    cached = _TEMPLATE_MATRIX_CACHE.get(id(templates))
+    if cached is not None and cached[0] is templates:
+        return cached[1:]
+
+    symbols, mat = build_template_matrix(templates)
+    # Content token, so tile-cache entries survive reloading the same theme
+    token = hashlib.blake2b("".join(symbols).encode() + mat.tobytes(), digest_size=8).hexdigest()
+    if len(_TEMPLATE_MATRIX_CACHE) >= _TEMPLATE_MATRIX_CACHE_SIZE:
+        _TEMPLATE_MATRIX_CACHE.pop(next(iter(_TEMPLATE_MATRIX_CACHE)))
+    _TEMPLATE_MATRIX_CACHE[id(templates)] = (templates, symbols, mat, token)
+    return symbols, mat, token
+
+
+def _get_template_matrix(templates):
+    symbols, mat, _ = _get_template_entry(templates)
+    return symbols, mat
+
+
+def squares_to_matrix(squares) -> np.ndarray:
+    """
+    Stack squares into pre-normalized (2, N, 1024) matrices: as they are and
+    with the square background masked, like the templates.
+    """
+    if len(squares) == 0:
+        return np.zeros((2, 0, TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1]), dtype=np.float32)
+    return _stack_layers([tile_to_template_gray(sq) for sq in squares])
+
+
+def score_squares_against_templates(squares, templates=None):
+    """
+    NCC scores of every square against every template with one matrix
+    multiply per layer. A square scores the better of the plain and the
+    background-masked correlation, so a template learned on one square
+    colour also matches its piece on the other one.
+
+    Args:
+        squares: List of PIL Images (or arrays) of chess squares
+        templates: Dict of piece templates
+
+    Returns:
+        (symbols, scores) where scores has shape (N, K)
+    """
+    symbols, tmpl_mat = _get_template_matrix(templates or {})
+    return symbols, np.max(squares_to_matrix(squares) @ tmpl_mat.transpose(0, 2, 1), axis=0)
+
+
+def classify_pieces_by_template(squares, templates=None):
+    """
+    Classify many squares at once using template matching.
+
+    Args:
+        squares: List of PIL Images (or arrays) of chess squares
+        templates: Dict of piece templates
+
+    Returns:
+        List of (piece_symbol, confidence) tuples, same rules as classify_piece_by_template
+    """
+    if not templates or len(squares) == 0:
+        return [('.', 0.0)] * len(squares)
+
+    def classify(batch):
+        symbols, scores = score_squares_against_templates(batch, templates)
+        return _pick_from_scores(symbols, scores)
+
+    cache = get_tile_cache()
+    if cache is None:
+        return classify(squares)
+    _, _, token = _get_template_entry(templates)
+    return cache.map_batch(f"template:{token}", squares, classify)
+
+
+def _pick_from_scores(symbols, scores):
+    """
+    Vectorized best / second-best selection.
+
+    A match needs at least 50% correlation and a clear winner: at least 10%
+    better than the runner-up (the 50% floor counts as the runner-up when
+    nothing else clears it).
+    """
+    n, k = scores.shape
+    rows = np.arange(n)
+    top = scores.argmax(axis=1)
+    best = scores[rows, top]
+    if k > 1:
+        second = np.partition(scores, k - 2, axis=1)[:, k - 2]
+    else:
+        second = np.zeros(n, dtype=scores.dtype)
+    second = np.maximum(second, 0.5)
+
+    matched = best > 0.5
+    ambiguous = matched & ((best - second) < 0.1)
+
+    results = []
+    for i in range(n):
+        if ambiguous[i]:
+            results.append(('.', 0.0))
+        elif matched[i]:
+            results.append((symbols[top[i]], float(best[i])))
+        else:
+            results.append(('.', 0.5))
+    return results
+
+
 def classify_piece_by_template(square_img: Image.Image, templates=None, debug=False):
     """
     Classify a piece using template matching.
 
     Args:
         square_img: PIL Image of a chess square
-        templates: Dict of piece templates (will use global if None)
+        templates: Dict of piece templates (e.g. from the template store)
         debug: Print debug information
 
     Returns:
@@ -83,57 +305,59 @@ def classify_piece_by_template(square_img: Image.Image, templates=None, debug=Fa
         piece_symbol is like 'P', 'p', 'R', 'r', etc. or '.' for empty
         confidence is 0.0 to 1.0
     """
-    if templates is None:
-        templates = TEMPLATES
-
     if not templates:
         if debug:
             print("  ⚠️ No templates loaded, cannot classify")
         return ('.', 0.0)
 
-    # Resize to template size
-    square_resized = square_img.resize(TEMPLATE_SIZE, Image.Resampling.LANCZOS)
-    square_gray = np.array(square_resized.convert('L'))
-
-    # Try matching against each template
-    best_match = '.'
-    best_score = 0.5  # Higher threshold - need at least 50% correlation
-    second_best_score = 0.0
-
-    scores = {}
-    for piece, template in templates.items():
-        # Use normalized cross-correlation
-        result = cv2.matchTemplate(square_gray, template, cv2.TM_CCOEFF_NORMED)
-        max_val = result[0][0]
-        scores[piece] = max_val
-
-        if max_val > best_score:
-            second_best_score = best_score
-            best_score = max_val
-            best_match = piece
-        elif max_val > second_best_score:
-            second_best_score = max_val
+    symbols, scores = score_squares_against_templates([square_img], templates)
+    result = _pick_from_scores(symbols, scores)[0]
 
     if debug:
-        # Show top 5 matches sorted by score
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        print(f"    Top matches:")
-        for piece, score in sorted_scores[:5]:
-            marker = "✓" if piece == best_match else " "
-            print(f"      {marker} {piece}: {score:.3f}")
-
-    # Require a clear winner (at least 10% better than second place)
-    if best_match != '.' and (best_score - second_best_score) < 0.1:
-        if debug:
-            print(f"  ⚠️ Ambiguous match (diff={best_score - second_best_score:.3f}), defaulting to empty")
-        return ('.', 0.0)
+        _print_template_scores(symbols, scores[0], result)
 
-    if debug:
+    return result
+
+
+def _print_template_scores(symbols, row, result):
+    best_match, best_score = result
+    # Show top 5 matches sorted by score
+    order = np.argsort(row)[::-1]
+    print(f"    Top matches:")
+    for k in order[:5]:
+        marker = "✓" if symbols[k] == best_match else " "
+        print(f"      {marker} {symbols[k]}: {row[k]:.3f}")
+
+    if best_match == '.' and best_score == 0.0:
+        print(f"  ⚠️ Ambiguous match, defaulting to empty")
+    else:
         print(f"  → Best match: {best_match} (confidence: {best_score:.3f})")
 
-    return (best_match, best_score)
 
+def identify_board_theme(squares, board_image=None):
+    """
+    Pick the template set for this board.
+    Tries the fast color-histogram identifier on the board crop first
+    (bundled + learned themes), then the square/piece color fingerprint.
+
+    Returns:
+        (theme key, templates dict) or (None, None)
+    """
+    from app.services.template_store import (
+        get_template_store, compute_theme_fingerprint, compute_board_histogram,
+    )
+
+    store = get_template_store()
+
+    if board_image is not None:
+        theme, templates = store.identify(compute_board_histogram(board_image))
+        if templates:
+            return theme, templates
+
+    return store.lookup(compute_theme_fingerprint(squares))
 
+
+@cached_tile_classifier("template_empty")
 def detect_empty_square(square_img: Image.Image):
     """
     Determine if a square is empty using edge detection.
@@ -142,7 +366,7 @@ def detect_empty_square(square_img: Image.Image):
         True if empty, False if has a piece
     """
     # Convert to numpy array
-    square = np.array(square_img)
+    square = np.asarray(square_img)
 
     # Convert to grayscale if needed
     if len(square.shape) == 3:
@@ -165,17 +389,21 @@ def detect_empty_square(square_img: Image.Image):
     return edge_ratio < 0.02
 
 
-def squares_to_fen_template(squares, rotation=None, use_starting_position_templates=False):
+def squares_to_fen_template(squares, rotation=None, use_starting_position_templates=False,
+                            templates=None, board_image=None):
     """
     Convert 64 squares to FEN using template matching.
 
     Args:
         squares: List of 64 PIL Images
         rotation: Board rotation (0, 90, 180, 270, or None for auto-detect)
-        use_starting_position_templates: If True, assume first image is starting position
+        use_starting_position_templates: If True, this board is a starting position;
+            learn (and store) templates for its theme from it
+        templates: Dict of piece templates (looked up by theme if None)
+        board_image: Board crop used to identify the theme by color histogram
 
     Returns:
-        FEN string
+        FEN string, or None if no templates are known for this board's theme
     """
     print("🎯 Analyzing squares with template matching...")
 
@@ -183,11 +411,20 @@ def squares_to_fen_template(squares, rotation=None, use_starting_position_templa
         print("❌ Invalid number of squares")
         return None
 
-    # If we should use starting position templates and don't have any yet
-    if use_starting_position_templates and not TEMPLATES:
-        load_templates_from_starting_position(squares)
+    if templates is None:
+        if use_starting_position_templates:
+            templates = load_templates_from_starting_position(squares, board_image=board_image)
+        else:
+            theme, templates = identify_board_theme(squares, board_image)
+            if templates:
+                print(f"  🎨 Using templates for theme {theme}")
+
+    if not templates:
+        print("⚠️ No templates for this board theme")
+        return None
 
-    board = []
+    board = ['.'] * 64
+    pending = []  # (board index, square) of non-empty squares
 
     for i in range(64):
         # Apply rotation to square index
@@ -223,13 +460,18 @@ def squares_to_fen_template(squares, rotation=None, use_starting_position_templa
         if is_empty:
             if debug:
                 print(f"    → Classified as EMPTY")
-            board.append('.')
             continue
 
-        # Use template matching
-        piece, confidence = classify_piece_by_template(square_img, debug=debug)
+        pending.append((i, square_img))
 
-        board.append(piece)
+    # Match all non-empty squares against all templates in one matrix multiply
+    # (tiles seen before come from the tile cache)
+    if pending:
+        results = classify_pieces_by_template([sq for _, sq in pending], templates)
+        for (i, _), (piece, confidence) in zip(pending, results):
+            if i < 16:
+                print(f"  Square {i} → {piece} (confidence: {confidence:.3f})")
+            board[i] = piece
 
     # Convert board array to FEN
     fen_rows = []
@@ -264,7 +506,48 @@ def squares_to_fen_template(squares, rotation=None, use_starting_position_templa
     return fen
 
 
-def detect_chess_position_template(image: Image.Image, rotation=None, is_starting_position=False):
+def extract_squares_for_templates(image: Image.Image):
+    """
+    Tile the board the way the template path does: find the grid lines, then
+    warp the grid's bounding box straight to 8 x (TEMPLATE_SIZE + padding) px
+    so the 64 slices are already template-sized.
+
+    Returns:
+        (squares, board) - 64 PIL Images and the warped board as an RGB array,
+        or (None, None) if the grid could not be found
+    """
+    from app.services.simple_chess_detector import detect_grid_lines
+    from app.services.board_detector import warp_board_from_corners, extract_board_squares_warped
+
+    # Step 1: Detect grid lines
+    h_lines, v_lines = detect_grid_lines(image)
+
+    if h_lines is None or v_lines is None:
+        print("⚠️  Grid detection failed")
+        return None, None
+
+    if len(h_lines) < 2 or len(v_lines) < 2:
+        print("❌ Not enough grid lines detected")
+        return None, None
+
+    # Step 2: Warp the grid box (no frame trim - grid lines are the board edge)
+    x0, x1 = float(min(v_lines)), float(max(v_lines))
+    y0, y1 = float(min(h_lines)), float(max(h_lines))
+    board = warp_board_from_corners(image, [[x0, y0], [x1, y0], [x1, y1], [x0, y1]],
+                                    trim_ratio=0.0, tile_size=TEMPLATE_SIZE[0], padding=2)
+
+    # Step 3: Extract 64 squares
+    squares = extract_board_squares_warped(board, padding=2)
+
+    if len(squares) != 64:
+        print("⚠️  Square extraction failed")
+        return None, None
+
+    return squares, np.asarray(board)
+
+
+def detect_chess_position_template(image: Image.Image, rotation=None, is_starting_position=False,
+                                   squares=None, board_image=None, cancel=None):
     """
     Main function: Detect chess position using template matching.
 
@@ -272,32 +555,29 @@ def detect_chess_position_template(image: Image.Image, rotation=None, is_startin
         image: PIL Image of a chess board
         rotation: Board rotation (0, 90, 180, 270, or None for auto-detect)
         is_starting_position: If True, use this image to extract templates
+        squares: Already sliced tiles (e.g. from the screenshot fast path);
+            grid detection is skipped when given
+        board_image: Board crop matching `squares` (for theme identification)
+        cancel: threading.Event; detection stops before classifying once set
 
     Returns:
         FEN string or None if detection failed
     """
     try:
-        from app.services.simple_chess_detector import detect_grid_lines, extract_board_squares
-
         print("🎲 Starting template-based detection...")
 
-        # Step 1: Detect grid lines
-        h_lines, v_lines = detect_grid_lines(image)
-
-        if h_lines is None or v_lines is None:
-            print("⚠️  Grid detection failed")
-            return None
-
-        # Step 2: Extract 64 squares
-        squares = extract_board_squares(image, h_lines, v_lines)
+        if squares is not None:
+            board_crop = board_image
+        else:
+            squares, board_crop = extract_squares_for_templates(image)
 
-        if squares is None:
-            print("⚠️  Square extraction failed")
+        if squares is None or (cancel is not None and cancel.is_set()):
             return None
 
-        # Step 3: Classify using templates
+        # Step 3: Classify using templates (theme identified from the board crop)
         fen = squares_to_fen_template(squares, rotation=rotation,
-                                       use_starting_position_templates=is_starting_position)
+                                       use_starting_position_templates=is_starting_position,
+                                       board_image=board_crop)
 
         return fen
 
@@ -0,0 +1,457 @@
+"""
+Persistent, per-theme template store for template matching.
+
+Templates learned from a starting-position scan are saved on disk under a
+board-theme fingerprint (light/dark square colors + piece palette), so any
+uvicorn worker can match boards of that theme right away and several themes
+can coexist. Each theme is two files:
+
+    <key>.npy   (12, 32, 32) uint8 grayscale templates, loaded with mmap
+    <key>.json  fingerprint, piece symbols and board color histogram
+                (written last, marks the entry complete)
+
+A read-only library of bundled themes for common digital boards ships in
+app/data/themes and is searched alongside the learned ones. It is built from
+the screenshots and FENs listed in app/data/theme_sources/themes.json:
+
+    python -m app.services.template_store build-bundled
+
+Entries with a "render" block are boards drawn from python-chess's SVG pieces
+(cburnett, the lichess default) in that site's square colors; their PNGs are
+committed, and re-rendering a missing one needs pymupdf. Add a single theme
+from any screenshot with:
+
+    python -m app.services.template_store build --image board.png --fen "<FEN>" --name lichess_brown
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+TEMPLATE_STORE_DIR = Path(os.getenv("TEMPLATE_STORE_DIR", str(DATA_DIR / 'templates')))
+BUNDLED_THEMES_DIR = DATA_DIR / 'themes'
+THEME_SOURCES_DIR = DATA_DIR / 'theme_sources'
+
+# Fixed symbol order for stored template arrays
+PIECE_SYMBOLS = "PNBRQKpnbrqk"
+
+# Fingerprint matching tolerances (0..255 color units)
+BOARD_COLOR_TOLERANCE = 20.0    # max per-channel difference of square colors
+PIECE_PALETTE_TOLERANCE = 60.0  # mean difference of piece palette colors
+
+# Board color histogram (theme identification)
+HISTOGRAM_BINS = 8                 # per RGB channel
+HISTOGRAM_MAX_DISTANCE = 0.35      # Bhattacharyya distance, 0 = identical
+
+# Global store (created on first use)
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def _rgb(square) -> np.ndarray:
+    arr = np.asarray(square)
+    if arr.ndim == 2:
+        arr = cv2.cvtColor(arr, cv2.COLOR_GRAY2RGB)
+    return arr[..., :3]
+
+
+def compute_theme_fingerprint(squares) -> np.ndarray:
+    """
+    Fingerprint the board theme from its 64 squares.
+
+    Returns:
+        (12,) float32 vector: light square RGB, dark square RGB,
+        light piece RGB, dark piece RGB
+    """
+    backgrounds = []
+    foreground = []
+
+    for sq in squares:
+        arr = _rgb(sq)[::2, ::2]
+        h, w = arr.shape[:2]
+        m = max(1, min(h, w) // 8)
+
+        # Border ring is (almost) always bare square color
+        ring = np.concatenate([
+            arr[:m].reshape(-1, 3), arr[-m:].reshape(-1, 3),
+            arr[:, :m].reshape(-1, 3), arr[:, -m:].reshape(-1, 3),
+        ])
+        bg = np.median(ring, axis=0)
+        backgrounds.append(bg)
+
+        # Pixels far from the square color belong to a piece
+        far = np.abs(arr.astype(np.int16) - bg.astype(np.int16)).sum(axis=2) > 90
+        if far.any():
+            foreground.append(arr[far])
+
+    backgrounds = np.array(backgrounds, dtype=np.float32)
+    parity = np.array([(i // 8 + i % 8) % 2 for i in range(len(backgrounds))])
+    group_a = np.median(backgrounds[parity == 0], axis=0)
+    group_b = np.median(backgrounds[parity == 1], axis=0)
+    light_sq, dark_sq = sorted([group_a, group_b], key=lambda c: -float(c.sum()))
+
+    light_pc = dark_pc = np.zeros(3, dtype=np.float32)
+    if foreground:
+        fg = np.concatenate(foreground).astype(np.float32)
+        if len(fg) >= 50:
+            lum = fg.sum(axis=1)
+            hi, lo = np.percentile(lum, [80, 20])
+            light_pc = fg[lum >= hi].mean(axis=0)
+            dark_pc = fg[lum <= lo].mean(axis=0)
+
+    return np.concatenate([light_sq, dark_sq, light_pc, dark_pc]).astype(np.float32)
+
+
+def compute_board_histogram(board_image) -> np.ndarray:
+    """
+    Normalized RGB color histogram of the board region (theme identifier).
+
+    Returns:
+        (HISTOGRAM_BINS ** 3,) float32 vector summing to 1
+    """
+    arr = _rgb(board_image)
+    arr = np.ascontiguousarray(cv2.resize(arr, (128, 128), interpolation=cv2.INTER_AREA))
+    hist = cv2.calcHist([arr], [0, 1, 2], None, [HISTOGRAM_BINS] * 3, [0, 256] * 3).ravel()
+    return (hist / max(hist.sum(), 1.0)).astype(np.float32)
+
+
+def histogram_distance(a: np.ndarray, b: np.ndarray) -> float:
+    return float(cv2.compareHist(np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32),
+                                 cv2.HISTCMP_BHATTACHARYYA))
+
+
+def fingerprint_key(fingerprint: np.ndarray) -> str:
+    """
+    Stable file key: each fingerprint channel quantized to one hex digit.
+    """
+    q = np.clip(np.asarray(fingerprint) // 16, 0, 15).astype(int)
+    return "theme_" + "".join(f"{v:x}" for v in q)
+
+
+def fingerprint_distance(a: np.ndarray, b: np.ndarray):
+    """
+    Returns (board_distance, palette_distance) between two fingerprints.
+    """
+    diff = np.abs(np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32))
+    return float(diff[:6].max()), float(diff[6:].mean())
+
+
+class TemplateStore:
+    """
+    Directory-backed template store shared by all workers on a host.
+
+    Writes go through a temp file + os.replace, so concurrent workers never
+    see half-written entries. Each worker caches the directory listing and
+    re-scans it when the directory changes. Bundled directories are read-only;
+    learned themes in `root` take precedence over bundled ones with the same key.
+    """
+
+    def __init__(self, root=TEMPLATE_STORE_DIR, bundled_roots=(BUNDLED_THEMES_DIR,)):
+        self.root = Path(root)
+        self.bundled_roots = [Path(r) for r in bundled_roots]
+        self._lock = threading.Lock()
+        self._entries = {}        # key -> {"fingerprint", "symbols", "histogram", "dir", ...}
+        self._templates = {}      # key -> dict(symbol -> (32, 32) mmap view)
+        self._dir_mtimes = None
+
+    # ------------------------------------------------------------------
+    def _refresh(self):
+        dirs = self.bundled_roots + [self.root]
+        mtimes = []
+        for d in dirs:
+            try:
+                mtimes.append(d.stat().st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        if mtimes == self._dir_mtimes:
+            return
+
+        entries = {}
+        for d, mtime in zip(dirs, mtimes):
+            if mtime is None:
+                continue
+            for meta_path in d.glob("theme_*.json"):
+                try:
+                    meta = json.loads(meta_path.read_text())
+                    hist = meta.get("histogram")
+                    entries[meta_path.stem] = {
+                        "fingerprint": np.array(meta["fingerprint"], dtype=np.float32),
+                        "symbols": meta["symbols"],
+                        "histogram": np.array(hist, dtype=np.float32) if hist else None,
+                        "name": meta.get("name"),
+                        "bundled": d != self.root,
+                        "dir": d,
+                    }
+                except (OSError, ValueError, KeyError):
+                    continue
+
+        # Entries may have been rewritten by another worker; reopen arrays lazily
+        self._templates = {}
+        self._entries = entries
+        self._dir_mtimes = mtimes
+
+    def _load_templates(self, key):
+        if key not in self._templates:
+            meta = self._entries[key]
+            arr = np.load(meta["dir"] / f"{key}.npy", mmap_mode="r")
+            self._templates[key] = {sym: arr[i] for i, sym in enumerate(meta["symbols"])}
+        return self._templates[key]
+
+    # ------------------------------------------------------------------
+    def has_themes(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return bool(self._entries)
+
+    def themes(self) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            return [
+                {
+                    "key": k,
+                    "name": e["name"],
+                    "bundled": e["bundled"],
+                    "fingerprint": [round(float(v), 1) for v in e["fingerprint"]],
+                }
+                for k, e in sorted(self._entries.items())
+            ]
+
+    def identify(self, histogram: np.ndarray):
+        """
+        Identify the theme from a board color histogram.
+
+        Returns:
+            (key, templates dict) or (None, None) if no theme is close enough
+        """
+        with self._lock:
+            self._refresh()
+
+            best_key, best_dist = None, HISTOGRAM_MAX_DISTANCE
+            for key, entry in self._entries.items():
+                if entry["histogram"] is None:
+                    continue
+                dist = histogram_distance(histogram, entry["histogram"])
+                if dist < best_dist:
+                    best_key, best_dist = key, dist
+
+            if best_key is None:
+                return None, None
+            try:
+                return best_key, self._load_templates(best_key)
+            except OSError as e:
+                print(f"⚠️ Could not load templates for {best_key}: {e}")
+                return None, None
+
+    def lookup(self, fingerprint: np.ndarray):
+        """
+        Find the stored theme closest to `fingerprint`.
+
+        Returns:
+            (key, templates dict) or (None, None) if no theme is within tolerance
+        """
+        with self._lock:
+            self._refresh()
+
+            best_key, best_cost = None, None
+            for key, entry in self._entries.items():
+                d_board, d_palette = fingerprint_distance(fingerprint, entry["fingerprint"])
+                if d_board > BOARD_COLOR_TOLERANCE or d_palette > PIECE_PALETTE_TOLERANCE:
+                    continue
+                cost = d_board + 0.25 * d_palette
+                if best_cost is None or cost < best_cost:
+                    best_key, best_cost = key, cost
+
+            if best_key is None:
+                return None, None
+            try:
+                return best_key, self._load_templates(best_key)
+            except OSError as e:
+                print(f"⚠️ Could not load templates for {best_key}: {e}")
+                return None, None
+
+    def get(self, key: str):
+        """
+        Templates for an exact theme key, or None.
+        """
+        with self._lock:
+            self._refresh()
+            if key not in self._entries:
+                return None
+            try:
+                return self._load_templates(key)
+            except OSError:
+                return None
+
+    def save(self, fingerprint: np.ndarray, templates: dict, histogram=None, name=None) -> str:
+        """
+        Persist templates for a theme. Missing symbols are skipped.
+
+        Args:
+            fingerprint: Theme fingerprint (compute_theme_fingerprint)
+            templates: Dict of piece symbol -> (32, 32) grayscale template
+            histogram: Board color histogram (compute_board_histogram), optional
+            name: Human-readable theme name, optional
+
+        Returns:
+            Theme key
+        """
+        symbols = "".join(s for s in PIECE_SYMBOLS if s in templates)
+        if not symbols:
+            raise ValueError("No templates to save")
+
+        key = fingerprint_key(fingerprint)
+        arr = np.stack([np.asarray(templates[s], dtype=np.uint8) for s in symbols])
+        meta = {
+            "fingerprint": [float(v) for v in fingerprint],
+            "symbols": symbols,
+            "created": time.time(),
+        }
+        if histogram is not None:
+            meta["histogram"] = [round(float(v), 6) for v in histogram]
+        if name:
+            meta["name"] = name
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+        npy_tmp = self.root / f"{key}.npy{suffix}"
+        with open(npy_tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(npy_tmp, self.root / f"{key}.npy")
+
+        json_tmp = self.root / f"{key}.json{suffix}"
+        json_tmp.write_text(json.dumps(meta))
+        os.replace(json_tmp, self.root / f"{key}.json")
+
+        with self._lock:
+            self._dir_mtimes = None  # force re-scan
+            self._templates.pop(key, None)
+
+        print(f"  💾 Saved {len(symbols)} templates for theme {key}")
+        return key
+
+
+def get_template_store() -> TemplateStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = TemplateStore()
+    return _STORE
+
+
+def build_theme(image_path, fen: str, name: str, output_dir=BUNDLED_THEMES_DIR) -> str:
+    """
+    Build a bundled theme from a screenshot with a known position.
+    The position must contain all 12 piece types (e.g. the starting position).
+
+    Returns:
+        Theme key
+    """
+    from PIL import Image
+    from app.services.template_chess_detector import (
+        extract_squares_for_templates, extract_templates_from_layout, fen_to_layout,
+    )
+
+    image = Image.open(image_path).convert("RGB")
+    squares, board_crop = extract_squares_for_templates(image)
+    if squares is None or len(squares) != 64:
+        raise ValueError(f"Could not find a 64-square board in {image_path}")
+
+    templates = extract_templates_from_layout(squares, fen_to_layout(fen))
+    missing = [s for s in PIECE_SYMBOLS if s not in templates]
+    if missing:
+        print(f"⚠️ Position lacks templates for: {''.join(missing)}")
+
+    store = TemplateStore(root=output_dir, bundled_roots=())
+    return store.save(
+        compute_theme_fingerprint(squares),
+        templates,
+        histogram=compute_board_histogram(board_crop),
+        name=name,
+    )
+
+
+def render_theme_source(fen: str, colors: dict, path, square: int = 56, margin: int = 24):
+    """
+    Draw a site-style screenshot of a position (python-chess SVG pieces,
+    `colors` = {"light", "dark", "background"}) and save it as PNG.
+    Needs pymupdf to rasterize the SVG.
+    """
+    import chess
+    import chess.svg
+    import pymupdf
+    from PIL import Image
+
+    size = 8 * square
+    svg = chess.svg.board(chess.Board(fen), size=size, coordinates=False,
+                          colors={"square light": colors["light"], "square dark": colors["dark"]})
+    pix = pymupdf.open(stream=svg.encode(), filetype="svg")[0].get_pixmap()
+    board = Image.frombytes("RGB", (pix.width, pix.height), pix.samples).resize((size, size))
+    shot = Image.new("RGB", (size + 2 * margin, size + 2 * margin), colors.get("background", "#ffffff"))
+    shot.paste(board, (margin, margin))
+    shot.save(path)
+
+
+def build_bundled_themes(sources_dir=THEME_SOURCES_DIR, output_dir=BUNDLED_THEMES_DIR) -> list[str]:
+    """
+    Rebuild the bundled library from theme_sources/themes.json: rendered
+    entries are drawn first if their PNG is missing, then every theme is
+    built from its screenshot. Stale theme files in output_dir are removed.
+
+    Returns:
+        Theme keys
+    """
+    sources_dir, output_dir = Path(sources_dir), Path(output_dir)
+    entries = json.loads((sources_dir / "themes.json").read_text())["themes"]
+
+    for entry in entries:
+        image = sources_dir / entry["image"]
+        if not image.exists():
+            if "render" not in entry:
+                raise FileNotFoundError(f"Missing theme source {image}")
+            print(f"🖌️ Rendering {image.name}")
+            render_theme_source(entry["fen"], entry["render"], image)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for stale in list(output_dir.glob("*.json")) + list(output_dir.glob("*.npy")):
+        stale.unlink()
+    return [build_theme(sources_dir / e["image"], e["fen"], e["name"], output_dir) for e in entries]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage piece template themes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="add a theme from a screenshot with a known FEN")
+    p_build.add_argument("--image", required=True)
+    p_build.add_argument("--fen", required=True)
+    p_build.add_argument("--name", required=True)
+    p_build.add_argument("--output", default=str(BUNDLED_THEMES_DIR))
+
+    p_bundled = sub.add_parser("build-bundled", help="rebuild the bundled themes from theme_sources")
+    p_bundled.add_argument("--sources", default=str(THEME_SOURCES_DIR))
+    p_bundled.add_argument("--output", default=str(BUNDLED_THEMES_DIR))
+
+    sub.add_parser("list", help="list bundled and learned themes")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"✅ Built theme {build_theme(args.image, args.fen, args.name, Path(args.output))}")
+    elif args.command == "build-bundled":
+        keys = build_bundled_themes(Path(args.sources), Path(args.output))
+        print(f"✅ Built {len(keys)} bundled themes: {', '.join(keys)}")
+    else:
+        for theme in get_template_store().themes():
+            print(theme)
@@ -0,0 +1,158 @@
+"""
+Per-tile memo for square classifiers.
+
+Digital boards repeat the same tile images constantly (about 32 empty
+squares in two appearances per board, the same piece sprites across scans),
+so every classifier result is remembered under a fingerprint of the
+downsampled tile. Duplicates within a board and across requests skip
+classification. Each classifier has its own namespace with hit/miss counters.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+TILE_CACHE_ENABLED = os.getenv("TILE_CACHE", "1") == "1"
+TILE_CACHE_MAX_ENTRIES = int(os.getenv("TILE_CACHE_MAX_ENTRIES", "50000"))
+
+# Tiles are compared at 12x12 with 5 bits per channel: exact duplicates and
+# re-rendered sprites match, JPEG noise mostly averages out
+FINGERPRINT_SIZE = 12
+FINGERPRINT_SHIFT = 3
+
+
+def tile_fingerprint(tile) -> bytes:
+    arr = np.ascontiguousarray(np.asarray(tile))
+    small = cv2.resize(arr, (FINGERPRINT_SIZE, FINGERPRINT_SIZE), interpolation=cv2.INTER_AREA)
+    return hashlib.blake2b((small >> FINGERPRINT_SHIFT).tobytes(), digest_size=16).digest()
+
+
+class TileCache:
+    """
+    LRU memo of classifier results, keyed by (namespace, fingerprint, args).
+    """
+
+    def __init__(self, max_entries: int = TILE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counts = {}  # namespace -> [hits, misses]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            self._count(key[0], hit=value is not None)
+            return value
+
+    def _count(self, namespace: str, hit: bool, n: int = 1):
+        counts = self._counts.setdefault(namespace, [0, 0])
+        counts[0 if hit else 1] += n
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def map_batch(self, namespace: str, tiles, batch_fn):
+        """
+        Batch classification through the memo: only tiles whose fingerprint
+        is not cached (each distinct one once) go to `batch_fn`.
+
+        Args:
+            namespace: Classifier namespace
+            tiles: Sequence of tiles (BoardTiles, arrays or PIL Images)
+            batch_fn: f(tiles) -> sequence of per-tile results (or None)
+
+        Returns:
+            List of results in tile order, or None if batch_fn returned None
+        """
+        keys = [(namespace, tile_fingerprint(t)) for t in tiles]
+        with self._lock:
+            results = [self._entries.get(k) for k in keys]
+
+        missing = {}  # key -> first tile index
+        for i, (k, r) in enumerate(zip(keys, results)):
+            if r is None and k not in missing:
+                missing[k] = i
+
+        if missing:
+            indices = list(missing.values())
+            # Keep the original container when nothing is cached (batch fast paths)
+            batch = tiles if len(indices) == len(tiles) else [tiles[i] for i in indices]
+            computed = batch_fn(batch)
+            if computed is None:
+                return None
+            computed = dict(zip(missing, computed))
+            for k, value in computed.items():
+                self.put(k, value)
+            results = [computed[k] if r is None else r for k, r in zip(keys, results)]
+
+        # Duplicates within the batch count as hits: they were not classified
+        with self._lock:
+            self._count(namespace, hit=True, n=len(keys) - len(missing))
+            self._count(namespace, hit=False, n=len(missing))
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = {}
+            for ns, (hits, misses) in self._counts.items():
+                total = hits + misses
+                namespaces[ns] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hitRate": round(hits / total, 3) if total else None,
+                }
+            return {"entries": len(self._entries), "namespaces": namespaces}
+
+
+_TILE_CACHE = None
+_TILE_CACHE_LOCK = threading.Lock()
+
+
+def get_tile_cache() -> TileCache | None:
+    """
+    Process-wide tile memo (None if disabled via TILE_CACHE=0).
+    """
+    global _TILE_CACHE
+    if not TILE_CACHE_ENABLED:
+        return None
+    if _TILE_CACHE is None:
+        with _TILE_CACHE_LOCK:
+            if _TILE_CACHE is None:
+                _TILE_CACHE = TileCache()
+    return _TILE_CACHE
+
+
+def cached_tile_classifier(namespace: str):
+    """
+    Decorator memoizing a per-tile classifier f(square_img, *args, debug=...).
+    Extra positional/keyword arguments are part of the key; `debug` is not.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(square_img, *args, **kwargs):
+            cache = get_tile_cache()
+            if cache is None:
+                return fn(square_img, *args, **kwargs)
+
+            extra = tuple(sorted((k, v) for k, v in kwargs.items() if k != "debug"))
+            key = (namespace, tile_fingerprint(square_img), args, extra)
+            value = cache.get(key)
+            if value is None:
+                value = fn(square_img, *args, **kwargs)
+                cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
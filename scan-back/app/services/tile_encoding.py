@@ -0,0 +1,138 @@
+"""
+Encoding of boards and tiles for API responses.
+
+This is the only place where tiles become PIL Images / image files.
+Besides the default JSON (64 base64 PNG tiles), /extract-squares can answer
+with a "sprite": the warped board encoded once plus 64 tile rectangles, as
+JSON, multipart/form-data or msgpack (raw image bytes, no base64), or with
+tile URLs that a session encodes on demand.
+"""
+from __future__ import annotations
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.models.chess_models import SquareData, TileRect
+
+
+IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+IMAGE_MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+RESPONSE_FORMATS = ("json", "sprite", "multipart", "msgpack", "urls")
+MSGPACK_MIME_TYPE = "application/msgpack"
+
+
+def square_name(index: int) -> str:
+    """
+    Board index (0 = a8, row by row) to algebraic square name.
+    """
+    return f"{chr(ord('a') + index % 8)}{8 - index // 8}"
+
+
+def encode_image(image, fmt: str = "PNG", quality: int | None = None) -> bytes:
+    """
+    Encode a PIL Image or RGB array as PNG / JPEG / WEBP bytes.
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(np.ascontiguousarray(image))
+    fmt = fmt.upper()
+    kwargs = {}
+    if fmt in ("JPEG", "WEBP") and quality is not None:
+        kwargs["quality"] = int(quality)
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def encode_image_b64(image, fmt: str = "PNG", quality: int | None = None) -> str:
+    return base64.b64encode(encode_image(image, fmt, quality)).decode()
+
+
+def build_square_data(tiles) -> list[SquareData]:
+    """
+    Classify every tile (empty / color) and embed it as a base64 PNG.
+    """
+    from app.services.simple_chess_detector import classify_square
+
+    square_data_list = []
+    for i in range(len(tiles)):
+        square_type, color = classify_square(tiles[i])
+        is_empty = (square_type == 'empty')
+        square_data_list.append(SquareData(
+            position=square_name(i),
+            index=i,
+            imageData=encode_image_b64(tiles[i]),
+            isEmpty=is_empty,
+            detectedColor=color if not is_empty else None
+        ))
+    return square_data_list
+
+
+def build_tile_rects(tiles) -> list[TileRect]:
+    """
+    Classify every tile (empty / color) and describe it by its rectangle in
+    the warped board - no per-tile encoding.
+    """
+    from app.services.simple_chess_detector import classify_square
+
+    rects = tiles.rects
+    if rects is None:
+        raise ValueError("Tiles have no board rectangles")
+
+    tile_rects = []
+    for i in range(len(tiles)):
+        square_type, color = classify_square(tiles[i])
+        is_empty = (square_type == 'empty')
+        x, y, w, h = rects[i]
+        tile_rects.append(TileRect(
+            position=square_name(i),
+            index=i,
+            x=int(x), y=int(y), width=int(w), height=int(h),
+            isEmpty=is_empty,
+            detectedColor=color if not is_empty else None
+        ))
+    return tile_rects
+
+
+def encode_multipart(metadata: dict, image_bytes: bytes | None, fmt: str) -> tuple[bytes, str]:
+    """
+    multipart/form-data body with a JSON "metadata" part and the raw board
+    image as "board" (browsers parse it with Response.formData()). The board
+    part is omitted when there is no image.
+
+    Returns:
+        (body, content type)
+    """
+    import json
+    import uuid
+
+    boundary = uuid.uuid4().hex
+    ext = fmt.lower()
+    parts = [
+        f"--{boundary}\r\n".encode(),
+        b'Content-Disposition: form-data; name="metadata"\r\n',
+        b"Content-Type: application/json\r\n\r\n",
+        json.dumps(metadata, separators=(",", ":")).encode(),
+    ]
+    if image_bytes is not None:
+        parts += [
+            f"\r\n--{boundary}\r\n".encode(),
+            f'Content-Disposition: form-data; name="board"; filename="board.{ext}"\r\n'.encode(),
+            f"Content-Type: {IMAGE_MIME_TYPES[fmt]}\r\n\r\n".encode(),
+            image_bytes,
+        ]
+    parts.append(f"\r\n--{boundary}--\r\n".encode())
+    body = b"".join(parts)
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def encode_msgpack(metadata: dict, image_bytes: bytes | None) -> bytes:
+    """
+    msgpack map of the metadata plus the raw board image under "boardImage".
+    Requires the optional `msgpack` package (ImportError otherwise).
+    """
+    import msgpack
+
+    return msgpack.packb({**metadata, "boardImage": image_bytes}, use_bin_type=True)
@@ -1,65 +1,56 @@
 """
 Chess position recognition service.
-Order: Template → Warp+Slice → Legacy (Hough) → AI model
+Order: Screenshot → Template → Warp+Slice → Legacy (grid) → AI model
+The order of the cheap strategies adapts per input class (strategy_registry).
+In "race" mode the cheap strategies run concurrently and the most plausible
+FEN (python-chess sanity checks) wins. Under load, cheaper policies apply
+(load_monitor) and the response reports the quality tier.
+Screenshots skip board detection: their tiles are sliced once up front and
+go straight to the tile classifiers (recognize_tiles), as do boards warped
+from client-supplied corners (recognize_warped_board) and the diagrams of a
+book page (recognize_page).
 """
 from __future__ import annotations
 
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from PIL import Image
 from app.models.chess_models import VisionResponse
+from app.services.fen_plausibility import plausibility_score
+from app.services.load_monitor import QUALITY_POLICIES, current_policy
+from app.services.strategy_registry import STRATEGY_MIN_PLAUSIBILITY, classify_input, get_strategy_registry
 
 BOARD_TO_FEN_AVAILABLE = None  # lazy flag
+_BOARD_TO_FEN_LOCK = threading.Lock()
 
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 
-async def recognize_chess_position(
-    image: Image.Image,
-    rotation: int | None = None,
-    use_template_matching: bool = True,
-    is_starting_position: bool = False
-) -> VisionResponse:
-    try:
-        print("🔍 Starting chess position recognition...")
+# Default /recognize mode: "cascade" or "race"
+VISION_MODE = os.getenv("VISION_MODE", "cascade")
+RACE_WORKERS = int(os.getenv("RACE_WORKERS", "4"))
+# Shared deadline of the raced strategies (seconds)
+RACE_DEADLINE_SECONDS = float(os.getenv("RACE_DEADLINE_SECONDS", "3.0"))
+# A raced candidate at least this plausible ends the race
+RACE_MIN_PLAUSIBILITY = float(os.getenv("RACE_MIN_PLAUSIBILITY", "0.9"))
+# Most diagrams recognized on one page (/recognize-page)
+PAGE_MAX_BOARDS = int(os.getenv("PAGE_MAX_BOARDS", "8"))
 
-        # 1) Template matching (if you have templates)
-        if use_template_matching:
-            try:
-                from app.services.template_chess_detector import detect_chess_position_template, TEMPLATES
-                print("🎨 Trying template matching…")
-                if TEMPLATES or is_starting_position:
-                    fen_tm = detect_chess_position_template(image, rotation=rotation,
-                                                            is_starting_position=is_starting_position)
-                    if fen_tm:
-                        return VisionResponse(fen=fen_tm, confidence=0.95 if TEMPLATES else 0.85, detectedPieces=[])
-            except Exception as e:
-                print(f"⚠️ Template matching error: {e}")
-
-        # 2) Warp + uniform slicing → your classifier → FEN
-        try:
-            print("🧭 Trying warp + uniform slicing…")
-            from app.services.board_detector import detect_and_warp_board, extract_board_squares_warped
-            from app.services.simple_chess_detector import squares_to_fen
-
-            warped_pil, _ = detect_and_warp_board(image, out_size=800)
-            if warped_pil is not None:
-                squares = extract_board_squares_warped(warped_pil, padding=2)
-                if squares and len(squares) == 64:
-                    fen_ws = squares_to_fen(squares, rotation=rotation)
-                    if fen_ws:
-                        return VisionResponse(fen=fen_ws, confidence=0.70, detectedPieces=[])
-        except Exception as e:
-            print(f"⚠️ Warp+Slice error: {e}")
 
-        # 3) Legacy shape-based (Hough)
-        try:
-            print("🎲 Trying legacy shape-based detection…")
-            from app.services.simple_chess_detector import detect_chess_position_simple
-            fen_legacy = detect_chess_position_simple(image, rotation=rotation)
-            if fen_legacy:
-                return VisionResponse(fen=fen_legacy, confidence=0.50, detectedPieces=[])
-        except Exception as e:
-            print(f"⚠️ Legacy error: {e}")
+def load_board_to_fen() -> bool:
+    """
+    Import board-to-fen (patching tf_keras in as `keras`) once.
+    Safe to call from the warmup thread and request handlers at the same time.
+    """
+    global BOARD_TO_FEN_AVAILABLE
+    if BOARD_TO_FEN_AVAILABLE is not None:
+        return BOARD_TO_FEN_AVAILABLE
 
-        # 4) AI model last (heavy)
-        global BOARD_TO_FEN_AVAILABLE
+    with _BOARD_TO_FEN_LOCK:
         if BOARD_TO_FEN_AVAILABLE is None:
             try:
                 print("📦 Loading board-to-fen model…")
@@ -72,26 +63,497 @@ async def recognize_chess_position(
             except ImportError as e:
                 BOARD_TO_FEN_AVAILABLE = False
                 print(f"❌ board-to-fen unavailable: {e}")
+    return BOARD_TO_FEN_AVAILABLE
 
-        if BOARD_TO_FEN_AVAILABLE:
-            try:
-                from board_to_fen.predict import get_fen_from_image
-                fen_ai = get_fen_from_image(image)
-                if isinstance(fen_ai, str) and "can't find" not in fen_ai.lower() and "model can't" not in fen_ai.lower():
-                    return VisionResponse(fen=fen_ai, confidence=0.85, detectedPieces=[])
-            except Exception as e:
-                print(f"⚠️ board-to-fen error: {e}")
-
-        # fallback
-        return VisionResponse(
-            fen="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
-            confidence=0.0,
-            detectedPieces=[]
-        )
+
+def recognize_tiles(
+    squares,
+    board=None,
+    rotation: int | None = None,
+    use_template_matching: bool = True,
+    is_starting_position: bool = False,
+    cancel: threading.Event | None = None,
+) -> VisionResponse | None:
+    """
+    Classify already sliced tiles: template matching (if a theme is known),
+    then the square classifier.
+
+    Args:
+        squares: 64 tiles (BoardTiles)
+        board: Board crop the tiles came from (theme identification)
+        cancel: Set when the result is no longer needed (strategy race)
+
+    Returns:
+        VisionResponse, or None if no classifier produced a FEN
+    """
+    if use_template_matching:
+        try:
+            from app.services.template_chess_detector import detect_chess_position_template
+            from app.services.template_store import get_template_store
+            if is_starting_position or get_template_store().has_themes():
+                fen_tm = detect_chess_position_template(None, rotation=rotation,
+                                                        is_starting_position=is_starting_position,
+                                                        squares=squares, board_image=board)
+                if fen_tm:
+                    return VisionResponse(fen=fen_tm, confidence=0.85 if is_starting_position else 0.95,
+                                          detectedPieces=[], strategy="template")
+        except Exception as e:
+            print(f"⚠️ Template matching error: {e}")
+
+    if _cancelled(cancel):
+        return None
+    try:
+        from app.services.simple_chess_detector import squares_to_fen
+        if squares is not None and len(squares) == 64:
+            fen_ws = squares_to_fen(squares, rotation=rotation)
+            if fen_ws:
+                return VisionResponse(fen=fen_ws, confidence=0.70, detectedPieces=[], strategy="tiles")
+    except Exception as e:
+        print(f"⚠️ Tile classification error: {e}")
+    return None
+
+
+def recognize_warped_board(
+    board,
+    squares=None,
+    rotation: int | None = None,
+    use_template_matching: bool = True,
+    is_starting_position: bool = False,
+) -> VisionResponse:
+    """
+    Recognize an already warped top-down board (client- or session-supplied
+    corners): slicing + classification only, no detection cascade.
+
+    Args:
+        board: Warped board (RGB array or PIL Image)
+        squares: Tiles of `board` if already sliced (uniform grid, cut like
+                 the template tiles, otherwise)
+    """
+    from app.services.board_tiles import BoardTiles
+    from app.services.template_chess_detector import template_padding
+
+    board = np.asarray(board)
+    if squares is None:
+        squares = BoardTiles.from_board(board, padding=template_padding(board.shape[0] / 8.0))
+    result = recognize_tiles(squares, board, rotation=rotation,
+                             use_template_matching=use_template_matching,
+                             is_starting_position=is_starting_position)
+    return result if result is not None else fallback_response()
+
+
+# ----------------------------------------------------------------------
+# Strategies: each one is a sync function f(image, **options) that returns
+# a VisionResponse or None, and never raises. Raced stages get a `cancel`
+# Event and give up between their detection and classification steps once
+# another stage has won.
+
+def _cancelled(cancel: threading.Event | None) -> bool:
+    return cancel is not None and cancel.is_set()
+
+
+def stage_screenshot(image, rotation=None, use_template_matching=True, is_starting_position=False,
+                     policy=None, cancel=None):
+    """Screenshot fast path: axis-aligned board, integer slicing, no warp."""
+    try:
+        from app.services.screenshot_detector import SCREENSHOT_FAST_PATH, detect_screenshot_board
+        if SCREENSHOT_FAST_PATH:
+            shot_tiles, shot_board, _ = detect_screenshot_board(image)
+            if shot_tiles is not None and not _cancelled(cancel):
+                result = recognize_tiles(shot_tiles, shot_board, rotation=rotation,
+                                         use_template_matching=use_template_matching,
+                                         is_starting_position=is_starting_position, cancel=cancel)
+                if result is not None:
+                    result.strategy = "screenshot"
+                    return result
+    except Exception as e:
+        print(f"⚠️ Screenshot detection error: {e}")
+    return None
+
+
+def stage_template(image, rotation=None, use_template_matching=True, is_starting_position=False,
+                   policy=None, cancel=None):
+    """Template matching against the known themes."""
+    if not use_template_matching:
+        return None
+    try:
+        from app.services.template_chess_detector import detect_chess_position_template
+        from app.services.template_store import get_template_store
+        print("🎨 Trying template matching…")
+        if is_starting_position or get_template_store().has_themes():
+            fen_tm = detect_chess_position_template(image, rotation=rotation,
+                                                    is_starting_position=is_starting_position,
+                                                    cancel=cancel)
+            if fen_tm:
+                return VisionResponse(fen=fen_tm, confidence=0.85 if is_starting_position else 0.95,
+                                      detectedPieces=[], strategy="template")
+    except Exception as e:
+        print(f"⚠️ Template matching error: {e}")
+    return None
+
+
+def stage_warp(image, rotation=None, use_template_matching=True, is_starting_position=False,
+               policy=None, cancel=None):
+    """Warp + uniform slicing → square classifier."""
+    try:
+        print("🧭 Trying warp + uniform slicing…")
+        from app.services.board_detector import detect_and_warp_board, extract_board_squares_warped
+        from app.services.simple_chess_detector import squares_to_fen
+
+        policy = policy or QUALITY_POLICIES["full"]
+        warped_pil, _ = detect_and_warp_board(image, out_size=policy["warp_size"], sb_scales=policy["sb_scales"],
+                                              cancel=cancel)
+        if warped_pil is not None and not _cancelled(cancel):
+            squares = extract_board_squares_warped(warped_pil, padding=2)
+            if squares and len(squares) == 64 and not _cancelled(cancel):
+                fen_ws = squares_to_fen(squares, rotation=rotation)
+                if fen_ws:
+                    return VisionResponse(fen=fen_ws, confidence=0.70, detectedPieces=[], strategy="warp")
+    except Exception as e:
+        print(f"⚠️ Warp+Slice error: {e}")
+    return None
+
+
+def stage_hough(image, rotation=None, use_template_matching=True, is_starting_position=False,
+                policy=None, cancel=None):
+    """Legacy shape-based detection (grid lines)."""
+    try:
+        print("🎲 Trying legacy shape-based detection…")
+        from app.services.simple_chess_detector import detect_chess_position_simple
+        fen_legacy = detect_chess_position_simple(image, rotation=rotation, cancel=cancel)
+        if fen_legacy:
+            return VisionResponse(fen=fen_legacy, confidence=0.50, detectedPieces=[], strategy="hough")
+    except Exception as e:
+        print(f"⚠️ Legacy error: {e}")
+    return None
+
+
+def stage_board_to_fen(image, rotation=None, use_template_matching=True, is_starting_position=False,
+                       policy=None, cancel=None):
+    """AI model (heavy)."""
+    if _cancelled(cancel) or not load_board_to_fen():
+        return None
+    try:
+        from board_to_fen.predict import get_fen_from_image
+        fen_ai = get_fen_from_image(image)
+        if isinstance(fen_ai, str) and "can't find" not in fen_ai.lower() and "model can't" not in fen_ai.lower():
+            return VisionResponse(fen=fen_ai, confidence=0.85, detectedPieces=[], strategy="board_to_fen")
+    except Exception as e:
+        print(f"⚠️ board-to-fen error: {e}")
+    return None
+
+
+# (name, stage, cheap) in cascade order; only cheap stages are raced
+STRATEGIES = [
+    ("screenshot", stage_screenshot, True),
+    ("template", stage_template, True),
+    ("warp", stage_warp, True),
+    ("hough", stage_hough, True),
+    ("board_to_fen", stage_board_to_fen, False),
+]
+
+
+def fallback_response() -> VisionResponse:
+    return VisionResponse(fen=START_FEN, confidence=0.0, detectedPieces=[], strategy="fallback")
+
+
+def plan_strategies(image: Image.Image, policy: dict | None = None):
+    """
+    Stage plan for an image: the registry's order for its input class (or
+    the default cascade order when stats are disabled), without the stages
+    the load policy skips.
+
+    Returns:
+        (input class or None, [(name, stage, cheap), ...])
+    """
+    skip = policy["skip"] if policy else ()
+    registry = get_strategy_registry()
+    if registry is None:
+        return None, [s for s in STRATEGIES if s[0] not in skip]
+    input_class = classify_input(image)
+    plan = [s for s in registry.plan(input_class, STRATEGIES) if s[0] not in skip]
+    print(f"📋 {input_class}: {' → '.join(name for name, _, _ in plan)}")
+    return input_class, plan
+
+
+def run_stage(input_class, name, stage, image, **options) -> VisionResponse | None:
+    """
+    Run one stage and record its latency / success for the input class.
+    """
+    start = time.perf_counter()
+    result = stage(image, **options)
+    if _cancelled(options.get("cancel")):
+        # Lost the race: neither a result nor a meaningful latency
+        return None
+    registry = get_strategy_registry()
+    if registry is not None and input_class is not None:
+        success = result is not None and plausibility_score(result.fen) >= STRATEGY_MIN_PLAUSIBILITY
+        registry.record(input_class, name, (time.perf_counter() - start) * 1000.0, success)
+    return result
+
+
+def recognize_cascade(image: Image.Image, **options) -> VisionResponse:
+    """
+    Run the strategies in plan order and return the first FEN.
+    """
+    input_class, plan = plan_strategies(image, options.get("policy"))
+    for name, stage, _ in plan:
+        result = run_stage(input_class, name, stage, image, **options)
+        if result is not None:
+            return result
+    return fallback_response()
+
+
+_RACE_EXECUTOR = None
+_RACE_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_race_executor() -> ThreadPoolExecutor:
+    # Vision worker threads: strategy races and the boards of a page
+    global _RACE_EXECUTOR
+    if _RACE_EXECUTOR is None:
+        with _RACE_EXECUTOR_LOCK:
+            if _RACE_EXECUTOR is None:
+                _RACE_EXECUTOR = ThreadPoolExecutor(max_workers=RACE_WORKERS, thread_name_prefix="vision-race")
+    return _RACE_EXECUTOR
+
+
+def _score(result: VisionResponse) -> float:
+    """
+    Plausibility-weight a candidate's confidence; returns the plausibility.
+    """
+    score = plausibility_score(result.fen)
+    result.confidence = round(result.confidence * score, 3)
+    return score
+
+
+async def recognize_race(
+    image: Image.Image,
+    deadline: float = RACE_DEADLINE_SECONDS,
+    min_plausibility: float = RACE_MIN_PLAUSIBILITY,
+    **options,
+) -> VisionResponse:
+    """
+    Run the cheap strategies concurrently (worker threads; OpenCV/numpy
+    release the GIL) under a shared deadline. Every candidate is scored for
+    plausibility; the first one reaching `min_plausibility` wins and the
+    remaining strategies are cancelled: queued ones never start, running
+    ones stop at their next step. Otherwise the best candidate is kept and
+    the heavy strategies run afterwards.
+    """
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    input_class, plan = plan_strategies(image, options.get("policy"))
+
+    def run(name, stage):
+        # Queued strategies skip work once the race is decided
+        if cancelled.is_set():
+            return name, None
+        return name, run_stage(input_class, name, stage, image, cancel=cancelled, **options)
+
+    # Submitted in plan order: with fewer workers than stages the likely
+    # winners start first
+    executor = get_race_executor()
+    pending = {asyncio.wrap_future(executor.submit(run, name, stage))
+               for name, stage, cheap in plan if cheap}
+    best, best_key = None, None
+    end = loop.time() + deadline
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, end - loop.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                print(f"⏱️ Strategy race deadline ({deadline}s) reached")
+                break
+            for future in done:
+                name, result = future.result()
+                if result is None:
+                    continue
+                score = _score(result)
+                print(f"🏁 {name}: {result.fen.split()[0]} (plausibility {score:.2f})")
+                if best is None or (score, result.confidence) > best_key:
+                    best, best_key = result, (score, result.confidence)
+            if best_key is not None and best_key[0] >= min_plausibility:
+                return best
+    finally:
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+
+    # No plausible cheap candidate: heavy strategies get their turn
+    for name, stage, cheap in plan:
+        if cheap:
+            continue
+        result = await loop.run_in_executor(
+            executor, lambda: run_stage(input_class, name, stage, image, **options))
+        if result is None:
+            continue
+        score = _score(result)
+        if best is None or (score, result.confidence) > best_key:
+            best, best_key = result, (score, result.confidence)
+    return best if best is not None else fallback_response()
+
+
+async def recognize_chess_position(
+    image: Image.Image,
+    rotation: int | None = None,
+    use_template_matching: bool = True,
+    is_starting_position: bool = False,
+    mode: str | None = None,
+) -> VisionResponse:
+    """
+    Recognize a position from a full image.
+
+    Args:
+        mode: "cascade" (strategies in order, first FEN wins) or "race"
+              (concurrent, plausibility-scored); VISION_MODE by default.
+              Under load the quality tier may fall back to the cascade.
+    """
+    tier, policy = current_policy()
+    options = {
+        "rotation": rotation,
+        "use_template_matching": use_template_matching,
+        "is_starting_position": is_starting_position,
+        "policy": policy,
+    }
+    try:
+        print(f"🔍 Starting chess position recognition (quality tier: {tier})...")
+        if (mode or VISION_MODE) == "race" and policy["race"]:
+            result = await recognize_race(image, **options)
+        else:
+            # Off the event loop, so concurrent requests overlap (and count
+            # towards the load tier) instead of queueing behind this one
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, lambda: recognize_cascade(image, **options))
     except Exception as e:
         print(f"❌ recognize error: {e}")
-        return VisionResponse(
-            fen="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
-            confidence=0.0,
-            detectedPieces=[]
+        result = fallback_response()
+    result.qualityTier = tier
+    return result
+
+
+def _cache_options(rotation, use_template_matching, is_starting_position, mode, corners) -> dict:
+    return {"rotation": rotation, "template": use_template_matching, "starting": is_starting_position,
+            "corners": corners, "mode": mode or VISION_MODE}
+
+
+def lookup_recognition(decoded, contents: bytes | None = None, rotation: int | None = None,
+                       use_template_matching: bool = True, is_starting_position: bool = False,
+                       mode: str | None = None, corners=None) -> VisionResponse | None:
+    """
+    Cached /recognize result for an upload and its options, if any.
+    """
+    from app.services.result_cache import get_result_cache
+
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    options = _cache_options(rotation, use_template_matching, is_starting_position, mode, corners)
+    # Exact uploads only: a moved piece can look like the same image
+    cached = cache.get("recognize", options, contents=contents)
+    return VisionResponse(**cached) if cached is not None else None
+
+
+async def recognize_upload(decoded, contents: bytes | None = None, rotation: int | None = None,
+                           use_template_matching: bool = True, is_starting_position: bool = False,
+                           mode: str | None = None, corners=None) -> VisionResponse:
+    """
+    Recognize a decoded upload through the result cache: warped straight from
+    `corners` (original-image pixels) if given, else the full pipeline.
+    """
+    from app.services.image_sessions import warp_upload
+    from app.services.result_cache import get_result_cache
+
+    cached = lookup_recognition(decoded, contents, rotation, use_template_matching,
+                                is_starting_position, mode, corners)
+    if cached is not None:
+        return cached
+
+    if corners is not None:
+        print("📐 Warping from supplied corners (detection skipped)")
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, lambda: recognize_warped_board(
+            warp_upload(decoded, corners), rotation=rotation,
+            use_template_matching=use_template_matching, is_starting_position=is_starting_position))
+    else:
+        result = await recognize_chess_position(
+            decoded.image,
+            rotation=rotation,
+            use_template_matching=use_template_matching,
+            is_starting_position=is_starting_position,
+            mode=mode,
         )
+
+    # Only real, full-quality detections are cached (the fallback FEN has
+    # confidence 0; degraded tiers must not outlive the load spike)
+    cache = get_result_cache()
+    if cache is not None and result.confidence > 0 and result.qualityTier in (None, "full"):
+        options = _cache_options(rotation, use_template_matching, is_starting_position, mode, corners)
+        cache.put("recognize", options, result.model_dump(), contents=contents)
+    return result
+
+
+def _recognize_page_board(decoded, quad, policy: dict, **options) -> dict | None:
+    # One diagram of a page: warp (full resolution if needed) + classify
+    from app.services.image_sessions import warp_upload
+
+    corners = decoded.to_original_coords(quad.tolist())
+    result = recognize_warped_board(warp_upload(decoded, corners, out_size=policy["warp_size"]), **options)
+    if result.strategy == "fallback":
+        return None
+    # Quads that are not diagrams (tables, photos, frames) classify to junk
+    plausibility = plausibility_score(result.fen)
+    if plausibility < STRATEGY_MIN_PLAUSIBILITY:
+        print(f"⚠️ Dropping page board at {quad[0].tolist()}: implausible FEN {result.fen}")
+        return None
+    (x0, y0), (x1, y1) = decoded.to_original_coords([quad.min(axis=0), quad.max(axis=0)])
+    x, y = int(round(x0)), int(round(y0))
+    return {
+        "fen": result.fen,
+        "confidence": result.confidence,
+        "strategy": result.strategy,
+        "plausibility": plausibility,
+        "corners": corners,
+        "bbox": (x, y, int(round(x1)) - x, int(round(y1)) - y),
+    }
+
+
+async def recognize_page(decoded, max_boards: int = PAGE_MAX_BOARDS, rotation: int | None = None,
+                         use_template_matching: bool = True,
+                         is_starting_position: bool = False) -> tuple[str, list[dict]]:
+    """
+    Recognize every diagram on a page (book / magazine scan): one contour
+    pass finds the board quads (detect_board_quads), then each board is
+    warped and classified concurrently on the vision worker threads.
+
+    Args:
+        decoded: DecodedImage of the page
+        max_boards: Most boards to return (capped at PAGE_MAX_BOARDS)
+
+    Returns:
+        (quality tier, [{"fen", "confidence", "strategy", "plausibility",
+        "corners", "bbox"}, ...]) in reading order, in original-image pixels:
+        bbox is the diagram's outline, corners the warp corners (the /recognize
+        `corners` convention). Quads that could not be classified, or whose
+        FEN is below STRATEGY_MIN_PLAUSIBILITY, are left out.
+    """
+    from app.services.board_detector import detect_board_quads
+
+    tier, policy = current_policy()
+    loop = asyncio.get_running_loop()
+    executor = get_race_executor()
+    max_boards = max(1, min(max_boards, PAGE_MAX_BOARDS))
+
+    quads = await loop.run_in_executor(executor, detect_board_quads, decoded.image, max_boards)
+    options = {"rotation": rotation, "use_template_matching": use_template_matching,
+               "is_starting_position": is_starting_position}
+    futures = [
+        loop.run_in_executor(executor, lambda q=q: _recognize_page_board(decoded, q, policy, **options))
+        for q in quads
+    ]
+    boards = []
+    for board in await asyncio.gather(*futures, return_exceptions=True):
+        if isinstance(board, Exception):
+            print(f"⚠️ Page board recognition error: {board}")
+        elif board is not None:
+            boards.append(board)
+    return tier, boards
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Accuracy-parity check between the Keras and exported TFLite CNN backends.
+
+Export first:
+    python -m app.services.cnn_runtime export [--quantize dynamic]
+
+Then run against a directory of saved tiles (PNG/JPEG squares):
+    python test_cnn_parity.py <tiles_dir>
+"""
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from app.services.cnn_runtime import check_backend_parity, load_exported_cnn_model, load_tiles_from_dir
+
+MIN_TOP1_AGREEMENT = 0.98
+
+
+def load_tiles(tiles_dir):
+    tiles = load_tiles_from_dir(tiles_dir)
+    if tiles:
+        print(f"✓ Loaded {len(tiles)} tiles from {tiles_dir}")
+        return tiles
+
+    # No saved tiles yet - use synthetic ones so the backends can still be compared
+    print(f"⚠️ No tiles in {tiles_dir}, using 64 synthetic tiles")
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 255, (80, 80, 3), dtype=np.uint8)) for _ in range(64)]
+
+
+def check_parity(tiles_dir):
+    if load_exported_cnn_model() is None:
+        print("✗ Exported model missing - run: python -m app.services.cnn_runtime export")
+        return False
+
+    report = check_backend_parity(load_tiles(tiles_dir))
+    print(f"  Tiles: {report['tiles']}")
+    print(f"  Top-1 agreement: {report['top1_agreement']:.3f}")
+    print(f"  Max |Δp|: {report['max_abs_diff']:.4f}  Mean |Δp|: {report['mean_abs_diff']:.4f}")
+
+    if report['top1_agreement'] < MIN_TOP1_AGREEMENT:
+        print(f"✗ Parity below {MIN_TOP1_AGREEMENT:.2f}; mismatching tiles: {report['mismatches']}")
+        return False
+
+    print("✓ Backends agree")
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or not os.path.isdir(sys.argv[1]):
+        print("Usage: python test_cnn_parity.py <tiles_dir>")
+        sys.exit(2)
+    sys.exit(0 if check_parity(sys.argv[1]) else 1)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Grid finder checks on synthetic boards (no server needed)."""
+import numpy as np
+
+from app.services.simple_chess_detector import _fit_grid_lines, detect_grid_lines_projection
+
+
+def checkerboard(square: int, margin: int) -> np.ndarray:
+    """RGB board with lichess brown squares, `margin` px of dark background around it."""
+    side = 8 * square + 2 * margin
+    img = np.full((side, side, 3), (49, 46, 43), dtype=np.uint8)
+    for r in range(8):
+        for c in range(8):
+            y, x = margin + r * square, margin + c * square
+            img[y:y + square, x:x + square] = (240, 217, 181) if (r + c) % 2 == 0 else (181, 136, 99)
+    return img
+
+
+def test_grid_with_and_without_margin():
+    for square in (50, 64, 80):
+        for margin in (0, 1, 3, 24):
+            h_lines, v_lines, confidence = detect_grid_lines_projection(checkerboard(square, margin),
+                                                                        max_side=2048)
+            expected = [margin + i * square for i in range(9)]
+            assert h_lines is not None, (square, margin)
+            assert max(abs(a - b) for a, b in zip(h_lines, expected)) <= 2, (square, margin, h_lines)
+            assert max(abs(a - b) for a, b in zip(v_lines, expected)) <= 2, (square, margin, v_lines)
+            assert confidence > 0.3, (square, margin, confidence)
+
+
+def test_fit_grid_lines_period_just_below_profile():
+    # 8 * period leaves less than one pixel of the profile for the start
+    lines = _fit_grid_lines(np.random.rand(100), 11.7)
+    assert lines is not None and len(lines) == 9
+
+
+if __name__ == "__main__":
+    test_grid_with_and_without_margin()
+    test_fit_grid_lines_period_just_below_profile()
+    print("✓ Grid detection checks passed")